@@ -0,0 +1,112 @@
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Compare the per-annotation and the batch computation of SEAL scores.
+
+Usage:
+    python benchmarks/annotations.py -n 20000 -c 1000
+"""
+
+import argparse
+import copy
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from seal.schedulers import (CONSEQUENCES_DICT, MISSENSES, SPLICEAI,  # noqa: E402
+                             process_annotation, process_annotations)
+
+
+def random_score(rng, missing=0.3, low=0.0, high=1.0):
+    if rng.random() < missing:
+        return None
+    return f"{rng.uniform(low, high):.3f}"
+
+
+def synthetic_annotation(rng):
+    """
+    Build a split VEP annotation with the fields used to compute the scores.
+    """
+    annot = {
+        "Consequence": rng.sample(list(CONSEQUENCES_DICT), rng.randint(1, 3)),
+        "EXON": f"{rng.randint(1, 20)}/20" if rng.random() < 0.5 else None,
+        "INTRON": f"{rng.randint(1, 19)}/19" if rng.random() < 0.3 else None,
+        "CANONICAL": "YES" if rng.random() < 0.2 else None,
+        "MaxEntScan_alt": random_score(rng, 0.6, 1.0, 12.0),
+        "MaxEntScan_ref": random_score(rng, 0.6, 1.0, 12.0),
+    }
+    for value in MISSENSES:
+        annot[value] = random_score(rng, 0.7)
+    for value in SPLICEAI:
+        annot[value] = random_score(rng, 0.5)
+    return annot
+
+
+def same(value_a, value_b):
+    if value_a is None or value_b is None:
+        return value_a is value_b
+    if isinstance(value_a, float) and numpy.isnan(value_a):
+        return numpy.isnan(value_b)
+    return value_a == value_b and type(value_a) == type(value_b)
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    annots = [synthetic_annotation(rng) for _ in range(args.number)]
+    reference = copy.deepcopy(annots)
+    batch = copy.deepcopy(annots)
+
+    start = time.perf_counter()
+    for annot in reference:
+        process_annotation(annot)
+    elapsed_reference = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(batch), args.chunk_size):
+        process_annotations(batch[i:i + args.chunk_size])
+    elapsed_batch = time.perf_counter() - start
+
+    keys = ["consequenceScore", "EI", "canonical", "missensesMean", "spliceAI", "MES_var"]
+    mismatches = [
+        (i, key) for i, (annot_a, annot_b) in enumerate(zip(reference, batch))
+        for key in keys if not same(annot_a[key], annot_b[key])
+    ]
+
+    print(f"annotations      : {args.number}")
+    print(f"per-annotation   : {elapsed_reference:.3f}s ({args.number / elapsed_reference:.0f} annotations/s)")
+    print(f"batch ({args.chunk_size:>6})   : {elapsed_batch:.3f}s ({args.number / elapsed_batch:.0f} annotations/s)")
+    print(f"speedup          : x{elapsed_reference / elapsed_batch:.1f}")
+    print(f"mismatches       : {len(mismatches)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="SEAL: benchmark of the annotation scores computation")
+    parser.add_argument('-n', '--number', type=int, default=20000, help="Number of transcript annotations")
+    parser.add_argument('-c', '--chunk-size', type=int, default=1000, help="Annotations per batch")
+    parser.add_argument('-s', '--seed', type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+    sys.exit(main(args))
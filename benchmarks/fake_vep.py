@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Stand-in for the `vep` executable, used by the import benchmark.
+
+Accept the arguments of `seal/static/vep.config.json` and write a VCF with an
+'ANN' field whose subfields match the configured plugins and custom
+annotations. The number of transcripts of a record is read from its
+'SEAL_TX' INFO field (see `generate_vcf.py`), values are pseudo-random but
+reproducible.
+
+Environment:
+    FAKE_VEP_DELAY: seconds slept per record to mimic the VEP throughput.
+"""
+
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+import zlib
+
+BASE_FIELDS = [
+    "Allele", "Consequence", "IMPACT", "SYMBOL", "Gene", "Feature_type",
+    "Feature", "BIOTYPE", "EXON", "INTRON", "HGVSc", "HGVSp", "cDNA_position",
+    "CDS_position", "Protein_position", "Amino_acids", "Codons",
+    "Existing_variation", "DISTANCE", "STRAND", "FLAGS", "VARIANT_CLASS",
+    "SYMBOL_SOURCE", "HGNC_ID", "CANONICAL", "TSL", "APPRIS", "CCDS", "ENSP",
+    "SWISSPROT", "TREMBL", "UNIPARC", "UNIPROT_ISOFORM", "REFSEQ_MATCH",
+    "SOURCE", "REFSEQ_OFFSET", "GIVEN_REF", "USED_REF", "BAM_EDIT",
+    "GENE_PHENO", "SIFT", "PolyPhen", "DOMAINS", "HGVS_OFFSET", "HGVSg",
+    "CLIN_SIG", "SOMATIC", "PHENO", "PUBMED", "VAR_SYNONYMS", "MOTIF_NAME",
+    "MOTIF_POS", "HIGH_INF_POS", "MOTIF_SCORE_CHANGE", "TRANSCRIPTION_FACTORS"
+]
+PLUGIN_FIELDS = {
+    "MaxEntScan": ["MaxEntScan_alt", "MaxEntScan_diff", "MaxEntScan_ref"],
+    "SpliceAI": [
+        "SpliceAI_pred_DP_AG", "SpliceAI_pred_DP_AL", "SpliceAI_pred_DP_DG",
+        "SpliceAI_pred_DP_DL", "SpliceAI_pred_DS_AG", "SpliceAI_pred_DS_AL",
+        "SpliceAI_pred_DS_DG", "SpliceAI_pred_DS_DL", "SpliceAI_pred_SYMBOL"
+    ],
+    "dbscSNV": ["ada_score", "rf_score"]
+}
+CONSEQUENCES = [
+    "missense_variant", "synonymous_variant", "intron_variant",
+    "splice_region_variant", "stop_gained", "frameshift_variant",
+    "3_prime_UTR_variant", "5_prime_UTR_variant", "upstream_gene_variant",
+    "downstream_gene_variant", "non_coding_transcript_exon_variant",
+    "NMD_transcript_variant"
+]
+IMPACTS = ["HIGH", "MODERATE", "LOW", "MODIFIER"]
+BIOTYPES = ["protein_coding", "protein_coding", "lncRNA", "nonsense_mediated_decay"]
+
+
+def ann_fields(plugins, customs):
+    """
+    List the ANN subfields produced for the given plugins and customs.
+    """
+    fields = list(BASE_FIELDS)
+    for plugin in plugins:
+        name, _, options = plugin.partition(",")
+        if name == "dbNSFP":
+            fields.extend(options.split(",")[1:])
+        else:
+            fields.extend(PLUGIN_FIELDS.get(name, []))
+    for custom in customs:
+        options = custom.split(",")
+        short_name = options[1]
+        fields.append(short_name)
+        fields.extend(f"{short_name}_{field}" for field in options[5:])
+    return fields
+
+
+def fake_value(field, rng, hgvsg, index):
+    """
+    Return a reproducible value for one ANN subfield ('' for missing values).
+    """
+    if field == "Consequence":
+        return "&".join(rng.sample(CONSEQUENCES, rng.randint(1, 2)))
+    if field == "IMPACT":
+        return rng.choice(IMPACTS)
+    if field == "Feature":
+        return f"ENST{rng.randint(1, 20000):011d}"
+    if field == "Feature_type":
+        return "Transcript"
+    if field == "BIOTYPE":
+        return rng.choice(BIOTYPES)
+    if field == "SYMBOL":
+        return f"GENE{rng.randint(1, 2000)}"
+    if field == "Gene":
+        return f"ENSG{rng.randint(1, 2000):011d}"
+    if field == "SYMBOL_SOURCE":
+        return "HGNC"
+    if field == "HGNC_ID":
+        return f"HGNC:{rng.randint(1, 50000)}"
+    if field == "CANONICAL":
+        return "YES" if index == 0 else ""
+    if field == "SOURCE":
+        return rng.choice(["Ensembl", "RefSeq"])
+    if field == "ENSP":
+        return f"ENSP{rng.randint(1, 20000):011d}"
+    if field == "EXON":
+        return f"{rng.randint(1, 20)}/20" if rng.random() < 0.5 else ""
+    if field == "INTRON":
+        return f"{rng.randint(1, 19)}/19" if rng.random() < 0.3 else ""
+    if field in ["MaxEntScan_alt", "MaxEntScan_ref"]:
+        return f"{rng.uniform(1, 12):.3f}" if rng.random() < 0.4 else ""
+    if field == "Existing_variation":
+        return f"rs{rng.randint(1, 10**8)}" if rng.random() < 0.5 else ""
+    if field == "VAR_SYNONYMS":
+        return f"ClinVar::RCV{rng.randint(1, 10**6):09d}" if rng.random() < 0.1 else ""
+    if field == "HGVSg":
+        return hgvsg
+    if field == "ClinVar":
+        return f"{rng.randint(1, 10**6)}" if rng.random() < 0.05 else ""
+    if field == "ClinVar_CLNSIG":
+        return rng.choice(["Benign", "Likely_benign", "Uncertain_significance", ""])
+    if field.endswith("rankscore") or field.startswith("SpliceAI_pred_DS") or field.startswith("gnomADg_AF") or field.endswith("_score"):
+        return f"{rng.random():.3f}" if rng.random() < 0.5 else ""
+    return ""
+
+
+def open_output(path, compress):
+    """
+    Open the output VCF ('STDOUT' for the standard output).
+    """
+    if path == "STDOUT":
+        return sys.stdout
+    if compress or path.endswith(".gz"):
+        return gzip.open(path, "wt")
+    return open(path, "w")
+
+
+def open_input(path):
+    """
+    Open the input VCF, compressed or not.
+    """
+    with open(path, "rb") as handle:
+        magic = handle.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt")
+    return open(path, "r")
+
+
+def main(args):
+    """
+    Annotate each record of the input VCF with fake transcripts.
+    """
+    fields = ann_fields(args.plugin, args.custom)
+    delay = float(os.environ.get("FAKE_VEP_DELAY", 0))
+    description = f"Consequence annotations from Ensembl VEP. Format: {'|'.join(fields)}"
+    with open_input(args.input_file) as vcf_in, open_output(args.output_file, args.compress_output) as vcf_out:
+        records = 0
+        for line in vcf_in:
+            if line.startswith("##"):
+                vcf_out.write(line)
+                continue
+            if line.startswith("#CHROM"):
+                vcf_out.write(f'##INFO=<ID={args.vcf_info_field},Number=.,Type=String,Description="{description}">\n')
+                vcf_out.write(line)
+                continue
+            columns = line.rstrip("\n").split("\t")
+            key = "-".join(columns[0:2] + columns[3:5])
+            info = dict(item.partition("=")[::2] for item in columns[7].split(";") if item != ".")
+            transcripts = int(info.get("SEAL_TX", 1))
+            rng = random.Random(zlib.crc32(key.encode()))
+            annots = list()
+            for alt in columns[4].split(","):
+                for index in range(transcripts):
+                    hgvsg = f"{columns[0]}:g.{columns[1]}{columns[3]}>{alt}"
+                    annots.append("|".join(
+                        alt if field == "Allele" else fake_value(field, rng, hgvsg, index)
+                        for field in fields
+                    ))
+            annotation = f"{args.vcf_info_field}={','.join(annots)}"
+            columns[7] = annotation if columns[7] == "." else f"{columns[7]};{annotation}"
+            vcf_out.write("\t".join(columns) + "\n")
+            records += 1
+            if delay:
+                time.sleep(delay)
+    if args.stats_file:
+        with open(args.stats_file, "w") as stats:
+            stats.write(f"<html><body>{records} records annotated by fake VEP</body></html>\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="SEAL: VEP stand-in for benchmarks", allow_abbrev=False)
+    parser.add_argument('--input_file', required=True)
+    parser.add_argument('--output_file', required=True)
+    parser.add_argument('--stats_file', default=None)
+    parser.add_argument('--plugin', action='append', default=[])
+    parser.add_argument('--custom', action='append', default=[])
+    parser.add_argument('--vcf_info_field', default="CSQ")
+    parser.add_argument('--compress_output', default=None)
+    args, _ = parser.parse_known_args()
+    main(args)
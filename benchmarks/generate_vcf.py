@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Generate a synthetic VCF for the import benchmark.
+
+Records are sorted along the contigs of the header, with DP and AD for each
+sample. The number of transcripts `fake_vep.py` emits for a record is given
+by its 'SEAL_TX' INFO field. The VCF is bgzip-compressed when its name ends
+with '.gz'.
+
+Usage:
+    python benchmarks/generate_vcf.py -n 20000 -t 3 -m 0.05 -o sample.vcf
+"""
+
+import argparse
+import io
+import random
+
+CONTIGS = [f"chr{contig}" for contig in list(range(1, 23)) + ["X"]]
+
+
+def open_output(path):
+    """
+    Open the VCF to write, bgzip-compressed if its name ends with '.gz'.
+    """
+    if str(path).endswith(".gz"):
+        from pysam import BGZFile
+        return io.TextIOWrapper(BGZFile(str(path), "wb"))
+    return open(path, "w")
+
+
+def generate(path, number=1000, transcripts=3, multiallelic=0.05, samples=None, homref=0.0, seed=1):
+    """
+    Write a synthetic VCF.
+
+    Args:
+        path (str): The VCF to write.
+        number (int): The number of records.
+        transcripts (int): The maximum number of transcripts per record.
+        multiallelic (float): The fraction of records with two ALT alleles.
+        samples (list): The names of the sample columns.
+        homref (float): The fraction of homozygous reference genotypes.
+        seed (int): The random seed.
+
+    Returns:
+        int: The number of records written.
+    """
+    rng = random.Random(seed)
+    samples = samples or ["SAMPLE"]
+    per_contig = max(1, -(-number // len(CONTIGS)))
+    written = 0
+    with open_output(path) as out:
+        out.write("##fileformat=VCFv4.2\n")
+        for contig in CONTIGS:
+            out.write(f"##contig=<ID={contig},length=250000000>\n")
+        out.write('##INFO=<ID=SEAL_TX,Number=1,Type=Integer,Description="Transcripts emitted by the benchmark VEP stand-in">\n')
+        out.write('##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n')
+        out.write('##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">\n')
+        out.write('##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Depth">\n')
+        out.write("\t".join(["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"] + samples) + "\n")
+        for contig in CONTIGS:
+            pos = 10000
+            for _ in range(per_contig):
+                if written >= number:
+                    break
+                pos += rng.randint(1, 2000)
+                ref = rng.choice("ACGT")
+                alts = [base for base in "ACGT" if base != ref]
+                if rng.random() < multiallelic:
+                    alt = ",".join(rng.sample(alts, 2))
+                else:
+                    alt = rng.choice(alts)
+                calls = list()
+                for _ in samples:
+                    dp = rng.randint(10, 200)
+                    ad = rng.randint(1, dp)
+                    extra = ",0" if "," in alt else ""
+                    if rng.random() < homref:
+                        calls.append(f"0/0:{dp},0{extra}:{dp}")
+                    else:
+                        calls.append(f"0/1:{dp - ad},{ad}{extra}:{dp}")
+                tx = rng.randint(1, transcripts)
+                record_filter = "PASS" if rng.random() < 0.9 else "LowQual"
+                out.write("\t".join([contig, str(pos), ".", ref, alt, "50", record_filter, f"SEAL_TX={tx}", "GT:AD:DP"] + calls) + "\n")
+                written += 1
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="SEAL: synthetic VCF for the import benchmark")
+    parser.add_argument('-n', '--number', type=int, default=1000, help="Number of records")
+    parser.add_argument('-t', '--transcripts', type=int, default=3, help="Maximum number of transcripts per record")
+    parser.add_argument('-m', '--multiallelic', type=float, default=0.05, help="Fraction of multi-allelic records")
+    parser.add_argument('-S', '--samples', nargs='+', default=["SAMPLE"], help="Names of the sample columns")
+    parser.add_argument('-r', '--homref', type=float, default=0.0, help="Fraction of homozygous reference genotypes")
+    parser.add_argument('-s', '--seed', type=int, default=1, help="Random seed")
+    parser.add_argument('-o', '--output', required=True, help="VCF to write ('.gz' for bgzip)")
+    args = parser.parse_args()
+    generate(args.output, args.number, args.transcripts, args.multiallelic, args.samples, args.homref, args.seed)
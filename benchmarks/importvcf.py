@@ -0,0 +1,238 @@
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Measure the throughput of `importvcf` on synthetic VCF.
+
+The tables of a scratch PostgreSQL database are dropped and created again,
+then the same synthetic VCF (see `generate_vcf.py`) is imported for several
+samples: the first import annotates all the variants with `fake_vep.py`,
+the following ones find them already known. Each import reports its records
+per second, the queries sent by this process and the time of each phase
+(see `ImportMetrics`). The whole run is written as JSON with the commit of
+SEAL, so that runs can be compared between commits.
+
+Temporary files and the VEP configuration (`seal/static/vep.config.json`
+with `fake_vep.py` as command) live in a scratch folder, the tree of SEAL is
+left untouched. Queries of the import worker processes (IMPORT.WORKERS > 1)
+are not counted.
+
+Usage:
+    createdb seal_bench
+    python benchmarks/importvcf.py -d postgresql:///seal_bench -n 20000 -i 3 -o before.json
+    python benchmarks/importvcf.py -d postgresql:///seal_bench -n 20000 -i 3 -c VEP_STREAMING=true -b before.json
+"""
+
+import argparse
+import json
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+from sqlalchemy import event
+
+BENCHMARKS = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS.parent))
+os.environ['SEAL_SCHEDULER'] = 'false'
+
+from seal import app, db, config  # noqa: E402
+from seal.models import Filter, ImportJob, ImportMetrics, User  # noqa: E402
+from seal.schedulers import enqueue_import, importvcf  # noqa: E402
+
+from generate_vcf import generate  # noqa: E402
+
+PHASES = ["claim", "known", "vep", "parsing", "transcripts", "variants", "var2sample", "commit"]
+VEP_VALUES = ["vcf_path", "vcf_vep", "stats_vep", "ClinVar_vcf"]
+
+
+def write_vep_config(vep_config, scratch):
+    """
+    Write the VEP configuration of SEAL with `fake_vep.py` as command.
+
+    Placeholders of the local installation (VEP folders, fasta...) are set
+    to the scratch folder, the ones given by SEAL are kept.
+    """
+    with open(BENCHMARKS.parent.joinpath('seal/static/vep.config.json'), 'r') as f:
+        text = f.read()
+    text = re.sub(r"\{(\w+)\}", lambda m: m.group(0) if m.group(1) in VEP_VALUES else str(scratch), text)
+    data = json.loads(text)
+    data["command"] = sys.executable
+    data["args"] = dict([(str(BENCHMARKS.joinpath('fake_vep.py')), True)] + list(data["args"].items()))
+    with open(vep_config, 'w') as f:
+        json.dump(data, f, indent=4)
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process and of its children (MB).
+    """
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    )
+
+
+def commit_id():
+    """
+    Commit of the SEAL tree (None outside of a git repository).
+    """
+    try:
+        return subprocess.run(
+            ["git", "-C", str(BENCHMARKS.parent), "rev-parse", "--short", "HEAD"],
+            capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    if args.database == app.config["SQLALCHEMY_DATABASE_URI"]:
+        print("The benchmark drops the tables of its database: use a scratch database", file=sys.stderr)
+        return 1
+    for option in args.config:
+        key, _, value = option.partition("=")
+        config["IMPORT"][key] = yaml.safe_load(value)
+    if args.delay:
+        os.environ['FAKE_VEP_DELAY'] = str(args.delay)
+
+    scratch = Path(tempfile.mkdtemp(prefix="seal_bench_"))
+    try:
+        # Temporary files and the VEP configuration are read from app.root_path
+        scratch.joinpath('static/temp/vcf').mkdir(parents=True)
+        write_vep_config(scratch.joinpath('static/vep.config.json'), scratch)
+        app.root_path = str(scratch)
+        # The session of SEAL may be bound to the configured database already
+        app.config["SQLALCHEMY_DATABASE_URI"] = args.database
+        db.session.remove()
+
+        vcf_path = scratch.joinpath(f'benchmark.vcf{".gz" if args.gzip else ""}')
+        records = generate(vcf_path, args.number, args.transcripts, args.multiallelic, seed=args.seed)
+
+        queries = [0]
+
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            # As `insertdb.py`: the default filter of the users and the user of the imports
+            db.session.add(Filter(filtername="No Filter", filter={"criteria": []}))
+            db.session.add(User(username="benchmark", password="benchmark"))
+            db.session.commit()
+
+            @event.listens_for(db.engine, "before_cursor_execute")
+            def count_query(conn, cursor, statement, parameters, context, executemany):
+                queries[0] += 1
+
+            imports = list()
+            for i in range(args.imports):
+                start_queries = queries[0]
+                start = time.perf_counter()
+                job = enqueue_import({
+                    "samplename": f"BENCH_{i + 1}",
+                    "vcf_path": str(vcf_path),
+                    "run": {"name": "BENCHMARK"},
+                    "userid": 1
+                })
+                job_id = job.id
+                importvcf()
+                elapsed = time.perf_counter() - start
+                job = ImportJob.query.get(job_id)
+                metrics = ImportMetrics.query.filter_by(sample_ID=job.sample_ID).order_by(ImportMetrics.id.desc()).first()
+                imports.append({
+                    "state": job.state,
+                    "error": job.error,
+                    "seconds": round(elapsed, 3),
+                    "records_per_second": round(records / elapsed, 1),
+                    "queries": queries[0] - start_queries,
+                    "known": metrics.known if metrics else None,
+                    "annotated": metrics.annotated if metrics else None,
+                    "phases": {
+                        phase: round(getattr(metrics, f"time_{phase}"), 3) for phase in PHASES
+                    } if metrics else None
+                })
+                print(
+                    f"import {i + 1}: {job.state}, {elapsed:.2f}s, {records / elapsed:.0f} records/s, "
+                    f"{queries[0] - start_queries} queries", file=sys.stderr
+                )
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    rss, children_rss = peak_rss()
+    seconds = sum(result["seconds"] for result in imports)
+    result = {
+        "commit": commit_id(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "parameters": {
+            "records": records,
+            "transcripts": args.transcripts,
+            "multiallelic": args.multiallelic,
+            "imports": args.imports,
+            "gzip": args.gzip,
+            "delay": args.delay,
+            "seed": args.seed
+        },
+        "config": dict(config["IMPORT"]),
+        "imports": imports,
+        "seconds": round(seconds, 3),
+        "records_per_second": round(records * args.imports / seconds, 1),
+        "queries": sum(result["queries"] for result in imports),
+        "peak_rss_mb": round(rss, 1),
+        "children_peak_rss_mb": round(children_rss, 1)
+    }
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        for i, (before, after) in enumerate(zip(baseline["imports"], imports)):
+            print(
+                f"import {i + 1}: {before['records_per_second']:.0f} -> {after['records_per_second']:.0f} records/s "
+                f"(x{after['records_per_second'] / before['records_per_second']:.2f}), "
+                f"{before['queries']} -> {after['queries']} queries", file=sys.stderr
+            )
+    output = json.dumps(result, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0 if all(result["state"] == "done" for result in imports) else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="SEAL: benchmark of the import of VCF")
+    parser.add_argument('-d', '--database', required=True, help="URI of the scratch database (its tables are dropped)")
+    parser.add_argument('-n', '--number', type=int, default=10000, help="Number of records of the VCF")
+    parser.add_argument('-t', '--transcripts', type=int, default=3, help="Maximum number of transcripts per record")
+    parser.add_argument('-m', '--multiallelic', type=float, default=0.05, help="Fraction of multi-allelic records")
+    parser.add_argument('-i', '--imports', type=int, default=2, help="Number of samples imported from the VCF")
+    parser.add_argument('-z', '--gzip', action='store_true', help="Import a bgzip-compressed VCF")
+    parser.add_argument('-D', '--delay', type=float, default=0, help="Seconds spent by VEP per record")
+    parser.add_argument('-c', '--config', action='append', default=[], metavar="KEY=VALUE", help="IMPORT configuration to override")
+    parser.add_argument('-s', '--seed', type=int, default=1, help="Random seed")
+    parser.add_argument('-o', '--output', help="JSON file of the results (default: standard output)")
+    parser.add_argument('-b', '--baseline', help="JSON file of a previous run to compare with")
+    args = parser.parse_args()
+    sys.exit(main(args))
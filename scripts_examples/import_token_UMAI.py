@@ -28,6 +28,9 @@ import tempfile
 import pandas as pd
 import re
 import logging
+import yaml
+from datetime import datetime
+from sqlalchemy import create_engine, MetaData, Table
 
 # Function to load and validate the CSV file
 def load_and_validate_csv(csv_path, sep=","):
@@ -113,7 +116,8 @@ def generate_all_samples_txt(df, output_filename, base_path="/"):
                     'alias': run_alias
                 },
                 'teams': [{"name":row['Team']}],
-                'vcf_path': vcf_path
+                'vcf_path': vcf_path,
+                'lane': 'backfill'
             }
             file.write(json.dumps(data_entry) + '\n')
 
@@ -164,6 +168,29 @@ def create_treat_files(input_file, output_dir):
 
     return treat_files, temp_dir
 
+# Function to add the imports to the SEAL job queue
+def enqueue_jobs(treat_files, config_path, priority=0):
+    with open(config_path, 'r') as config_file:
+        config = yaml.safe_load(config_file)
+
+    engine = create_engine(config['FLASK']['SQLALCHEMY_DATABASE_URI'])
+    import_job = Table("import_job", MetaData(), autoload_with=engine)
+    with engine.begin() as connection:
+        for treat_file in treat_files:
+            with open(treat_file, 'r') as json_sample:
+                data = json.load(json_sample)
+            connection.execute(import_job.insert().values(
+                state="queued",
+                lane=data.get("lane", "backfill"),
+                priority=priority,
+                attempts=0,
+                add_caller=bool(data.get("add_caller", False)),
+                data=data,
+                date_created=datetime.now()
+            ))
+            logging.info(f"Import queued into SEAL: {treat_file}")
+    engine.dispose()
+
 def main(args):
     csv_path = args.input
     output_dir = args.output
@@ -177,7 +204,10 @@ def main(args):
 
         if treat_files: 
             choice = input("Do you want to import the .treat files into SEAL? (yes/no)")
-            if choice.lower() == 'yes':
+            if choice.lower() == 'yes' and not args.tokens:
+                enqueue_jobs(treat_files, args.config, args.priority)
+                shutil.rmtree(temp_dir)
+            elif choice.lower() == 'yes':
                 for treat_file in treat_files:
                     token_file = os.path.basename(treat_file).replace('.treat', '.token')
                     token_path = os.path.join(output_dir, token_file)
@@ -202,6 +232,9 @@ if __name__ == "__main__":
     parser.add_argument('-b', '--base-path', help='Base path', default="/")
     parser.add_argument('-s', '--separator', help='Separator', default=",")
     parser.add_argument('-l', '--log-level', help='Log level ([0-5])', default=0)
+    parser.add_argument('-c', '--config', help='SEAL configuration (database of the job queue)', default=Path(os.path.abspath(__file__)).parents[1].joinpath("seal/config.yaml"))
+    parser.add_argument('-p', '--priority', help='Priority of the import jobs (highest first)', type=int, default=0)
+    parser.add_argument('-t', '--tokens', help='Write token files in the output directory instead of queuing jobs', action='store_true')
     args = parser.parse_args()
 
     main(args)
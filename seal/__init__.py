@@ -50,7 +50,10 @@ login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 login_manager.login_message_category = 'info'
 scheduler.init_app(app)
-scheduler.start()
+if 'SEAL_SCHEDULER' in os.environ:
+    config['SCHEDULER'] = os.environ['SEAL_SCHEDULER'].lower() in ['1', 'true', 'yes']
+if config.setdefault('SCHEDULER', True):
+    scheduler.start()
 csrf.init_app(app)
 migrate = Migrate(app, db, compare_type=True)
 
@@ -91,7 +94,37 @@ if 'GENOME' not in config or config['GENOME'] not in ['grch37', 'grch38']:
     app.logger.warning("Genome version not recognize : use default version 'grch38'")
     config['GENOME'] = 'grch38'
 
+if 'IMPORT' not in config or not isinstance(config['IMPORT'], dict):
+    config['IMPORT'] = dict()
+config['IMPORT'].setdefault('CHUNK_SIZE', 1000)
+config['IMPORT'].setdefault('WORKERS', 1)
+config['IMPORT'].setdefault('VEP_STREAMING', False)
+config['IMPORT'].setdefault('VEP_CORES', 1)
+config['IMPORT'].setdefault('VEP_SHARD_SIZE', 5000)
+config['IMPORT'].setdefault('SKIP_KNOWN_VARIANTS', True)
+config['IMPORT'].setdefault('ANNOTATION_CACHE_SIZE', 1000000)
+config['IMPORT'].setdefault('JOB_TIMEOUT', 900)
+config['IMPORT'].setdefault('MAX_ATTEMPTS', 3)
+config['IMPORT'].setdefault('REANNOTATION_BATCH_SIZE', 500)
+config['IMPORT'].setdefault('REANNOTATION_NICE', 10)
+config['IMPORT'].setdefault('COMPRESS_TEMP', True)
+config['IMPORT'].setdefault('QUICK_VALIDATION', 1000)
+config['IMPORT'].setdefault('LANE_WORKERS', dict())
+for lane, limit in [('interactive', 0), ('routine', 0), ('backfill', 1)]:
+    config['IMPORT']['LANE_WORKERS'].setdefault(lane, limit)
+config['IMPORT'].setdefault('BACKFILL_AGING', 3600)
+config['IMPORT'].setdefault('INTERACTIVE_SLOT', True)
+config['IMPORT'].setdefault('PROGRESS_INTERVAL', 2)
+config['IMPORT'].setdefault('PROGRESS_STREAM_DURATION', 45)
+config['IMPORT'].setdefault('UPLOAD_CHUNK_SIZE', 8388608)
+config['IMPORT'].setdefault('UPLOAD_EXPIRY', 86400)
+config['IMPORT'].setdefault('WATCH_TOKENS', True)
+config['IMPORT'].setdefault('TOKEN_DEBOUNCE', 0.5)
+
 
 from seal import routes
 from seal import schedulers
 from seal import admin
+
+if config['SCHEDULER']:
+    schedulers.start_token_watcher()
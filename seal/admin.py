@@ -29,7 +29,9 @@ from flask_login import current_user
 from seal import app, db, bcrypt
 from seal.models import (User, Team, Sample, Family, Variant, Comment_variant,
                          Comment_sample, Var2Sample, Filter, Transcript, Run,
-                         Region, Bed, Phenotype, Omim, History, Clinvar)
+                         Region, Bed, Phenotype, Omim, History, Clinvar,
+                         ImportJob, ImportMetrics, Reannotation)
+from seal.schedulers import transcript_registry
 
 ###############################################################################
 
@@ -197,6 +199,14 @@ class SampleView(CustomView):
             for history in historical:
                 self.session.delete(history)
 
+            metrics = db.session.query(ImportMetrics).filter(ImportMetrics.sample_ID == int(model.id))
+            for metric in metrics:
+                self.session.delete(metric)
+
+            jobs = db.session.query(ImportJob).filter(ImportJob.sample_ID == int(model.id))
+            for job in jobs:
+                self.session.delete(job)
+
             self.session.delete(model)
             self.session.commit()
         except Exception as ex:
@@ -211,6 +221,42 @@ class SampleView(CustomView):
         return True
 
 
+class TranscriptView(CustomView):
+    """
+    Custom class for Flask-Admin ModelView for the Transcript model.
+
+    Attributes:
+        None
+
+    Methods:
+        after_model_change(form, model, is_created): Invalidates the transcript
+                                                     registry of the imports.
+        after_model_delete(model): Invalidates the transcript registry of the
+                                   imports.
+    """
+    def after_model_change(self, form, model, is_created):
+        """
+        Called after a transcript is created or modified. Invalidates the
+        transcript registry used by the imports.
+
+        Args:
+            form: The form object.
+            model: The Transcript model object.
+            is_created: Boolean indicating whether the transcript is being created or modified.
+        """
+        transcript_registry.invalidate()
+
+    def after_model_delete(self, model):
+        """
+        Called after a transcript is deleted. Invalidates the transcript
+        registry used by the imports.
+
+        Args:
+            model: The Transcript model object.
+        """
+        transcript_registry.invalidate()
+
+
 class UserView(CustomView):
     """
     Custom class for Flask-Admin ModelView for the User model.
@@ -344,8 +390,8 @@ admin.add_view(
         category="Variant",
         column_searchable_list = ['chr', 'pos', 'ref', 'alt', 'class_variant', 'clinvar_VARID', 'clinvar_CLNSIG', 'clinvar_CLNSIGCONF', 'clinvar_CLNREVSTAT'],
         column_editable_list = ['chr', 'pos', 'ref', 'alt', 'class_variant', 'clinvar_VARID', 'clinvar_CLNSIG', 'clinvar_CLNSIGCONF', 'clinvar_CLNREVSTAT'],
-        column_exclude_list = ['annotations'],
-        form_excluded_columns = ['samples']
+        column_exclude_list = ['annotations_json', 'annotations_packed'],
+        form_excluded_columns = ['samples', 'transcript_annotations', 'annotations_json', 'annotations_packed']
     )
 )
 admin.add_view(
@@ -387,6 +433,36 @@ admin.add_view(
         column_editable_list = ['user', 'sample', 'action'],
     )
 )
+admin.add_view(
+    CustomView(
+        ImportJob,
+        db.session,
+        category="Analysis",
+        name="Import Jobs",
+        column_exclude_list = ['data', 'checkpoint'],
+        column_searchable_list = ['state', 'lane', 'worker', 'token'],
+        column_editable_list = ['state', 'lane', 'priority'],
+    )
+)
+admin.add_view(
+    CustomView(
+        Reannotation,
+        db.session,
+        category="Variant",
+        name="Re-annotations",
+        column_searchable_list = ['state', 'genome', 'config_hash'],
+        column_editable_list = ['state'],
+    )
+)
+admin.add_view(
+    CustomView(
+        ImportMetrics,
+        db.session,
+        category="Analysis",
+        name="Import Metrics",
+        column_searchable_list = ['sample.samplename', 'caller'],
+    )
+)
 admin.add_view(
     CustomView(
         Filter,
@@ -416,7 +492,7 @@ admin.add_sub_category(name="Bed", parent_name="Genes")
 admin.add_sub_category(name="OMIM", parent_name="Genes")
 
 admin.add_view(
-    CustomView(
+    TranscriptView(
         Transcript,
         db.session,
         category="Genes",
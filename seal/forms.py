@@ -26,11 +26,11 @@ from flask_wtf.file import FileField, FileAllowed
 from flask_login import current_user
 from wtforms import (StringField, PasswordField, SubmitField, BooleanField,
                      ValidationError, TextAreaField, SelectMultipleField,
-                     SelectField, DateField)
+                     SelectField, DateField, HiddenField)
 from wtforms.validators import DataRequired, Length, Email, Optional, EqualTo
 
 from seal import bcrypt
-from seal.models import User, Sample, Run, Team, Bed, Region
+from seal.models import User, Sample, Run, Bed, Region
 
 ################################################################################
 # Authentication
@@ -138,8 +138,10 @@ class UploadVariantForm(FlaskForm):
     )
     vcf_file = FileField(
         'Upload VCF file',
-        validators=[DataRequired(), FileAllowed(['vcf', 'vcf.gz'])]
+        validators=[Optional(), FileAllowed(['vcf', 'vcf.gz'])]
     )
+    # VCF uploaded by chunks (see `seal.routes.upload_start`)
+    upload = HiddenField()
     affected = BooleanField('Affected')
     index = BooleanField('Index')
 
@@ -166,8 +168,7 @@ class UploadPanelForm(FlaskForm):
         'Upload file',
         validators=[DataRequired(), FileAllowed(['bed', 'txt', 'csv', 'tsv'])]
     )
-    teams_choices = [(team.id, team.teamname) for team in Team.query.all()]
-    teams = SelectMultipleField('Teams', choices=teams_choices, coerce=int)
+    teams = SelectMultipleField('Teams', coerce=int)
 
     submit = SubmitField('Create New Panel')
 
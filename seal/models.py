@@ -18,6 +18,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import json
+import zlib
 from datetime import datetime
 
 from seal import db, login_manager, bcrypt
@@ -163,6 +165,107 @@ class History(db.Model):
     action = db.Column(db.Text, nullable=False)
 
 
+class ImportJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    state = db.Column(db.String(20), unique=False, nullable=False, default="queued", index=True)
+    lane = db.Column(db.String(20), unique=False, nullable=False, default="routine", server_default="routine")
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    add_caller = db.Column(db.Boolean(), nullable=False, default=False)
+    data = db.Column(db.JSON, nullable=False)
+    checkpoint = db.Column(db.JSON, nullable=True)
+    token = db.Column(db.Text, unique=True, nullable=True)
+    worker = db.Column(db.String(300), unique=False, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    sample_ID = db.Column(db.Integer, db.ForeignKey('sample.id'), nullable=True)
+    sample = relationship("Sample", back_populates="import_jobs")
+
+    date_created = db.Column(db.TIMESTAMP(timezone=False), nullable=False, default=datetime.now)
+    date_start = db.Column(db.TIMESTAMP(timezone=False), nullable=True)
+    date_end = db.Column(db.TIMESTAMP(timezone=False), nullable=True)
+    heartbeat = db.Column(db.TIMESTAMP(timezone=False), nullable=True)
+
+    def __repr__(self):
+        return f"ImportJob('{self.id}','{self.state}','{self.lane}','{self.priority}','{self.attempts}')"
+
+    def __str__(self):
+        return f"Job {self.id} ({self.state})"
+
+
+class Upload(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    state = db.Column(db.String(20), unique=False, nullable=False, default="uploading")
+    user_ID = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(255), unique=False, nullable=False)
+    path = db.Column(db.Text, unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    chunks = db.Column(db.JSON, nullable=False, default=list)
+
+    date_created = db.Column(db.TIMESTAMP(timezone=False), nullable=False, default=datetime.now)
+    date_update = db.Column(db.TIMESTAMP(timezone=False), nullable=False, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"Upload('{self.id}','{self.state}','{self.filename}','{self.received}','{self.size}')"
+
+
+class Reannotation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    state = db.Column(db.String(20), unique=False, nullable=False, default="running", index=True)
+    genome = db.Column(db.String(20), unique=False, nullable=False)
+    config_hash = db.Column(db.String(64), unique=False, nullable=False)
+    last_variant_ID = db.Column(db.Text, unique=False, nullable=False, default="")
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    reannotated = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    date_created = db.Column(db.TIMESTAMP(timezone=False), nullable=False, default=datetime.now)
+    date_start = db.Column(db.TIMESTAMP(timezone=False), nullable=True)
+    date_end = db.Column(db.TIMESTAMP(timezone=False), nullable=True)
+    time_vep = db.Column(db.Float, nullable=False, default=0)
+    time_total = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"Reannotation('{self.id}','{self.state}','{self.processed}','{self.total}')"
+
+    def __str__(self):
+        return f"Reannotation {self.id} ({self.state})"
+
+
+class ImportMetrics(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sample_ID = db.Column(db.Integer, db.ForeignKey('sample.id'), nullable=False)
+    sample = relationship("Sample", back_populates="import_metrics")
+    caller = db.Column(db.String(30), unique=False, nullable=True)
+    date_start = db.Column(db.TIMESTAMP(timezone=False), nullable=False, default=datetime.now)
+    date_end = db.Column(db.TIMESTAMP(timezone=False), nullable=True)
+    success = db.Column(db.Boolean(), nullable=False, default=True)
+
+    # Record counts
+    records = db.Column(db.Integer, nullable=False, default=0)
+    known = db.Column(db.Integer, nullable=False, default=0)
+    cached = db.Column(db.Integer, nullable=False, default=0)
+    annotated = db.Column(db.Integer, nullable=False, default=0)
+    new_transcripts = db.Column(db.Integer, nullable=False, default=0)
+
+    # Time spent in each phase (seconds)
+    time_claim = db.Column(db.Float, nullable=False, default=0)
+    time_known = db.Column(db.Float, nullable=False, default=0)
+    time_vep = db.Column(db.Float, nullable=False, default=0)
+    time_parsing = db.Column(db.Float, nullable=False, default=0)
+    time_transcripts = db.Column(db.Float, nullable=False, default=0)
+    time_variants = db.Column(db.Float, nullable=False, default=0)
+    time_var2sample = db.Column(db.Float, nullable=False, default=0)
+    time_commit = db.Column(db.Float, nullable=False, default=0)
+    time_total = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"ImportMetrics('{self.sample_ID}','{self.caller}','{self.date_start}','{self.time_total}')"
+
+
 class Sample(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     samplename = db.Column(db.String(120), unique=False, nullable=False)
@@ -185,6 +288,8 @@ class Sample(db.Model):
     run = relationship("Run", back_populates="samples")
 
     historics = relationship("History")
+    import_metrics = relationship("ImportMetrics", back_populates="sample")
+    import_jobs = relationship("ImportJob", back_populates="sample")
     teams = db.relationship(
         'Team', secondary=sample2team, lazy='subquery',
         backref=db.backref('samples', lazy=True)
@@ -236,6 +341,64 @@ class Run(db.Model):
         return self.name
 
 
+ANNOTATIONS_FORMAT = b"\x01"
+
+
+def pack_annotations(annotations):
+    """
+    Encode the annotations of a variant in the compact storage format.
+
+    The keys of the VEP annotations are stored once per distinct list of keys
+    (dictionary encoding), each transcript being the index of its keys
+    followed by its values. The whole is compressed with zlib and prefixed by
+    the format version.
+
+    Args:
+        annotations (list): The annotations of the variant (one dict with
+                            'date' and 'ANN' list per annotation version).
+
+    Returns:
+        bytes: The packed annotations (None if there are none).
+    """
+    if annotations is None:
+        return None
+    shapes = dict()
+    versions = list()
+    for version in annotations:
+        packed = {key: value for key, value in version.items() if key != "ANN"}
+        if "ANN" in version:
+            packed["ANN"] = list()
+            for annot in version["ANN"]:
+                shape = shapes.setdefault(tuple(annot.keys()), len(shapes))
+                packed["ANN"].append([shape] + list(annot.values()))
+        versions.append(packed)
+    payload = json.dumps({"keys": list(shapes), "versions": versions}, separators=(',', ':'))
+    return ANNOTATIONS_FORMAT + zlib.compress(payload.encode(), 3)
+
+
+def unpack_annotations(data):
+    """
+    Decode annotations packed by `pack_annotations`.
+
+    Args:
+        data (bytes): The packed annotations.
+
+    Returns:
+        list: The annotations of the variant.
+    """
+    if data is None:
+        return None
+    data = bytes(data)
+    if data[:1] != ANNOTATIONS_FORMAT:
+        raise ValueError(f"Unknown annotations format: {data[:1]!r}")
+    payload = json.loads(zlib.decompress(data[1:]))
+    shapes = payload["keys"]
+    for version in payload["versions"]:
+        if "ANN" in version:
+            version["ANN"] = [dict(zip(shapes[annot[0]], annot[1:])) for annot in version["ANN"]]
+    return payload["versions"]
+
+
 class Variant(db.Model):
     id = db.Column(db.Text, primary_key=True)
     chr = db.Column(db.String(10), unique=False, nullable=False)
@@ -243,7 +406,13 @@ class Variant(db.Model):
     ref = db.Column(db.String(500), unique=False, nullable=False)
     alt = db.Column(db.String(500), unique=False, nullable=False)
     class_variant = db.Column(db.Integer, unique=False, default=None)
-    annotations = db.Column(db.JSON, nullable=True)
+    # Annotations are read and written through `annotations`: rows written
+    # before the compact format keep their JSON until `pack-annotations`.
+    # Only the latest version is kept in the row (older versions are in
+    # `AnnotationVersion`), and it is loaded on first access only.
+    annotations_json = db.deferred(db.Column("annotations", db.JSON(none_as_null=True), nullable=True), group="annotations")
+    annotations_packed = db.deferred(db.Column(db.LargeBinary, nullable=True), group="annotations")
+    annotations_version = db.Column(db.Integer, unique=False, nullable=False, default=0, server_default="0")
     comments = relationship("Comment_variant")
 
     clinvar_VARID = db.Column(db.Integer, unique=False, nullable=True)
@@ -251,6 +420,68 @@ class Variant(db.Model):
     clinvar_CLNSIGCONF = db.Column(db.String(500), unique=False, nullable=True)
     clinvar_CLNREVSTAT = db.Column(db.String(500), unique=False, nullable=True)
 
+    @property
+    def annotations(self):
+        if self.annotations_packed is not None:
+            return unpack_annotations(self.annotations_packed)
+        return self.annotations_json
+
+    @annotations.setter
+    def annotations(self, annotations):
+        self.annotations_packed = pack_annotations(annotations)
+        self.annotations_json = None
+
+    def get_annotations(self, version=-1):
+        """
+        Get one version of the annotations of the variant.
+
+        The latest version is read from the variant, older versions from
+        `AnnotationVersion`.
+
+        Args:
+            version (int): The version of the annotations (negative values
+                           count from the latest version, as list indexes).
+
+        Returns:
+            dict: The annotations of the version ('date' and 'ANN' list).
+
+        Raises:
+            IndexError: If the variant has no such version.
+        """
+        annotations = self.annotations
+        if not annotations or self.annotations_packed is None:
+            # Legacy JSON rows hold all their versions
+            return (annotations or list())[version]
+        index = version + self.annotations_version + 1 if version < 0 else version
+        if index == self.annotations_version:
+            return annotations[-1]
+        previous = AnnotationVersion.query.get((self.id, index)) if index >= 0 else None
+        if previous is None:
+            raise IndexError(f"Variant '{self.id}' has no annotations version {version}")
+        return previous.annotations
+
+    def add_annotations(self, annotation):
+        """
+        Make an annotation the latest version of the annotations of the
+        variant, the previous latest version being moved to
+        `AnnotationVersion`.
+
+        Args:
+            annotation (dict): The new annotations ('date' and 'ANN' list).
+        """
+        annotations = self.annotations
+        if annotations and self.annotations_packed is None:
+            # Legacy JSON rows: move all their versions out of the row
+            for version, previous in enumerate(annotations):
+                db.session.add(AnnotationVersion(variant_ID=self.id, version=version, annotations=previous))
+            self.annotations_version = len(annotations)
+        elif annotations:
+            db.session.add(AnnotationVersion(variant_ID=self.id, version=self.annotations_version, annotations=annotations[-1]))
+            self.annotations_version += 1
+        else:
+            self.annotations_version = 0
+        self.annotations = [annotation]
+
     def __repr__(self):
         return f"Variant('{self.chr}','{self.pos}','{self.ref}','{self.alt}')"
 
@@ -258,6 +489,76 @@ class Variant(db.Model):
         return self.id
 
 
+class AnnotationVersion(db.Model):
+    # Annotations of a variant replaced by a newer version
+    variant_ID = db.Column(db.Text, db.ForeignKey('variant.id'), primary_key=True)
+    version = db.Column(db.Integer, primary_key=True)
+    annotations_packed = db.Column(db.LargeBinary, nullable=False)
+
+    @property
+    def annotations(self):
+        return unpack_annotations(self.annotations_packed)[0]
+
+    @annotations.setter
+    def annotations(self, annotation):
+        self.annotations_packed = pack_annotations([annotation])
+
+    def __repr__(self):
+        return f"AnnotationVersion('{self.variant_ID}','{self.version}')"
+
+    def __str__(self):
+        return f"{self.variant_ID} - {self.version}"
+
+
+class AnnotationCache(db.Model):
+    variant_ID = db.Column(db.Text, primary_key=True)
+    genome = db.Column(db.String(20), primary_key=True)
+    config_hash = db.Column(db.String(64), primary_key=True)
+    annotations = db.Column(db.JSON, nullable=False)
+    date = db.Column(db.TIMESTAMP(timezone=False), nullable=False, default=datetime.now)
+    last_used = db.Column(db.TIMESTAMP(timezone=False), nullable=False, default=datetime.now, index=True)
+
+    def __repr__(self):
+        return f"AnnotationCache('{self.variant_ID}','{self.genome}','{self.config_hash}')"
+
+    def __str__(self):
+        return self.variant_ID
+
+
+class VariantAnnotation(db.Model):
+    # One row per transcript of the latest annotation version of a variant,
+    # with the fields used to query variants by gene, impact or frequency
+    id = db.Column(db.Integer, primary_key=True)
+    variant_ID = db.Column(db.Text, db.ForeignKey('variant.id'), nullable=False, index=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    feature = db.Column(db.String(30), unique=False, nullable=True)
+    symbol = db.Column(db.String(50), unique=False, nullable=True, index=True)
+    consequence_score = db.Column(db.Integer, unique=False, nullable=True)
+    impact = db.Column(db.String(20), unique=False, nullable=True, index=True)
+    gnomadg_af = db.Column(db.Float, unique=False, nullable=True, index=True)
+    gnomadg_af_afr = db.Column(db.Float, unique=False, nullable=True)
+    gnomadg_af_amr = db.Column(db.Float, unique=False, nullable=True)
+    gnomadg_af_asj = db.Column(db.Float, unique=False, nullable=True)
+    gnomadg_af_eas = db.Column(db.Float, unique=False, nullable=True)
+    gnomadg_af_fin = db.Column(db.Float, unique=False, nullable=True)
+    gnomadg_af_nfe = db.Column(db.Float, unique=False, nullable=True)
+    gnomadg_af_oth = db.Column(db.Float, unique=False, nullable=True)
+    missenses_mean = db.Column(db.Float, unique=False, nullable=True)
+    spliceai = db.Column(db.Float, unique=False, nullable=True)
+    mes_var = db.Column(db.Float, unique=False, nullable=True)
+    canonical = db.Column(db.Boolean, unique=False, nullable=False, default=False)
+    source = db.Column(db.String(30), unique=False, nullable=True)
+    biotype = db.Column(db.String(50), unique=False, nullable=True)
+
+    variant = db.relationship(Variant, backref="transcript_annotations")
+
+    def __repr__(self):
+        return f"VariantAnnotation('{self.variant_ID}','{self.version}','{self.feature}')"
+
+    def __str__(self):
+        return f"{self.variant_ID} - {self.feature}"
+
+
 class Comment_variant(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     comment = db.Column(db.Text, nullable=False)
@@ -19,8 +19,11 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import functools
+import hashlib
 import json
+import os
 import secrets
+import time
 import urllib
 
 from datetime import datetime
@@ -29,12 +32,13 @@ from urllib.parse import urlparse
 
 from PIL import Image
 from flask import (flash, jsonify, redirect, render_template, request, url_for,
-                   escape, abort)
+                   escape, abort, Response, stream_with_context)
 from flask_login import current_user, login_user, logout_user
 from flask_login.utils import EXEMPT_METHODS
 from flask_wtf.csrf import CSRFError
 from sqlalchemy import and_, or_
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from psycopg2.errors import UniqueViolation
 
 from seal import app, bcrypt, db, config
@@ -42,9 +46,12 @@ from seal.forms import (AddCommentForm, LoginForm, SaveFilterForm,
                         UploadPanelForm, UploadVariantForm,
                         UpdateAccountForm, UpdatePasswordForm, UploadClinvar)
 from seal.models import (Bed, Comment_sample, Comment_variant, Family, Filter,
-                         History, Omim, Region, Run, Sample, Team,
-                         Transcript, User, Variant, Var2Sample, Clinvar)
-from seal.schedulers import update_clinvar
+                         History, ImportJob, ImportMetrics, Omim, Reannotation,
+                         Region, Run, Sample, Team, Transcript, Upload, User,
+                         Variant, Var2Sample, Clinvar)
+from seal.schedulers import (JOB_RUNNING, JOB_WAITING, enqueue_import,
+                             import_progress, queue_positions,
+                             start_reannotation, update_clinvar)
 
 
 ###############################################################################
@@ -340,7 +347,8 @@ def save_picture(form_picture):
 
 def add_vcf(info, vcf_file):
     """
-    Save uploaded VCF file and corresponding sample information to disk.
+    Save uploaded VCF file to disk and add the import of the sample to the
+    queue.
 
     Parameters:
     info (dict): Sample information, including samplename, affected, index,
@@ -348,25 +356,248 @@ def add_vcf(info, vcf_file):
     vcf_file (FileStorage): Uploaded VCF file.
 
     Returns:
-        str: Filename of saved VCF file.
+        ImportJob: The import job (in error if the VCF is not valid).
     """
     random_hex = secrets.token_hex(8)
 
-    f_ext = Path(vcf_file.filename).suffix
-
-    vcf_fn = random_hex + f_ext
+    vcf_fn = random_hex + vcf_extension(vcf_file.filename)
     vcf_path_base = Path(app.root_path).joinpath('static/temp/vcf/')
     vcf_path = vcf_path_base.joinpath(vcf_fn)
     vcf_file.save(vcf_path)
 
     info["vcf_path"] = str(vcf_path)
+    job = enqueue_import(info)
+    if job.state == "error":
+        vcf_path.unlink()
+
+    return job
+
+
+def vcf_extension(filename):
+    """
+    Get the extension of an uploaded VCF, keeping the whole extension of
+    compressed VCF ('.vcf.gz').
+
+    Parameters:
+    filename (str): The name of the uploaded file.
+
+    Returns:
+        str: The extension of the file.
+    """
+    return ".vcf.gz" if filename.endswith(".gz") else Path(filename).suffix
+
+
+def add_upload(info, upload_id):
+    """
+    Add the import of a sample whose VCF was uploaded by chunks (see
+    `upload_start`) to the queue.
+
+    Parameters:
+    info (dict): Sample information (see `add_vcf`).
+    upload_id (str): The identifier of the complete upload.
+
+    Returns:
+        ImportJob: The import job (in error if the VCF is not valid), None if
+                   the upload is not complete.
+    """
+    upload = Upload.query.get(upload_id)
+    if not upload or upload.user_ID != current_user.id or upload.state != "complete":
+        return None
+
+    vcf_path = Path(upload.path)
+    info["vcf_path"] = str(vcf_path)
+    job = enqueue_import(info)
+    db.session.delete(upload)
+    db.session.commit()
+    if job.state == "error":
+        vcf_path.unlink()
+
+    return job
+
+
+def get_upload(id, lock=False):
+    """
+    Get an upload of the current user.
+
+    Parameters:
+    id (str): The identifier of the upload.
+    lock (bool): Whether the upload is locked until the end of the
+                 transaction (i.e. a chunk sent twice at once is written once).
+
+    Returns:
+        Upload: The upload.
+
+    Raises:
+        InvalidAPIUsage: If the upload does not exist (404).
+    """
+    query = Upload.query.filter_by(id=id)
+    if lock:
+        query = query.with_for_update()
+    upload = query.first()
+    if not upload or upload.user_ID != current_user.id:
+        raise InvalidAPIUsage(f"Upload {id} not found", status_code=404)
+    return upload
+
+
+def upload_json(upload):
+    return {
+        "id": upload.id,
+        "state": upload.state,
+        "filename": upload.filename,
+        "size": upload.size,
+        "chunk_size": upload.chunk_size,
+        "received": upload.received
+    }
+
+
+@app.route("/upload/vcf", methods=['POST'])
+@login_required
+def upload_start():
+    """
+    Start the upload of a VCF by chunks.
+
+    Large VCF are sent in chunks of `UPLOAD_CHUNK_SIZE` bytes written
+    straight to the temporary folder (see `upload_chunk`), so that an
+    interrupted upload resumes from the last chunk received (see
+    `upload_status`). Once complete, the upload is checked (see
+    `upload_complete`) and its identifier replaces the file in the form of
+    `create_variant`.
+
+    Request JSON:
+        - filename: The name of the VCF ('.vcf' or '.vcf.gz').
+        - size: The size of the VCF in bytes.
+
+    Returns:
+        A JSON object describing the upload: id, state, filename, size,
+        chunk_size and received (bytes received).
+    """
+    data = request.get_json(silent=True) or dict()
+    filename = str(data.get("filename", ""))
+    if not filename.lower().endswith((".vcf", ".vcf.gz")):
+        raise InvalidAPIUsage("Only VCF files ('.vcf' or '.vcf.gz') can be uploaded.")
+    try:
+        size = int(data["size"])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidAPIUsage("The size of the VCF is required.")
+    if size <= 0:
+        raise InvalidAPIUsage("The VCF is empty.")
+
+    random_hex = secrets.token_hex(16)
+    vcf_path = Path(app.root_path).joinpath('static/temp/vcf/').joinpath(f'{random_hex}.upload')
+    vcf_path.touch()
+    upload = Upload(
+        id=random_hex,
+        user_ID=current_user.id,
+        filename=filename,
+        path=str(vcf_path),
+        size=size,
+        chunk_size=config["IMPORT"]["UPLOAD_CHUNK_SIZE"],
+        chunks=list()
+    )
+    db.session.add(upload)
+    db.session.commit()
+    return jsonify(upload_json(upload))
+
+
+@app.route("/upload/vcf/<string:id>")
+@login_required
+def upload_status(id):
+    """
+    Get the state of an upload, to resume it from the next chunk.
+
+    Returns:
+        A JSON object describing the upload (see `upload_start`).
+    """
+    return jsonify(upload_json(get_upload(id)))
+
 
-    token_fn = random_hex + ".token"
-    token_path = vcf_path_base.joinpath(token_fn)
-    with open(token_path, "w") as tf:
-        tf.write(json.dumps(info))
+@app.route("/upload/vcf/<string:id>/<int:index>", methods=['PUT'])
+@login_required
+def upload_chunk(id, index):
+    """
+    Write a chunk of an upload.
 
-    return vcf_fn
+    Chunks are sent in order, each one in the body of the request with its
+    SHA-256 in the 'X-Chunk-SHA256' header: a corrupted chunk is not written.
+    A chunk already received (i.e. its acknowledgement was lost) is
+    acknowledged again.
+
+    Returns:
+        A JSON object describing the upload (see `upload_start`).
+    """
+    upload = get_upload(id, lock=True)
+    if upload.state != "uploading":
+        raise InvalidAPIUsage(f"Upload {id} is {upload.state}", status_code=409)
+    expected = request.headers.get("X-Chunk-SHA256", "").lower()
+    if index < len(upload.chunks):
+        if upload.chunks[index] != expected:
+            raise InvalidAPIUsage(f"Chunk {index} differs from the one received", status_code=409)
+        return jsonify(upload_json(upload))
+    if index != len(upload.chunks):
+        raise InvalidAPIUsage(f"Chunk {len(upload.chunks)} expected", status_code=409)
+
+    length = min(upload.chunk_size, upload.size - upload.received)
+    digest = hashlib.sha256()
+    written = 0
+    with open(upload.path, "r+b") as vcf:
+        vcf.seek(upload.received)
+        while written <= length:
+            block = request.stream.read(min(1 << 20, length + 1 - written))
+            if not block:
+                break
+            digest.update(block)
+            vcf.write(block)
+            written += len(block)
+        if written != length or digest.hexdigest() != expected:
+            vcf.truncate(upload.received)
+            raise InvalidAPIUsage(f"Chunk {index} is corrupted ({written} bytes received, {length} expected)")
+        # Drop what an interrupted write of this chunk left after it
+        vcf.truncate(upload.received + length)
+        vcf.flush()
+        os.fsync(vcf.fileno())
+
+    upload.chunks = upload.chunks + [expected]
+    upload.received += length
+    db.session.commit()
+    return jsonify(upload_json(upload))
+
+
+@app.route("/upload/vcf/<string:id>/complete", methods=['POST'])
+@login_required
+def upload_complete(id):
+    """
+    Check a complete upload.
+
+    The SHA-256 of the chunks written is computed again from the file and
+    the SHA-256 of these digests (concatenated in order) must be the one
+    computed by the client from the file it sent.
+
+    Request JSON:
+        - sha256: The SHA-256 of the SHA-256 digests of the chunks.
+
+    Returns:
+        A JSON object describing the upload (see `upload_start`).
+    """
+    upload = get_upload(id, lock=True)
+    if upload.state == "complete":
+        return jsonify(upload_json(upload))
+    if upload.received != upload.size:
+        raise InvalidAPIUsage(f"Upload {id} is not complete ({upload.received}/{upload.size} bytes)", status_code=409)
+
+    data = request.get_json(silent=True) or dict()
+    digest = hashlib.sha256()
+    with open(upload.path, "rb") as vcf:
+        for block in iter(lambda: vcf.read(upload.chunk_size), b""):
+            digest.update(hashlib.sha256(block).digest())
+    if digest.hexdigest() != str(data.get("sha256", "")).lower():
+        raise InvalidAPIUsage(f"Upload {id} differs from the file sent")
+
+    vcf_path = Path(upload.path).with_name(upload.id + vcf_extension(upload.filename))
+    Path(upload.path).rename(vcf_path)
+    upload.path = str(vcf_path)
+    upload.state = "complete"
+    db.session.commit()
+    return jsonify(upload_json(upload))
 
 
 ###############################################################################
@@ -707,7 +938,19 @@ def create_variant():
             ],
             "interface": True
         }
-        add_vcf(info, uploadSampleForm.vcf_file.data)
+        if uploadSampleForm.upload.data:
+            job = add_upload(info, uploadSampleForm.upload.data)
+            if job is None:
+                flash(f'Sample {uploadSampleForm.samplename.data} not added: the upload of the VCF is not complete', 'error')
+                return redirect(url_for('index'))
+        elif uploadSampleForm.vcf_file.data:
+            job = add_vcf(info, uploadSampleForm.vcf_file.data)
+        else:
+            flash(f'Sample {uploadSampleForm.samplename.data} not added: no VCF file', 'error')
+            return redirect(url_for('index'))
+        if job.state == "error":
+            flash(f'Sample {uploadSampleForm.samplename.data} not added: {job.error}', 'error')
+            return redirect(url_for('index'))
 
         flash(f'Sample {uploadSampleForm.samplename.data} will be added soon!',
               'info')
@@ -738,6 +981,8 @@ def create_panel():
         A rendered template of the upload panel form.
     """
     uploadPanelForm = UploadPanelForm()
+    # Set before the validation, which checks the selected teams
+    uploadPanelForm.teams.choices = [(team.id, team.teamname) for team in Team.query.all()]
     if "submit" in request.form and uploadPanelForm.validate_on_submit():
         panel = Bed(name=uploadPanelForm.name.data)
         panel.teams = [Team.query.get(team_id) for team_id in uploadPanelForm.teams.data]
@@ -1039,7 +1284,11 @@ def json_variants(id, idbed=False, version=-1):
 
     ##################################################
 
-    for var2sample in sample.variants:
+    # Load the variants and the latest version of their annotations at once
+    var2samples = Var2Sample.query.filter_by(sample_ID=sample.id).options(
+        joinedload(Var2Sample.variant).undefer_group("annotations")
+    )
+    for var2sample in var2samples:
         variant = var2sample.variant
         try:
             if bed and not bed.varInBed(variant):
@@ -1048,7 +1297,10 @@ def json_variants(id, idbed=False, version=-1):
             pass
         if var2sample.hide:
             continue
-        annotations = variant.annotations
+        try:
+            annotation = variant.get_annotations(version)
+        except IndexError:
+            continue
         main_annot = None
         consequence_score = -999
         canonical = False
@@ -1056,7 +1308,7 @@ def json_variants(id, idbed=False, version=-1):
         protein_coding = False
         preferred_transcript = False
 
-        for annot in annotations[version]["ANN"]:
+        for annot in annotation["ANN"]:
             current_consequence_score = annot['consequenceScore']
             current_canonical = annot['canonical']
             current_refseq = True if annot['SOURCE'] == 'RefSeq' else False
@@ -1450,6 +1702,196 @@ def json_history(type=None, id=None):
     return jsonify({"data":historics_list})
 
 
+@app.route("/json/metrics/<string:type>/<int:id>")
+@app.route("/json/metrics/")
+@login_required
+def json_metrics(type=None, id=None):
+    """
+    Endpoint for retrieving the import metrics of a sample or of all samples.
+
+    Args:
+        type (str): The type of metrics to be returned, only "sample".
+        id (int): The ID of the sample to retrieve the metrics for.
+
+    Returns:
+        A JSON object with the following keys:
+        - data: A list of dictionaries, each representing an import (most
+            recent first). Each dictionary has the following keys:
+            - sample: The name of the imported sample.
+            - caller: The name of the caller of the imported VCF.
+            - start, end: The dates of the import (formatted as
+                          "YYYY/MM/DD HH:MM:SS").
+            - success: Whether the import succeeded.
+            - counts: The numbers of records loaded, of known variants
+                      (not sent to VEP), of variants annotated and of new
+                      transcripts.
+            - times: The seconds spent in each phase of the import (claim,
+                     known, vep, parsing, transcripts, variants, var2sample,
+                     commit and total).
+    """
+    if type == "sample":
+        metrics = ImportMetrics.query.filter_by(sample_ID=id)
+    else:
+        metrics = ImportMetrics.query
+    metrics_list = list()
+    for metric in metrics.order_by(ImportMetrics.date_start.desc()):
+        metrics_list.append({
+            "sample": metric.sample.samplename,
+            "caller": metric.caller,
+            "start": metric.date_start.strftime("%Y/%m/%d %H:%M:%S"),
+            "end": metric.date_end.strftime("%Y/%m/%d %H:%M:%S") if metric.date_end else None,
+            "success": metric.success,
+            "counts": {
+                "records": metric.records,
+                "known": metric.known,
+                "annotated": metric.annotated,
+                "new_transcripts": metric.new_transcripts
+            },
+            "times": {
+                "claim": metric.time_claim,
+                "known": metric.time_known,
+                "vep": metric.time_vep,
+                "parsing": metric.time_parsing,
+                "transcripts": metric.time_transcripts,
+                "variants": metric.time_variants,
+                "var2sample": metric.time_var2sample,
+                "commit": metric.time_commit,
+                "total": metric.time_total
+            }
+        })
+
+    return jsonify({"data":metrics_list})
+
+
+@app.route("/json/reannotation")
+@login_required
+@admin_required
+def json_reannotation():
+    """
+    Endpoint for retrieving the progress of the re-annotations of variants.
+
+    Returns:
+        A JSON object with the following keys:
+        - data: A list of dictionaries, each representing a re-annotation
+            (most recent first). Each dictionary has the following keys:
+            - id: The identifier of the re-annotation.
+            - state: running, paused, done or error.
+            - genome: The genome of the variants.
+            - config: The hash of the VEP configuration used.
+            - total: The number of annotated variants when it started.
+            - processed: The number of variants sent to VEP.
+            - reannotated: The number of variants with a new annotation
+                           version.
+            - progress: The percentage of the variants processed.
+            - rate: The number of variants processed per second of work.
+            - remaining: The estimated seconds of work left.
+            - start, end: The dates of the re-annotation (formatted as
+                          "YYYY/MM/DD HH:MM:SS").
+            - error: The error message if the re-annotation failed.
+    """
+    jobs = list()
+    for job in Reannotation.query.order_by(Reannotation.id.desc()):
+        rate = job.processed / job.time_total if job.time_total else None
+        remaining = max(job.total - job.processed, 0)
+        jobs.append({
+            "id": job.id,
+            "state": job.state,
+            "genome": job.genome,
+            "config": job.config_hash,
+            "total": job.total,
+            "processed": job.processed,
+            "reannotated": job.reannotated,
+            "progress": round(100 * job.processed / job.total, 2) if job.total else 100.0,
+            "rate": rate,
+            "remaining": remaining / rate if rate and job.state in ["running", "paused"] else None,
+            "start": job.date_start.strftime("%Y/%m/%d %H:%M:%S") if job.date_start else None,
+            "end": job.date_end.strftime("%Y/%m/%d %H:%M:%S") if job.date_end else None,
+            "error": job.error
+        })
+    return jsonify({"data": jobs})
+
+
+@app.route("/reannotation/start", methods=['POST'])
+@login_required
+@admin_required
+def reannotation_start():
+    """
+    Start the re-annotation of all the variants with the current VEP
+    configuration (see `seal.schedulers.start_reannotation`).
+
+    Returns:
+        A JSON object with the id and the state of the re-annotation.
+    """
+    job = start_reannotation()
+    return jsonify({"id": job.id, "state": job.state})
+
+
+@app.route("/stream/imports")
+@login_required
+def stream_imports():
+    """
+    Server-sent events stream of the progress of the import jobs of the
+    user (of all users for admins).
+
+    The jobs are checked every `PROGRESS_INTERVAL` seconds, and an event is
+    sent only when the progress of a job changed (the loader updates it with
+    each chunk of records). The stream ends once no job is waiting or
+    running, so that the page does not poll SEAL in vain. It also ends after
+    `PROGRESS_STREAM_DURATION` seconds, so that an open page does not hold a
+    web worker for a whole import: the browser reconnects by itself (after
+    the `retry` delay) and gets the progress of all the jobs again.
+
+    Returns:
+        A 'text/event-stream' response with the following events:
+        - progress: A JSON object describing a job whose progress changed
+            (see `seal.schedulers.import_progress`): id, state, lane, samples,
+            position in the queue, phase, loaded, total, sample and error.
+        - idle: No job is waiting or running anymore.
+    """
+    user_id = current_user.id
+    admin = current_user.admin
+    interval = config["IMPORT"]["PROGRESS_INTERVAL"]
+    duration = config["IMPORT"]["PROGRESS_STREAM_DURATION"]
+
+    def events():
+        yield f"retry: {int(interval * 1000)}\n\n"
+        sent = dict()
+        start = last = time.monotonic()
+        while True:
+            jobs = ImportJob.query.filter(or_(
+                ImportJob.state.in_(JOB_WAITING + JOB_RUNNING),
+                ImportJob.id.in_(list(sent))
+            ))
+            if not admin:
+                jobs = jobs.filter(ImportJob.data["userid"].as_integer() == user_id)
+            jobs = jobs.order_by(ImportJob.id).all()
+            positions = queue_positions() if any(job.state in JOB_WAITING for job in jobs) else dict()
+            progress = [import_progress(job, positions) for job in jobs]
+            # End the transaction: the next check sees the jobs as committed by the workers
+            db.session.rollback()
+
+            for job in progress:
+                if sent.get(job["id"]) != job:
+                    yield f"event: progress\ndata: {json.dumps(job)}\n\n"
+                    last = time.monotonic()
+            sent = {job["id"]: job for job in progress if job["state"] in JOB_WAITING + JOB_RUNNING}
+            if not sent:
+                yield "event: idle\ndata: {}\n\n"
+                return
+            if time.monotonic() - start >= duration:
+                return
+            if time.monotonic() - last > 15:
+                yield ": keepalive\n\n"
+                last = time.monotonic()
+            time.sleep(interval)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.route("/json/variant/<string:id>")
 @app.route("/json/variant/<string:id>/sample/<int:sample>")
 @app.route("/json/variant/<string:id>/version/<int:version>")
@@ -1497,6 +1939,10 @@ def json_variant(id, version=-1, sample=None):
             - user: The username of the user that have done the action.
     """
     variant = Variant.query.get(id)
+    try:
+        annotations = variant.get_annotations(version)
+    except IndexError as e:
+        raise InvalidAPIUsage(str(e), status_code=404)
     if sample is not None:
         sample = Sample.query.get(sample)
 
@@ -1539,7 +1985,7 @@ def json_variant(id, version=-1, sample=None):
         "pos": variant.pos,
         "ref": variant.ref,
         "alt": variant.alt,
-        "annotations": variant.annotations[version],
+        "annotations": annotations,
         "samples": samples,
         "comments": comments
     }
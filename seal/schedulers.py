@@ -18,23 +18,52 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import io
+import os
 import re
+import gzip
 import json
+import click
+import hashlib
 import time
+import heapq
 import numpy
+import itertools
 import random
+import socket
+import warnings
+import tempfile
+import threading
 import subprocess
+import multiprocessing
 import urllib.request
+import zlib
+import ctypes
+import ctypes.util
+import selectors
+import struct
+from bisect import bisect_right
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from anacore import annotVcf
+from anacore.abstractFile import isGzip
+from anacore.vcf import VCFIO
+from pysam import BGZFile, TabixFile
 
 from seal import app, scheduler, db, config
 from seal.models import (Sample, Variant, Family, Var2Sample, Run, Transcript,
-                         Team, Bed, Filter, History, Comment_sample, Clinvar)
+                         Team, Bed, Filter, History, Comment_sample, Clinvar,
+                         ImportJob, ImportMetrics, AnnotationCache,
+                         VariantAnnotation, AnnotationVersion, Reannotation,
+                         Upload, pack_annotations)
 
-from sqlalchemy import exc
+from sqlalchemy import (bindparam, case, cast, exc, exists, func,
+                        literal_column, or_, select, tuple_)
+from sqlalchemy.orm import aliased, undefer_group
+from sqlalchemy.dialects import postgresql
 
 CONSEQUENCES_DICT = {
     "stop_gained": 20,
@@ -113,6 +142,11 @@ SPLICEAI = [
     "SpliceAI_pred_DS_DG",
     "SpliceAI_pred_DS_DL"
 ]
+JOB_WAITING = ["queued"]
+JOB_RUNNING = ["annotating", "loading"]
+JOB_LANES = ["interactive", "routine", "backfill"]
+# Key of the advisory lock taken by the claims of jobs of capped lanes
+CLAIM_LOCK = 73450001
 
 
 # multicaller not opti but it works for our 2 callers process
@@ -308,6 +342,29 @@ def create_sample(data):
     return sample
 
 
+def get_members(data):
+    """
+    List the samples described by an import token.
+
+    A multi-sample VCF (e.g. a joint-called family) is imported with a
+    'samples' list mapping each VCF column ('vcf_sample') to a SEAL sample
+    ('samplename', 'index', 'affected'...). The other keys of the token (run,
+    family, teams, bed...) are shared by all the members and can be
+    overridden by each of them.
+
+    Args:
+        data (dict): The content of the token.
+
+    Returns:
+        list: The data of each sample, its VCF column is read from
+              'vcf_sample' (if missing, the first column of the VCF).
+    """
+    if "samples" not in data:
+        return [dict(data)]
+    shared = {key: value for key, value in data.items() if key != "samples"}
+    return [dict(shared, **member) for member in data["samples"]]
+
+
 class CommandFailedError(Exception):
     def __init__(self, returncode, stderr):
         self.returncode = returncode
@@ -317,6 +374,262 @@ class CommandFailedError(Exception):
         return f"Command failed with exit code {self.returncode} and error output: {self.stderr}"
 
 
+class InvalidImportError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+
+    def __str__(self):
+        return "Invalid import :\n" + "\n".join(f"  - {error}" for error in self.errors)
+
+
+VCF_COLUMNS = ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO"]
+VCF_MAX_ERRORS = 20
+# Primary contigs, the only ones imported
+RE_CONTIG = re.compile(r"^(chr)?([1-9]|1[0-9]|2[0-2]|X|Y|M|MT)$")
+RE_REF = re.compile(r"^[ACGTNacgtn]+$")
+
+
+def open_vcf(vcf_path, mode="r"):
+    """
+    Open a VCF as a text stream, compressed or not.
+
+    A VCF is read compressed when it starts with the gzip magic number
+    (bgzip or plain gzip), and written block-compressed (bgzip, so that it
+    can be indexed by tabix) when its name ends with '.gz'.
+
+    Args:
+        vcf_path (Path): The path of the VCF.
+        mode (str): 'r' to read the VCF, 'w' to write it.
+
+    Returns:
+        TextIO: The opened VCF.
+    """
+    if mode == "w":
+        if str(vcf_path).endswith(".gz"):
+            return io.TextIOWrapper(BGZFile(str(vcf_path), "wb"))
+        return open(vcf_path, "w")
+    if isGzip(str(vcf_path)):
+        return gzip.open(vcf_path, "rt")
+    return open(vcf_path, "r")
+
+
+def vcf_stem(vcf_path):
+    """
+    Get the name of a VCF without its '.vcf' or '.vcf.gz' extension.
+
+    Args:
+        vcf_path (Path): The path of the VCF.
+
+    Returns:
+        str: The name of the VCF without extension.
+    """
+    name = Path(vcf_path).name
+    for extension in [".gz", ".vcf"]:
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return name
+
+
+def temp_vcf(path_inout, name):
+    """
+    Get the path of a VCF written during an import.
+
+    These VCF are bgzip-compressed if `COMPRESS_TEMP` is set, to reduce the
+    I/O of the temporary directory.
+
+    Args:
+        path_inout (Path): The directory of temporary VEP files.
+        name (str): The name of the VCF without extension.
+
+    Returns:
+        Path: The path of the VCF.
+    """
+    extension = ".vcf.gz" if config["IMPORT"]["COMPRESS_TEMP"] else ".vcf"
+    return path_inout.joinpath(f"{name}{extension}")
+
+
+def validate_vcf(vcf_path, vcf_samples=None, max_records=None, require_contigs=False):
+    """
+    Check in a single pass that a VCF can be imported, before any sample is
+    created or any record is sent to VEP.
+
+    The header must declare the FORMAT fields DP and AD and the columns of the
+    samples. Records must be sorted (contigs in one block, increasing
+    positions), on primary contigs named consistently (1-22, X, Y, M/MT with
+    or without 'chr'), with DP and AD in their FORMAT and a valid REF and ALT.
+    Records of other contigs (alt, decoy, unplaced, EBV, HLA...) are accepted:
+    they are skipped when loaded (see `BatchLoader`).
+
+    Args:
+        vcf_path (Path): The path of the VCF.
+        vcf_samples (list): The sample columns read from the VCF (None: the
+                            first one).
+        max_records (int): The number of records checked (None: all of them),
+                           i.e. to only check the beginning of the VCF while
+                           a request is answered.
+        require_contigs (bool): Whether the header must declare the contigs,
+                                i.e. to merge the VCF of several callers
+                                (see `merge_caller_vcfs`).
+
+    Returns:
+        int: The number of records of the VCF (checked).
+
+    Raises:
+        InvalidImportError: With the problems found (at most VCF_MAX_ERRORS).
+    """
+    errors = list()
+
+    def error(message):
+        errors.append(f"{vcf_path.name}: {message}")
+        if len(errors) >= VCF_MAX_ERRORS:
+            raise InvalidImportError(errors)
+
+    formats = set()
+    formats_checked = set()
+    contigs = set()
+    columns = None
+    records = 0
+    seen = set()
+    current = None
+    last_pos = 0
+    prefixes = set()
+    try:
+        with open_vcf(vcf_path) as vcf:
+            first = vcf.readline()
+            if not first.startswith("##fileformat=VCF"):
+                raise InvalidImportError([f"{vcf_path.name}: not a VCF (no '##fileformat=VCF' first line)"])
+            for number, line in enumerate(vcf, 2):
+                if line.startswith("##"):
+                    if line.startswith("##FORMAT=<ID="):
+                        formats.add(line[13:].split(",", 1)[0])
+                    elif line.startswith("##contig=<ID="):
+                        contigs.add(line[13:].split(",", 1)[0].rstrip(">\n"))
+                    continue
+                if columns is None:
+                    columns = line.rstrip("\n").split("\t")
+                    if columns[:8] != VCF_COLUMNS:
+                        raise InvalidImportError([f"{vcf_path.name}: invalid header line {number} (expected {' '.join(VCF_COLUMNS)} FORMAT samples)"])
+                    if len(columns) < 10:
+                        raise InvalidImportError([f"{vcf_path.name}: no sample column"])
+                    missing = [sample for sample in vcf_samples or list() if sample not in columns[9:]]
+                    if missing:
+                        error(f"samples not found: {', '.join(missing)}")
+                    missing = [field for field in ["DP", "AD"] if field not in formats]
+                    if missing:
+                        error(f"FORMAT {', '.join(missing)} not declared in the header")
+                    if require_contigs and not contigs:
+                        error("contigs not declared in the header (needed to merge the VCF of the callers)")
+                    continue
+                if not line.strip():
+                    continue
+                if max_records is not None and records >= max_records:
+                    break
+                records += 1
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != len(columns):
+                    error(f"line {number}: {len(fields)} columns instead of {len(columns)}")
+                    continue
+                chrom, pos, _, ref, alt = fields[:5]
+                if chrom != current:
+                    if chrom in seen:
+                        error(f"line {number}: not sorted ({chrom} found again after {current})")
+                    elif contigs and chrom not in contigs:
+                        error(f"line {number}: contig '{chrom}' not declared in the header")
+                    seen.add(chrom)
+                    if RE_CONTIG.match(chrom):
+                        prefixes.add(chrom.startswith("chr"))
+                        if len(prefixes) > 1:
+                            error(f"line {number}: contigs named with and without 'chr'")
+                    current = chrom
+                    last_pos = 0
+                try:
+                    pos = int(pos)
+                except ValueError:
+                    error(f"line {number}: invalid position '{pos}'")
+                    continue
+                if pos < last_pos:
+                    error(f"line {number}: not sorted ({chrom}:{pos} after {chrom}:{last_pos})")
+                last_pos = pos
+                if not RE_REF.match(ref) or len(ref) > 500:
+                    error(f"line {number}: invalid REF '{ref[:50]}'")
+                if not alt or alt == "." or len(alt.split(",", 1)[0]) > 500:
+                    error(f"line {number}: invalid ALT '{alt[:50]}'")
+                if fields[8] not in formats_checked:
+                    keys = fields[8].split(":")
+                    if "DP" not in keys or "AD" not in keys:
+                        error(f"line {number}: no DP or AD in FORMAT '{fields[8]}'")
+                    formats_checked.add(fields[8])
+    except (UnicodeDecodeError, OSError, EOFError, zlib.error) as e:
+        raise InvalidImportError(errors + [f"{vcf_path.name}: unreadable ({e})"])
+    if columns is None:
+        error("no #CHROM header line")
+    elif not records:
+        error("no variant")
+    if errors:
+        raise InvalidImportError(errors)
+    return records
+
+
+def validate_import(data, add_caller=False, max_records=None):
+    """
+    Check that an import can be queued: its VCF are valid (see
+    `validate_vcf`) and the samples to create are not already in SEAL (same
+    name in the same run).
+
+    Args:
+        data (dict): The description of the import (content of a token).
+        add_caller (bool): Whether the import adds a caller to existing
+                           samples (they may still be waiting in the queue).
+        max_records (int): The number of records checked in each VCF (None:
+                           all of them).
+
+    Returns:
+        int: The number of records of the VCF (of all callers, checked).
+
+    Raises:
+        InvalidImportError: With the problems found.
+    """
+    errors = list()
+    members = get_members(data)
+    if "callers" in data:
+        inputs = [(caller.get("vcf_path"), caller.get("vcf_sample")) for caller in data["callers"]]
+        if len(members) > 1:
+            errors.append("several callers can only be imported for one sample")
+    else:
+        inputs = [(data.get("vcf_path"), member.get("vcf_sample")) for member in members]
+    if not add_caller:
+        for member in members:
+            if "samplename" not in member:
+                errors.append("no samplename")
+                continue
+            # Unlike `get_run`, a missing run is not created here
+            run = member.get("run") or dict()
+            if run.get("id"):
+                run = Run.query.get(run["id"])
+            elif run.get("name"):
+                run = Run.query.filter_by(name=run["name"]).first()
+                if run is None:
+                    continue
+            else:
+                run = None
+            if Sample.query.filter_by(samplename=member["samplename"], runid=run.id if run else None).first():
+                errors.append(f"sample '{member['samplename']}' already in SEAL{f' (run {run.name})' if run else ''}")
+
+    records = 0
+    for vcf_path in dict.fromkeys(vcf_path for vcf_path, _ in inputs):
+        if not vcf_path or not Path(vcf_path).exists():
+            errors.append(f"VCF not found: {vcf_path}")
+            continue
+        vcf_samples = [vcf_sample for path, vcf_sample in inputs if path == vcf_path and vcf_sample]
+        try:
+            records += validate_vcf(Path(vcf_path), vcf_samples, max_records, require_contigs="callers" in data)
+        except InvalidImportError as e:
+            errors.extend(e.errors)
+    if errors:
+        raise InvalidImportError(errors)
+    return records
+
+
 def extract_command_and_args(data, values):
     """
     Extract the command and arguments from the JSON data and format them using the provided values.
@@ -406,354 +719,3038 @@ def create_and_execute_shell_command(json_file, values):
     return exit_code, output
 
 
-# cron examples
-@scheduler.task('cron', id='import vcf', second="*/20")
-def importvcf():
-    # Check launchable
-    path_inout = Path(app.root_path).joinpath('static/temp/vcf/')
-    path_locker = path_inout.joinpath('.lock')
-    if path_locker.exists():
-        return
+def vep_shards(json_file):
+    """
+    Compute the number of VEP instances that can annotate a VCF at once.
 
-    tokens = get_token(path_inout)
+    Each instance uses the number of processes given by '--fork' in the VEP
+    configuration, the instances share the `VEP_CORES` of the host.
 
-    if tokens and not path_locker.exists():
-        # Create lock file
-        lockFile = open(path_locker, 'x')
-        lockFile.close()
-        for current_token in tokens:
-            # Change token to treat file
-            app.logger.info("---------------- Add a VCF ----------------")
-            current_file = current_token.with_suffix('.treat')
-            current_token.rename(current_file)
+    Args:
+        json_file (str): The path to the JSON file containing the command and its arguments.
 
-            # Load data
-            with current_file.open('r') as json_sample:
-                data = json.load(json_sample)
+    Returns:
+        int: The number of VEP instances (1 if the VCF should not be sharded).
+    """
+    with open(json_file, 'r') as f:
+        data = json.load(f)
+    fork = int(data['args'].get('--fork') or 1)
+    return max(1, config["IMPORT"]["VEP_CORES"] // fork)
 
-            # Check user
-            try:
-                user_id = data["userid"]
-            except KeyError:
-                user_id = 1
 
-            try:
-                date_import = data["date"]
-            except KeyError:
-                date_import = datetime.now()
+def vep_extension(json_file):
+    """
+    Get the extension of the VCF written by VEP.
 
-            try:
-                genome = data["genome"]
-            except KeyError:
-                genome = config["GENOME"]
+    VEP output is block-compressed when '--compress_output' is given in the
+    VEP configuration (i.e. 'bgzip').
 
-            # Come from interface
-            try:
-                interface = data["interface"]
-            except KeyError:
-                interface = False
-
-            vcf_path = Path(data["vcf_path"])
-            if not vcf_path.exists():
-                app.logger.error(f'Path does not exist for : {vcf_path}')
-                # path_locker.unlink()
-                return
-            status_final = False
-            if "add_caller" in data and data["add_caller"] == True:
-                sample = get_sample(data)
-                if not sample:
-                    app.logger.error(f'Sample does not found')
-                    # path_locker.unlink()
-                    return
-                msg = "Add new caller"
-                status_final = sample.status
-            else:
-                sample = create_sample(data)
-                msg = "Import Sample"
-            
-            call_name = "default"
-            if "caller" in data:
-                call_name = data["caller"]
-
-            i = 0
-            while call_name in sample.caller:
-                i += 1
-                call_name = f"default_{i}"
-                
-            sample.caller.append(call_name)
-            history = History(sample_ID=sample.id, user_ID=user_id, date=date_import, action=msg)
-            db.session.add(history)
-            db.session.commit()
+    Args:
+        json_file (str): The path to the JSON file containing the command and its arguments.
 
-            vcf_vep = path_inout.joinpath(f'{vcf_path.stem}.vep.vcf')
-            stats_vep = path_inout.joinpath(f'{vcf_path.stem}.vep.html')
-            clinvar_vcf = Path(app.root_path).joinpath(f'static/temp/clinvar/{genome}/current.vcf.gz')
+    Returns:
+        str: '.vep.vcf.gz' for a compressed output, '.vep.vcf' otherwise.
+    """
+    with open(json_file, 'r') as f:
+        data = json.load(f)
+    return ".vep.vcf.gz" if data['args'].get('--compress_output') else ".vep.vcf"
 
-            values = {
-                "vcf_path": vcf_path,
-                "vcf_vep": vcf_vep,
-                "stats_vep": stats_vep,
-                "ClinVar_vcf": clinvar_vcf
-            }
 
-            current_date = datetime.now().isoformat()
-            try:
-                app.logger.info("------ Variant Annotation with VEP ------")
-                create_and_execute_shell_command(Path(app.root_path).joinpath('static/vep.config.json'), values)
-                app.logger.info("------ END VEP ------")
-            except CommandFailedError as e:
-                app.logger.info(f"{type(e).__name__} : {e}")
-                if not status_final:
-                    sample.status = -1
-                # path_locker.unlink()
-                db.session.commit()
-                error_file = current_file.with_suffix('.error')
-                current_file.rename(error_file)
-                return
+def split_vcf(vcf_in, vcf_shards, records):
+    """
+    Split the records of a VCF into shards of consecutive records.
+
+    Shards are balanced genomic chunks: they hold the same number of records
+    (but the last one) in the order of the VCF, each with the full header.
+
+    Args:
+        vcf_in (Path): The VCF to split.
+        vcf_shards (list): The paths of the shards to write.
+        records (int): The number of records of the VCF (the last shard
+                       takes the records beyond it).
+
+    Returns:
+        list: The number of records written in each shard.
+    """
+    size = max(1, -(-records // len(vcf_shards)))
+
+    written = [0] * len(vcf_shards)
+    with ExitStack() as stack:
+        vcf_reader = stack.enter_context(open_vcf(vcf_in))
+        vcf_writers = [stack.enter_context(open_vcf(vcf_shard, 'w')) for vcf_shard in vcf_shards]
+        shard = 0
+        for line in vcf_reader:
+            if line.startswith('#'):
+                for vcf_writer in vcf_writers:
+                    vcf_writer.write(line)
+                continue
+            if written[shard] >= size and shard < len(vcf_shards) - 1:
+                shard += 1
+            vcf_writers[shard].write(line)
+            written[shard] += 1
+    return written
+
+
+def execute_vep_shards(json_file, values, shards, records=None):
+    """
+    Run several VEP instances at once on shards of a VCF and merge their
+    outputs.
+
+    The VCF is split by `split_vcf` in at most `shards` chunks of at least
+    `VEP_SHARD_SIZE` records. Each chunk is annotated by its own VEP process,
+    then the annotated chunks are concatenated in the same order, so that
+    the records of `values["vcf_vep"]` keep the coordinate order of the VCF.
+
+    Args:
+        json_file (str): The path to the JSON file containing the command and its arguments.
+        values (dict): A dictionary of values to be used to replace placeholders in the command arguments.
+        shards (int): The maximum number of VEP instances.
+        records (int): The number of records of the VCF, if known by the
+                       caller (None: they are counted).
+
+    Raises:
+        CommandFailedError: If one of the VEP instances fails.
+    """
+    vcf_path = Path(values["vcf_path"])
+    if records is None:
+        with open_vcf(vcf_path) as vcf_reader:
+            records = sum(1 for line in vcf_reader if not line.startswith('#'))
+    shards = max(1, min(shards, records // config["IMPORT"]["VEP_SHARD_SIZE"]))
+    if shards == 1:
+        create_and_execute_shell_command(json_file, values)
+        return
+
+    # Shards keep the compression of the VCF they come from
+    vcf_vep = Path(values["vcf_vep"])
+    stem = vcf_stem(vcf_vep)
+    input_extension = vcf_path.name[len(vcf_stem(vcf_path)):]
+    output_extension = vcf_vep.name[len(stem):]
+    shard_values = [
+        dict(
+            values,
+            vcf_path=vcf_vep.with_name(f'{stem}.shard{i}.input{input_extension}'),
+            vcf_vep=vcf_vep.with_name(f'{stem}.shard{i}{output_extension}'),
+            stats_vep=vcf_vep.with_name(f'{stem}.shard{i}.html')
+        ) for i in range(shards)
+    ]
+    split_vcf(vcf_path, [shard["vcf_path"] for shard in shard_values], records)
+    app.logger.info(f"  - {records} records annotated by {shards} VEP instances")
+
+    try:
+        with ThreadPoolExecutor(max_workers=shards) as pool:
+            futures = [pool.submit(create_and_execute_shell_command, json_file, shard) for shard in shard_values]
+            for future in futures:
+                future.result()
+
+        with open_vcf(vcf_vep, 'w') as vcf_writer:
+            for i, shard in enumerate(shard_values):
+                with open_vcf(shard["vcf_vep"]) as vcf_reader:
+                    for line in vcf_reader:
+                        if i == 0 or not line.startswith('#'):
+                            vcf_writer.write(line)
+    finally:
+        for shard in shard_values:
+            remove_file(shard["vcf_path"])
+            remove_file(shard["vcf_vep"])
+            remove_file(shard["stats_vep"])
+
+
+def stream_vep_records(json_file, values):
+    """Run VEP writing on its standard output and yield the annotated records
+    as they arrive, so that annotation and loading overlap.
+
+    Args:
+        json_file (str): The path to the JSON file containing the command and its arguments.
+        values (dict): A dictionary of values to be used to replace placeholders in the command arguments
+                       ('vcf_vep' should be 'STDOUT').
+
+    Yields:
+        anacore.annotVcf.AnnotVCFRecord: The annotated records.
+
+    Raises:
+        CommandFailedError: If VEP exits with a non-zero exit code.
+    """
+    with open(json_file, 'r') as f:
+        data = json.load(f)
+    # The standard output is read as it comes: it is not compressed
+    data['args'].pop('--compress_output', None)
+    command, args = extract_command_and_args(data, values)
+    shell_command = [command] + args
 
-            with annotVcf.AnnotVCFIO(vcf_vep) as vcf_io:
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(shell_command, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            with annotVcf.AnnotVCFIO(f"/dev/fd/{process.stdout.fileno()}") as vcf_io:
                 for v in vcf_io:
-                    if v.alt[0] == "*" or v.alt[0] == "<*>" :
-                        continue
-                    variant = Variant.query.get(f"chr{v.chrom.replace('chr','')}-{v.pos}-{v.ref}-{v.alt[0]}")
-                    if not variant:
-                        variant = Variant(
-                            id=f"chr{v.chrom.replace('chr','')}-{v.pos}-{v.ref}-{v.alt[0]}",
-                            chr=f"chr{v.chrom.replace('chr','')}",
-                            pos=v.pos,
-                            ref=v.ref,
-                            alt=v.alt[0])
-                        db.session.add(variant)
-
-                    if not variant.annotations:
-                        annotations = [{
-                            "date": current_date,
-                            "ANN": list()
-                        }]
-
-                        for annot in v.info["ANN"]:
-                            variant.clinvar_VARID = annot["ClinVar"]
-                            variant.clinvar_CLNSIG = annot["ClinVar_CLNSIG"]
-                            variant.clinvar_CLNSIGCONF = ''.join(annot["ClinVar_CLNSIGCONF"].split("&")) if annot["ClinVar_CLNSIGCONF"] else None
-                            variant.clinvar_CLNREVSTAT = ''.join(annot["ClinVar_CLNREVSTAT"].split("&")) if annot["ClinVar_CLNREVSTAT"] else None
-                            # Split annotations
-                            for splitAnn in ANNOT_TO_SPLIT:
-                                if splitAnn == 'VAR_SYNONYMS':
-                                    try:
-                                        var_synonyms = dict()
-                                        for vs in annot[splitAnn].split("--"):
-                                            key, values = vs.split("::")
-                                            values_array = values.split("&")
-                                            var_synonyms[key] = values_array
-
-                                        annot[splitAnn] = var_synonyms
-                                    except AttributeError:
-                                        annot[splitAnn] = dict()
-                                else:
-                                    try:
-                                        annot[splitAnn] = annot[splitAnn].split("&")
-                                    except AttributeError:
-                                        annot[splitAnn] = []
-
-                            # transcript
-                            transcript = Transcript.query.get(annot["Feature"])
-                            if not transcript and annot["Feature"] is not None:
-                                transcript = Transcript(
-                                    feature=annot["Feature"],
-                                    biotype=annot["BIOTYPE"],
-                                    feature_type=annot["Feature_type"],
-                                    symbol=annot["SYMBOL"],
-                                    symbol_source=annot["SYMBOL_SOURCE"],
-                                    gene=annot["Gene"],
-                                    source=annot["SOURCE"],
-                                    protein=annot["ENSP"],
-                                    canonical=annot["CANONICAL"],
-                                    hgnc=annot["HGNC_ID"]
-                                )
-                                db.session.add(transcript)
-
-                            # Get consequence score
-                            consequence_score = 0
-                            for consequence in annot["Consequence"]:
-                                consequence_score += CONSEQUENCES_DICT[consequence]
-                            annot["consequenceScore"] = consequence_score
-
-                            # Get Exon/Intron
-                            annot["EI"] = None
-                            if annot["EXON"] is not None:
-                                annot["EI"] = f"{annot['EXON']}"
-                            if annot["INTRON"] is not None:
-                                annot["EI"] = f"{annot['INTRON']}"
-
-                            # Get Exon/Intron
-                            annot["canonical"] = True if annot['CANONICAL'] == 'YES' else False
-
-                            # missense
-                            missenses = list()
-                            for value in MISSENSES:
-                                missenses.append(annot[value])
-                            missenses = numpy.array(missenses, dtype=numpy.float64)
-                            mean = numpy.nanmean(missenses)
-                            annot["missensesMean"] = None if numpy.isnan(mean) else mean
-
-                            # max spliceAI
-                            spliceAI = list()
-                            for value in SPLICEAI:
-                                spliceAI.append(annot[value])
-                            spliceAI = numpy.array(spliceAI, dtype=numpy.float64)
-                            max = numpy.nanmax(spliceAI)
-                            annot["spliceAI"] = None if numpy.isnan(max) else max
-
-                            # max MaxEntScan
-                            annot["MES_var"] = None
-                            if (annot["MaxEntScan_alt"] is not None
-                                    and annot["MaxEntScan_ref"] is not None):
-                                annot["MES_var"] = -100 + (float(annot["MaxEntScan_alt"]) * 100) / float(annot["MaxEntScan_ref"])
-
-                            annotations[-1]["ANN"].append(annot)
-                        variant.annotations = annotations
-
-                    # If duplicate variant for sample :
-                    #   - catch exception
-                    #   - add to history & comments
-                    try:
-                        samplename_vcf = list(v.samples.keys())[0]
-                        vcf_depth = v.samples[samplename_vcf]["DP"]
-                        vcf_allelic_depth = v.samples[samplename_vcf]["AD"][1]
-                        caller = {
-                            call_name: {
-                                "depth": int(vcf_depth),
-                                "allelic_depth": int(vcf_allelic_depth),
-                                "allelic_freq":  int(vcf_allelic_depth)/int(vcf_depth),
-                                "filter": v.filter
-                            }
-                        }
-                        v2s = Var2Sample.query.get((variant.id, sample.id))
-                        if not v2s:
-                            v2s = Var2Sample(
-                                variant_ID=variant.id,
-                                sample_ID=sample.id,
-                                depth=vcf_depth,
-                                allelic_depth=vcf_allelic_depth,
-                                filter=v.filter,
-                                caller=caller)
-                            db.session.add(v2s)
-                        # BUG : need to do 2 commit (dont know why...)
-                        t = v2s.caller
-                        t.update(caller)
-                        v2s.caller = t
-                        db.session.commit()
-                        v2s.caller = t
-                        db.session.commit()
-                        samplename_vcf = list(v.samples.keys())[0]
-                        vcf_depth = v.samples[samplename_vcf]["DP"]
-                        vcf_allelic_depth = v.samples[samplename_vcf]["AD"][1]
-                        if v2s.depth is None or vcf_depth > v2s.depth:
-                            v2s.depth = vcf_depth
-                        if v2s.allelic_freq is None or float(int(vcf_allelic_depth)/int(vcf_depth)) > v2s.allelic_freq:
-                            v2s.allelic_freq = float(int(vcf_allelic_depth)/int(vcf_depth))
-                        if v2s.allelic_depth is None or int(vcf_allelic_depth) > v2s.allelic_depth:
-                            v2s.allelic_depth = int(vcf_allelic_depth)
-                        if v2s.depth is None or int(vcf_depth) > v2s.depth:
-                            v2s.depth = int(vcf_depth)
-                        if not v2s.pass_filter and v.filter == ['PASS']:
-                            v2s.pass_filter = True
-                        db.session.commit()
-                    except exc.IntegrityError as e:
-                        db.session.rollback()
-                        app.logger.info(f"{type(e).__name__} : {e}")
-                        history = History(
-                            sample_ID=sample.id,
-                            user_ID=user_id,
-                            date=datetime.now(),
-                            action=f"{type(e).__name__}")
-                        db.session.add(history)
-                        comment = Comment_sample(
-                            comment=f"{type(e).__name__} : {e}",
-                            sampleid=sample.id,
-                            date=datetime.now(),
-                            userid=user_id)
-                        db.session.add(comment)
-                        db.session.commit
-            db.session.commit()
-            current_file.unlink()
-            vcf_vep.unlink()
-            stats_vep.unlink()
-            if interface:
-                vcf_path.unlink()
-            history = History(
-                sample_ID=sample.id,
-                user_ID=user_id,
-                date=datetime.now(),
-                action=f"Sample Imported")
-            db.session.add(history)
-            if not status_final:
-                sample.status = 1
-            db.session.commit()
+                    yield v
+        except Exception:
+            # A truncated output is first of all a VEP failure
+            if process.wait() == 0:
+                raise
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            returncode = process.wait()
+
+        stderr.seek(0)
+        if returncode != 0:
+            app.logger.error(f"Command {shell_command} failed with exit code {returncode}")
+            raise CommandFailedError(returncode, stderr.read())
+        app.logger.info(f"Command {shell_command} executed successfully")
+
+
+def read_annotated_vcf(vcf_vep):
+    """
+    Yield the records of an annotated VCF.
 
-        path_locker.unlink()
+    Args:
+        vcf_vep (Path): The VCF annotated by VEP.
 
-def update_clinvar(vcf, version, genome=config["GENOME"]):
-    app.logger.info(f"ClinVar Version : '{version}' processing")
-    # Switch on maintenance mode
-    app.config["MAINTENANCE"] = True
-    app.config["MAINTENANCE_REASON"] = "Update ClinVar"
+    Yields:
+        anacore.annotVcf.AnnotVCFRecord: The annotated records.
+    """
+    with annotVcf.AnnotVCFIO(vcf_vep) as vcf_io:
+        for v in vcf_io:
+            yield v
 
-    # Define paths
-    new_clinvar = Path(vcf)
-    new_clinvar_index = Path(f"{new_clinvar}.tbi")
-    current = Path(app.root_path).joinpath(f'static/temp/clinvar/{genome}/current.vcf.gz')
-    current_index = Path(f"{current}.tbi")
 
-    # Create new clinvar entry
-    clinvar = Clinvar(version=version, genome=genome, current=False)
-    db.session.add(clinvar)
+def split_known_variants(vcf_path, vcf_novel, chunk_size=None, cache=None, skip_known=True):
+    """
+    Write the records of a VCF whose variant is not annotated in SEAL yet.
+
+    Variant keys are looked up in bulk, one query per chunk of records. The
+    header is kept so that the reduced VCF can be annotated by VEP. Variants
+    found in the annotation cache are not written either.
+
+    Args:
+        vcf_path (Path): The VCF of the sample.
+        vcf_novel (Path): The reduced VCF to write.
+        chunk_size (int): The number of keys looked up per query.
+        cache (tuple): The genome and VEP configuration hash of the
+                       annotation cache to look up (None to skip it).
+        skip_known (bool): Whether the variants annotated in SEAL are left
+                           out (False: only the cache is looked up).
+
+    Returns:
+        tuple: The sets of known and cached variant keys and the number of
+               records written in the reduced VCF.
+    """
+    chunk_size = chunk_size or config["IMPORT"]["CHUNK_SIZE"]
+    known = set()
+    cached = set()
+    novel = 0
+
+    def write_chunk(chunk, vcf_out):
+        keys = set(key for key, _ in chunk)
+        annotated = set()
+        if skip_known:
+            annotated = set(
+                id for (id,) in db.session.query(Variant.id).filter(
+                    Variant.id.in_(keys),
+                    is_annotated(Variant.__table__.c)
+                )
+            )
+        in_cache = set()
+        if cache and keys - annotated:
+            in_cache = set(
+                id for (id,) in db.session.query(AnnotationCache.variant_ID).filter(
+                    AnnotationCache.variant_ID.in_(keys - annotated),
+                    AnnotationCache.genome == cache[0],
+                    AnnotationCache.config_hash == cache[1]
+                )
+            )
+        written = 0
+        for key, line in chunk:
+            if key in annotated:
+                known.add(key)
+            elif key in in_cache:
+                cached.add(key)
+            else:
+                vcf_out.write(line)
+                written += 1
+        return written
+
+    with open_vcf(vcf_path) as vcf_in, open_vcf(vcf_novel, 'w') as vcf_out:
+        chunk = list()
+        for line in vcf_in:
+            if line.startswith('#'):
+                vcf_out.write(line)
+                continue
+            chrom, pos, _, ref, alt = line.split('\t', 5)[:5]
+            alt = alt.split(',')[0]
+            if alt == "*" or alt == "<*>":
+                continue
+            chunk.append((variant_key(chrom, pos, ref, alt), line))
+            if len(chunk) >= chunk_size:
+                novel += write_chunk(chunk, vcf_out)
+                chunk = list()
+        if chunk:
+            novel += write_chunk(chunk, vcf_out)
     db.session.commit()
+    return known, cached, novel
 
-    # Try to update
-    try:
-        with annotVcf.AnnotVCFIO(new_clinvar) as vcf_io:
-            for v in vcf_io:
-                variant = Variant.query.get(f"chr{v.chrom.replace('chr','')}-{v.pos}-{v.ref}-{v.alt[0]}")
-                if variant:
-                    variant.clinvar_VARID = v.id
-                    variant.clinvar_CLNSIG = ''.join(v.info["CLNSIG"]) if "CLNSIG" in v.info else None
-                    variant.clinvar_CLNSIGCONF = ''.join(v.info["CLNSIGCONF"]) if "CLNSIGCONF" in v.info else None
-                    variant.clinvar_CLNREVSTAT = ''.join(v.info["CLNREVSTAT"]) if "CLNREVSTAT" in v.info else None
 
-        # Update Clinvar database
-        for c in Clinvar.query.filter_by(genome=genome, current=True).all():
-            c.current = False
-        clinvar.current = True
-        db.session.commit()
-        new_clinvar.rename(current)
-        new_clinvar_index.rename(current_index)
-    except Exception as e:
-        db.session.rollback()
-        path_log = Path(app.root_path).joinpath('static/temp/clinvar/error')
-        with open(path_log, "w") as log:
-            log.write(f"Error on file: {new_clinvar}")
-            log.write(e)
-        app.logger.error(e)
-    finally:
-        # Switch off maintenance mode
-        app.config["MAINTENANCE"] = False
-        del app.config["MAINTENANCE_REASON"]
+def read_known_records(vcf_path, known):
+    """
+    Yield the records of a VCF whose variant is already annotated in SEAL.
+
+    Args:
+        vcf_path (Path): The VCF of the sample.
+        known (set): The keys of the variants already annotated.
+
+    Yields:
+        anacore.vcf.VCFRecord: The records of known variants.
+    """
+    if not known:
         return
+    with VCFIO(vcf_path) as vcf_io:
+        for v in vcf_io:
+            if variant_key(v.chrom, v.pos, v.ref, v.alt[0]) in known:
+                yield v
 
 
-@scheduler.task('cron', id='update clinvar', day_of_week="*")
-def check_clinvar(genome=config["GENOME"]):
-    path_inout = Path(app.root_path).joinpath('static/temp/vcf/')
-    path_locker = path_inout.joinpath('.lock')
-    app.logger.info("START CLINVAR UPDATE")
+def vep_config_hash(json_file, genome):
+    """
+    Identify the configuration of VEP annotating the variants of a genome.
 
-    while path_locker.exists():
-        app.logger.debug("  - waiting free time (locker file)")
-        time.sleep(60)
+    The hash covers the VEP configuration file and the current ClinVar
+    version of the genome: cached annotations of another hash are outdated.
+
+    Args:
+        json_file (str): The path to the JSON file containing the command and its arguments.
+        genome (str): The genome version.
+
+    Returns:
+        str: The SHA-256 hexadecimal digest.
+    """
+    clinvar = Clinvar.query.filter_by(genome=genome, current=True).first()
+    digest = hashlib.sha256(Path(json_file).read_bytes())
+    digest.update(f"{genome}:{clinvar.version if clinvar else None}".encode())
+    return digest.hexdigest()
+
+
+def read_cached_records(vcf_path, cached, cache, chunk_size=None):
+    """
+    Yield the records of a VCF whose annotations are in the annotation
+    cache, with their cached 'ANN' field.
+
+    Cache entries are read by chunk and their last use is updated in the
+    same statement (committed with the loaded chunk). A record whose entry
+    was evicted meanwhile is yielded without annotation.
+
+    Args:
+        vcf_path (Path): The VCF of the sample.
+        cached (set): The keys of the variants found in the cache.
+        cache (tuple): The genome and VEP configuration hash of the entries.
+        chunk_size (int): The number of entries read per query.
+
+    Yields:
+        anacore.vcf.VCFRecord: The records of cached variants.
+    """
+    if not cached:
+        return
+    chunk_size = chunk_size or config["IMPORT"]["CHUNK_SIZE"]
+    table = AnnotationCache.__table__
+
+    def read_chunk(chunk):
+        rows = db.session.execute(
+            table.update().where(
+                table.c.variant_ID.in_(set(key for key, _ in chunk)),
+                table.c.genome == cache[0],
+                table.c.config_hash == cache[1]
+            ).values(last_used=datetime.now()).returning(table.c.variant_ID, table.c.annotations)
+        )
+        annotations = dict(rows.all())
+        for key, v in chunk:
+            if key in annotations:
+                v.info["ANN"] = annotations[key]
+            yield v
+
+    chunk = list()
+    with VCFIO(vcf_path) as vcf_io:
+        for v in vcf_io:
+            key = variant_key(v.chrom, v.pos, v.ref, v.alt[0])
+            if key in cached:
+                chunk.append((key, v))
+            if len(chunk) >= chunk_size:
+                yield from read_chunk(chunk)
+                chunk = list()
+    if chunk:
+        yield from read_chunk(chunk)
+
+
+def cache_annotations(records, cache, chunk_size=None):
+    """
+    Yield VEP annotated records and store their annotations in the
+    annotation cache by chunks (committed with the loaded chunks).
+
+    Args:
+        records (iterator): The records annotated by VEP.
+        cache (tuple): The genome and VEP configuration hash of the entries.
+        chunk_size (int): The number of entries written per statement.
 
-    lockFile = open(path_locker, 'x')
-    lockFile.close()
+    Yields:
+        anacore.annotVcf.AnnotVCFRecord: The records, unchanged.
+    """
+    chunk_size = chunk_size or config["IMPORT"]["CHUNK_SIZE"]
+    table = AnnotationCache.__table__
+    # Annotations are serialized as they pass, the loader updates them in place
+    stmt = postgresql.insert(table).values(
+        annotations=cast(bindparam("json_annotations", type_=db.Text), db.JSON)
+    ).on_conflict_do_nothing()
+    rows = list()
+
+    def write_rows(rows):
+        if rows:
+            db.session.execute(stmt, rows)
+
+    for v in records:
+        if "ANN" in v.info and v.alt[0] != "*" and v.alt[0] != "<*>":
+            rows.append({
+                "variant_ID": variant_key(v.chrom, v.pos, v.ref, v.alt[0]),
+                "genome": cache[0],
+                "config_hash": cache[1],
+                "json_annotations": json.dumps(v.info["ANN"]),
+                "date": datetime.now(),
+                "last_used": datetime.now()
+            })
+        if len(rows) >= chunk_size:
+            write_rows(rows)
+            rows = list()
+        yield v
+    write_rows(rows)
+
+
+def prune_annotation_cache(max_entries=None, outdated=False):
+    """
+    Remove entries of the annotation cache.
+
+    Args:
+        max_entries (int): Evict the least recently used entries beyond this
+                           number (None to keep them all).
+        outdated (bool): Remove the entries of VEP configurations (or
+                         ClinVar versions) other than the current ones.
+
+    Returns:
+        int: The number of entries removed.
+    """
+    table = AnnotationCache.__table__
+    removed = 0
+    if outdated:
+        vep_config = Path(app.root_path).joinpath('static/vep.config.json')
+        genomes = [genome for (genome,) in db.session.query(AnnotationCache.genome).distinct()]
+        for genome in genomes:
+            removed += db.session.execute(
+                table.delete().where(
+                    table.c.genome == genome,
+                    table.c.config_hash != vep_config_hash(vep_config, genome)
+                )
+            ).rowcount
+    if max_entries is not None:
+        excess = db.session.query(func.count()).select_from(table).scalar() - max_entries
+        if excess > 0:
+            lru = select(table.c.variant_ID, table.c.genome, table.c.config_hash).order_by(table.c.last_used).limit(excess)
+            removed += db.session.execute(
+                table.delete().where(tuple_(table.c.variant_ID, table.c.genome, table.c.config_hash).in_(lru))
+            ).rowcount
+    db.session.commit()
+    if removed:
+        app.logger.info(f"  - {removed} entries removed from the annotation cache")
+    return removed
+
+
+@app.cli.command("prune-annotation-cache")
+@click.option("--outdated", is_flag=True, help="Remove the entries of previous VEP configurations or ClinVar versions.")
+@click.option("--max-entries", type=int, default=None, help="Evict the least recently used entries beyond this number.")
+def prune_annotation_cache_command(outdated, max_entries):
+    """Prune the annotation cache of VEP results."""
+    removed = prune_annotation_cache(max_entries=max_entries, outdated=outdated)
+    click.echo(f"{removed} entries removed from the annotation cache")
+
+
+def annotations_storage():
+    """
+    Measure the storage of the variant annotations.
+
+    Returns:
+        dict: The number of JSON and packed annotations, their size in bytes
+              (as stored, after TOAST compression) and the size of the
+              variant table (indexes and TOAST included).
+    """
+    table = Variant.__table__
+    json_count, json_bytes, packed_count, packed_bytes = db.session.query(
+        func.count(table.c.annotations),
+        func.coalesce(func.sum(func.pg_column_size(table.c.annotations)), 0),
+        func.count(table.c.annotations_packed),
+        func.coalesce(func.sum(func.pg_column_size(table.c.annotations_packed)), 0)
+    ).one()
+    table_bytes = db.session.query(func.pg_total_relation_size(table.name)).scalar()
+    db.session.commit()
+    return {
+        "json": json_count,
+        "json_bytes": int(json_bytes),
+        "packed": packed_count,
+        "packed_bytes": int(packed_bytes),
+        "table_bytes": table_bytes
+    }
+
+
+def pack_variant_annotations(batch_size=None):
+    """
+    Convert the JSON annotations of the variants to the compact format (see
+    `seal.models.pack_annotations`), one commit per batch of variants. The
+    older annotation versions are moved to `AnnotationVersion`.
+
+    Args:
+        batch_size (int): The number of variants converted per commit.
+
+    Returns:
+        int: The number of variants converted.
+    """
+    batch_size = batch_size or config["IMPORT"]["CHUNK_SIZE"]
+    table = Variant.__table__
+    stmt = table.update().where(table.c.id == bindparam("variant_id")).values(
+        annotations=None,
+        annotations_packed=bindparam("packed"),
+        annotations_version=bindparam("version")
+    )
+    converted = 0
+    last_id = ""
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.annotations).where(
+                table.c.id > last_id,
+                table.c.annotations_packed.is_(None),
+                func.json_typeof(table.c.annotations) == 'array'
+            ).order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        # Only the latest version stays in the variant row
+        db.session.execute(stmt, [
+            {"variant_id": id, "packed": pack_annotations(annotations[-1:]), "version": max(len(annotations) - 1, 0)}
+            for id, annotations in rows
+        ])
+        previous = [
+            {"variant_ID": id, "version": version, "annotations_packed": pack_annotations([annotation])}
+            for id, annotations in rows for version, annotation in enumerate(annotations[:-1])
+        ]
+        if previous:
+            db.session.execute(AnnotationVersion.__table__.insert(), previous)
+        db.session.commit()
+        converted += len(rows)
+        last_id = rows[-1][0]
+        app.logger.info(f"  - {converted} variants packed")
+    return converted
+
+
+@app.cli.command("pack-annotations")
+@click.option("--batch-size", type=int, default=None, help="Number of variants converted per commit.")
+def pack_annotations_command(batch_size):
+    """Convert variant annotations to the compact storage format."""
+    def report(label, storage):
+        click.echo(
+            f"{label}: {storage['json']} JSON annotations ({storage['json_bytes'] / 2**20:.1f} MiB), "
+            f"{storage['packed']} packed annotations ({storage['packed_bytes'] / 2**20:.1f} MiB), "
+            f"variant table {storage['table_bytes'] / 2**20:.1f} MiB"
+        )
+
+    before = annotations_storage()
+    report("Before", before)
+    converted = pack_variant_annotations(batch_size)
+    after = annotations_storage()
+    report("After", after)
+    click.echo(f"{converted} variants packed, annotations {before['json_bytes'] + before['packed_bytes'] - after['json_bytes'] - after['packed_bytes']:,} bytes smaller")
+    click.echo("Run 'VACUUM FULL variant' to return the freed space to the system.")
+
+
+def remove_file(path):
+    """
+    Remove a file if it exists.
+
+    Args:
+        path (Path): The file to remove.
+    """
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def variant_key(chrom, pos, ref, alt):
+    """
+    Build the SEAL identifier of a variant.
+
+    Args:
+        chrom (str): The chromosome (with or without 'chr' prefix).
+        pos (int): The position of the variant.
+        ref (str): The reference allele.
+        alt (str): The alternative allele.
+
+    Returns:
+        str: The variant identifier ('chr{chrom}-{pos}-{ref}-{alt}').
+    """
+    return f"chr{chrom.replace('chr','')}-{pos}-{ref}-{alt}"
+
+
+def is_carrier(call):
+    """
+    Check if the call of a sample holds the first alternative allele, the
+    only one imported (`alt[0]`).
+
+    Args:
+        call (dict): The FORMAT values of the sample in a record.
+
+    Returns:
+        bool: False if the genotype has no allele 1, i.e. homozygous
+              reference, missing or carrying other alternative alleles of a
+              multi-allelic record only (a call without genotype is
+              considered as carrier).
+    """
+    genotype = call.get("GT")
+    if genotype is None:
+        return True
+    return "1" in re.split(r"[/|]", genotype)
+
+
+def is_annotated(columns):
+    """
+    SQL expression checking that a variant holds annotations: packed ones, or
+    a non-empty JSON list not packed yet.
+
+    Args:
+        columns: The columns of the variant table (`Variant.__table__.c`).
+
+    Returns:
+        A SQLAlchemy boolean expression.
+    """
+    return or_(
+        columns.annotations_packed.isnot(None),
+        case(
+            (func.json_typeof(columns.annotations) == 'array', func.json_array_length(columns.annotations)),
+            else_=0
+        ) > 0
+    )
+
+
+def split_annotation(annot):
+    """
+    Split the multi-valued fields of a VEP annotation (in place).
+
+    Args:
+        annot (dict): One entry of the 'ANN' field of a VEP record.
+
+    Returns:
+        dict: The same annotation with fields of ANNOT_TO_SPLIT split.
+    """
+    for splitAnn in ANNOT_TO_SPLIT:
+        if splitAnn == 'VAR_SYNONYMS':
+            try:
+                var_synonyms = dict()
+                for vs in annot[splitAnn].split("--"):
+                    key, values = vs.split("::")
+                    values_array = values.split("&")
+                    var_synonyms[key] = values_array
+
+                annot[splitAnn] = var_synonyms
+            except AttributeError:
+                annot[splitAnn] = dict()
+        else:
+            try:
+                annot[splitAnn] = annot[splitAnn].split("&")
+            except AttributeError:
+                annot[splitAnn] = []
+    return annot
+
+
+def process_annotation(annot):
+    """
+    Compute the SEAL scores of a VEP annotation (in place).
+
+    Add 'consequenceScore', 'EI', 'canonical', 'missensesMean', 'spliceAI' and
+    'MES_var' keys to the annotation. Reference implementation of
+    `process_annotations` (used by the import loader).
+
+    Args:
+        annot (dict): One entry of the 'ANN' field of a VEP record (already
+                      split with `split_annotation`).
+
+    Returns:
+        dict: The same annotation with the computed scores.
+    """
+    # Get consequence score
+    consequence_score = 0
+    for consequence in annot["Consequence"]:
+        consequence_score += CONSEQUENCES_DICT[consequence]
+    annot["consequenceScore"] = consequence_score
+
+    # Get Exon/Intron
+    annot["EI"] = None
+    if annot["EXON"] is not None:
+        annot["EI"] = f"{annot['EXON']}"
+    if annot["INTRON"] is not None:
+        annot["EI"] = f"{annot['INTRON']}"
+
+    # Get Exon/Intron
+    annot["canonical"] = True if annot['CANONICAL'] == 'YES' else False
+
+    # missense
+    missenses = list()
+    for value in MISSENSES:
+        missenses.append(annot[value])
+    missenses = numpy.array(missenses, dtype=numpy.float64)
+    mean = numpy.nanmean(missenses)
+    annot["missensesMean"] = None if numpy.isnan(mean) else mean
+
+    # max spliceAI
+    spliceAI = list()
+    for value in SPLICEAI:
+        spliceAI.append(annot[value])
+    spliceAI = numpy.array(spliceAI, dtype=numpy.float64)
+    max = numpy.nanmax(spliceAI)
+    annot["spliceAI"] = None if numpy.isnan(max) else max
+
+    # max MaxEntScan
+    annot["MES_var"] = None
+    if (annot["MaxEntScan_alt"] is not None
+            and annot["MaxEntScan_ref"] is not None):
+        annot["MES_var"] = -100 + (float(annot["MaxEntScan_alt"]) * 100) / float(annot["MaxEntScan_ref"])
+
+    return annot
+
+
+def process_annotations(annots):
+    """
+    Compute the SEAL scores of a list of VEP annotations (in place).
+
+    Batch version of `process_annotation`: scores are derived for a whole
+    chunk of annotations at once from column arrays, with the same results.
+
+    Args:
+        annots (list): Entries of the 'ANN' field of VEP records (already
+                       split with `split_annotation`).
+
+    Returns:
+        list: The same annotations with the computed scores.
+    """
+    if not annots:
+        return annots
+
+    # missense & max spliceAI (all-NaN rows give NaN, as with 1D arrays)
+    missenses = numpy.array([[annot[value] for value in MISSENSES] for annot in annots], dtype=numpy.float64)
+    spliceAI = numpy.array([[annot[value] for value in SPLICEAI] for annot in annots], dtype=numpy.float64)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        means = numpy.nanmean(missenses, axis=1)
+        maxs = numpy.nanmax(spliceAI, axis=1)
+
+    # max MaxEntScan
+    mes_alt = numpy.array([annot["MaxEntScan_alt"] for annot in annots], dtype=numpy.float64)
+    mes_ref = numpy.array([annot["MaxEntScan_ref"] for annot in annots], dtype=numpy.float64)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        mes_var = -100 + (mes_alt * 100) / mes_ref
+    mes_defined = ~(numpy.isnan(mes_alt) | numpy.isnan(mes_ref)) & (mes_ref != 0)
+
+    for i, annot in enumerate(annots):
+        annot["consequenceScore"] = sum(CONSEQUENCES_DICT[consequence] for consequence in annot["Consequence"])
+
+        annot["EI"] = None
+        if annot["EXON"] is not None:
+            annot["EI"] = f"{annot['EXON']}"
+        if annot["INTRON"] is not None:
+            annot["EI"] = f"{annot['INTRON']}"
+
+        annot["canonical"] = True if annot['CANONICAL'] == 'YES' else False
+        annot["missensesMean"] = None if numpy.isnan(means[i]) else means[i]
+        annot["spliceAI"] = None if numpy.isnan(maxs[i]) else maxs[i]
+        annot["MES_var"] = float(mes_var[i]) if mes_defined[i] else None
+
+    return annots
+
+
+def transcript_row(annot):
+    """
+    Build the `Transcript` row described by a VEP annotation.
+
+    Args:
+        annot (dict): One entry of the 'ANN' field of a VEP record.
+
+    Returns:
+        dict: The values of the transcript columns.
+    """
+    return {
+        "feature": annot["Feature"],
+        "biotype": annot["BIOTYPE"],
+        "feature_type": annot["Feature_type"],
+        "symbol": annot["SYMBOL"],
+        "symbol_source": annot["SYMBOL_SOURCE"],
+        "gene": annot["Gene"],
+        "source": annot["SOURCE"],
+        "protein": annot["ENSP"],
+        "canonical": annot["CANONICAL"],
+        "hgnc": annot["HGNC_ID"]
+    }
+
+
+def record_annotation(v, date):
+    """
+    Build one annotation version from a VEP annotated record.
+
+    Scores are computed afterwards with `process_annotations`.
+
+    Args:
+        v (anacore.annotVcf.AnnotVCFRecord): The annotated record.
+        date (str): The date of the annotation (ISO format).
+
+    Returns:
+        tuple: The annotation ('date' and 'ANN' list) and the ClinVar columns
+               of the variant.
+    """
+    annotation = {
+        "date": date,
+        "ANN": list()
+    }
+    clinvar = dict()
+    for annot in v.info["ANN"]:
+        clinvar = {
+            "clinvar_VARID": annot["ClinVar"],
+            "clinvar_CLNSIG": annot["ClinVar_CLNSIG"],
+            "clinvar_CLNSIGCONF": ''.join(annot["ClinVar_CLNSIGCONF"].split("&")) if annot["ClinVar_CLNSIGCONF"] else None,
+            "clinvar_CLNREVSTAT": ''.join(annot["ClinVar_CLNREVSTAT"].split("&")) if annot["ClinVar_CLNREVSTAT"] else None
+        }
+        split_annotation(annot)
+        annotation["ANN"].append(annot)
+    return annotation, clinvar
+
+
+def to_float(value):
+    """
+    Convert an annotation value to a float.
+
+    Args:
+        value: The value of the annotation (number, string or None).
+
+    Returns:
+        float: The value (None if it is missing, not a number or NaN).
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if numpy.isnan(value) else value
+
+
+def variant_annotation_rows(variant_id, annotations, first_version=0):
+    """
+    Build the `VariantAnnotation` rows of the annotations of a variant.
+
+    Args:
+        variant_id (str): The id of the variant.
+        annotations (list): The annotations of the variant (one dict with
+                            'date' and 'ANN' list per annotation version),
+                            with the scores of `process_annotations`.
+        first_version (int): The version of the first annotations of the list.
+
+    Returns:
+        list: The values of the columns of each transcript annotation.
+    """
+    rows = list()
+    for version, annotation in enumerate(annotations or list(), first_version):
+        for annot in annotation.get("ANN", list()):
+            row = {
+                "variant_ID": variant_id,
+                "version": version,
+                "feature": annot.get("Feature"),
+                "symbol": annot.get("SYMBOL"),
+                "consequence_score": annot.get("consequenceScore"),
+                "impact": annot.get("IMPACT"),
+                "missenses_mean": to_float(annot.get("missensesMean")),
+                "spliceai": to_float(annot.get("spliceAI")),
+                "mes_var": to_float(annot.get("MES_var")),
+                "canonical": bool(annot.get("canonical")),
+                "source": annot.get("SOURCE"),
+                "biotype": annot.get("BIOTYPE")
+            }
+            for field in ["gnomADg_AF"] + GNOMADG:
+                row[field.lower()] = to_float(annot.get(field))
+            rows.append(row)
+    return rows
+
+
+def backfill_variant_annotations(batch_size=None):
+    """
+    Fill the `VariantAnnotation` rows of the annotated variants that have
+    none (i.e. imported before the table existed), one commit per batch of
+    variants.
+
+    Args:
+        batch_size (int): The number of variants filled per commit.
+
+    Returns:
+        int: The number of variants filled.
+    """
+    batch_size = batch_size or config["IMPORT"]["CHUNK_SIZE"]
+    table = Variant.__table__
+    filled = 0
+    last_id = ""
+    while True:
+        variants = db.session.execute(
+            select(Variant).where(
+                table.c.id > last_id,
+                is_annotated(table.c),
+                ~exists().where(VariantAnnotation.variant_ID == table.c.id)
+            ).order_by(table.c.id).limit(batch_size).options(undefer_group("annotations"))
+        ).scalars().all()
+        if not variants:
+            break
+        rows = list()
+        for variant in variants:
+            annotations = variant.annotations
+            latest = variant.annotations_version if variant.annotations_packed is not None else len(annotations) - 1
+            rows.extend(variant_annotation_rows(variant.id, annotations[-1:], latest))
+        if rows:
+            db.session.execute(VariantAnnotation.__table__.insert(), rows)
+        last_id = variants[-1].id
+        db.session.commit()
+        filled += len(variants)
+        app.logger.info(f"  - {filled} variants filled")
+    return filled
+
+
+@app.cli.command("backfill-annotations")
+@click.option("--batch-size", type=int, default=None, help="Number of variants filled per commit.")
+def backfill_annotations_command(batch_size):
+    """Fill the transcript annotation table of the variants imported before it."""
+    filled = backfill_variant_annotations(batch_size)
+    click.echo(f"{filled} variants filled")
+
+
+class TranscriptRegistry:
+    """
+    Process-wide registry of the transcripts known in the database.
+
+    The features of the `Transcript` table are loaded once per process and
+    checked in memory. Transcripts found during an import are buffered and
+    bulk-inserted at chunk boundaries. Editing transcripts (i.e. from the
+    admin) touches a marker file, so that every process reloads the registry
+    before its next chunk.
+
+    Attributes:
+        marker (Path): The file whose modification time versions the registry.
+        features (set): The features known in the database (None until warmed).
+        pending (dict): The transcript rows waiting to be inserted.
+
+    Methods:
+        warm(): Load the features of the `Transcript` table.
+        add(annot): Buffer the transcript of an annotation if it is unknown.
+        flush(): Bulk-insert the buffered transcripts.
+        commit(): Mark the inserted transcripts as known.
+        rollback(): Forget the buffered transcripts.
+        invalidate(): Force every process to reload the registry.
+    """
+
+    def __init__(self, marker):
+        self.marker = marker
+        self.features = None
+        self.pending = dict()
+        self.version = None
+
+    def __contains__(self, feature):
+        return feature in self.features or feature in self.pending
+
+    def marker_version(self):
+        try:
+            return self.marker.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def warm(self):
+        """
+        Load the features of the `Transcript` table if the registry is cold or
+        was invalidated.
+        """
+        version = self.marker_version()
+        if self.features is not None and version == self.version:
+            return
+        self.features = set(feature for (feature,) in db.session.query(Transcript.feature))
+        self.pending = dict()
+        self.version = version
+        app.logger.info(f"  - {len(self.features)} transcripts loaded in registry")
+
+    def add(self, annot):
+        """
+        Buffer the transcript of an annotation if it is unknown.
+
+        Args:
+            annot (dict): One entry of the 'ANN' field of a VEP record.
+        """
+        feature = annot["Feature"]
+        if feature is None or feature in self:
+            return
+        self.pending[feature] = transcript_row(annot)
+
+    def flush(self):
+        """
+        Bulk-insert the buffered transcripts in the current transaction.
+        """
+        if not self.pending:
+            return
+        db.session.execute(
+            postgresql.insert(Transcript.__table__)
+            .values(list(self.pending.values()))
+            .on_conflict_do_nothing(index_elements=["feature"])
+        )
+
+    def commit(self):
+        """
+        Mark the inserted transcripts as known, once the transaction is
+        committed.
+        """
+        self.features.update(self.pending)
+        self.pending = dict()
+
+    def rollback(self):
+        """
+        Forget the buffered transcripts, once the transaction is rolled back.
+        """
+        self.pending = dict()
+
+    def invalidate(self):
+        """
+        Force every process to reload the registry before its next chunk.
+        """
+        self.features = None
+        self.pending = dict()
+        self.marker.parent.mkdir(parents=True, exist_ok=True)
+        self.marker.touch()
+
+
+transcript_registry = TranscriptRegistry(Path(app.root_path).joinpath('static/temp/vcf/.transcripts'))
+
+
+class PhaseTimer:
+    """
+    Accumulate the time spent in each phase of an import and its record
+    counts, to be stored as an `ImportMetrics` row.
+
+    Attributes:
+        date_start (datetime): The start of the import.
+        times (dict): The seconds spent in each phase of PHASES.
+        counts (dict): The record counts of COUNTS.
+
+    Methods:
+        phase(name): Context manager adding the time of its block to a phase.
+        count(name, n): Add n to a record count.
+        metrics(sample_id, call_name, success): Build the `ImportMetrics` row.
+    """
+    PHASES = ["claim", "known", "vep", "parsing", "transcripts", "variants", "var2sample", "commit"]
+    COUNTS = ["records", "known", "cached", "annotated", "new_transcripts"]
+
+    def __init__(self):
+        self.date_start = datetime.now()
+        self.start = time.perf_counter()
+        self.times = dict.fromkeys(self.PHASES, 0.0)
+        self.counts = dict.fromkeys(self.COUNTS, 0)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += time.perf_counter() - start
+
+    def count(self, name, n=1):
+        self.counts[name] += n
+
+    def metrics(self, sample_id, call_name, success=True):
+        """
+        Build the `ImportMetrics` row of the import.
+
+        Args:
+            sample_id (int): The id of the imported sample.
+            call_name (str): The name of the caller of the VCF.
+            success (bool): Whether the import succeeded.
+
+        Returns:
+            ImportMetrics: The metrics (not added to the session).
+        """
+        metrics = ImportMetrics(
+            sample_ID=sample_id,
+            caller=call_name,
+            date_start=self.date_start,
+            date_end=datetime.now(),
+            success=success,
+            time_total=time.perf_counter() - self.start
+        )
+        for name, value in self.counts.items():
+            setattr(metrics, name, value)
+        for name, value in self.times.items():
+            setattr(metrics, f"time_{name}", value)
+        return metrics
+
+
+def timed_records(records, timer, phase):
+    """
+    Yield records, adding the time spent to produce each of them to a phase.
+
+    Args:
+        records (iterable): The records to yield.
+        timer (PhaseTimer): The timer of the import.
+        phase (str): The phase charged with the production of the records.
+
+    Yields:
+        The records.
+    """
+    records = iter(records)
+    while True:
+        with timer.phase(phase):
+            try:
+                v = next(records)
+            except StopIteration:
+                return
+        yield v
+
+
+class BatchLoader:
+    """
+    Load annotated VCF records of one or several samples into the database by
+    chunks.
+
+    Records are gathered until `chunk_size` is reached, then `Variant`,
+    `Transcript` and `Var2Sample` rows of the whole chunk are written with
+    multi-row `INSERT ... ON CONFLICT` statements and a single commit. Only
+    the transcripts missing from `transcript_registry` are inserted.
+
+    Each record is annotated once and gives a `Var2Sample` row to every
+    member carrying its alternative allele. Members read from the first
+    column of the VCF (`vcf_sample` is None) get every record, as a single
+    sample import. Records of non-primary contigs (see `RE_CONTIG`) are
+    skipped, and reported in the history and the comments of the samples.
+
+    Attributes:
+        members (list): The (sample_id, call_name, vcf_sample) of the samples
+                        receiving the variants: id of the sample, name of the
+                        caller and column of the sample in the VCF.
+        user_id (int): The id of the user importing the samples.
+        chunk_size (int): The number of records written per commit.
+        timer (PhaseTimer): The timer charged with the phases of the loading.
+        checkpoint (callable): Called with the number of records consumed
+                               before each chunk is committed (changes made
+                               by the callback are committed with the chunk).
+        consumed (int): The number of records added so far (skipped ones
+                        included).
+        offsets (list): The number of records consumed once each record of
+                        the current chunk is written.
+        count (int): The number of records loaded so far.
+        errors (int): The number of records lost on an integrity error.
+        contigs (dict): The number of records skipped on each non-primary
+                        contig.
+
+    Methods:
+        add(v): Add a VEP annotated record to the current chunk.
+        flush(): Write the current chunk to the database.
+        write(chunk, part, end): Write records of the current chunk with one
+                                 commit.
+        report(action, comment): Add an entry to the history and the comments
+                                 of the samples.
+        close(): Flush the last chunk and log the loading rate.
+    """
+
+    def __init__(self, members, user_id, chunk_size=None, timer=None, checkpoint=None):
+        self.members = members
+        self.genotyped = all(vcf_sample for _, _, vcf_sample in members)
+        self.user_id = user_id
+        self.chunk_size = chunk_size or config["IMPORT"]["CHUNK_SIZE"]
+        self.timer = timer or PhaseTimer()
+        self.checkpoint = checkpoint
+        self.current_date = datetime.now().isoformat()
+        self.records = list()
+        self.offsets = list()
+        self.consumed = 0
+        self.count = 0
+        self.errors = 0
+        self.contigs = dict()
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def add(self, v):
+        """
+        Add a VEP annotated record to the current chunk.
+
+        Args:
+            v (anacore.annotVcf.AnnotVCFRecord): The annotated record.
+        """
+        self.consumed += 1
+        if v.alt[0] == "*" or v.alt[0] == "<*>":
+            return
+        if not RE_CONTIG.match(v.chrom):
+            self.contigs[v.chrom] = self.contigs.get(v.chrom, 0) + 1
+            return
+        if self.genotyped and not any(is_carrier(v.samples[vcf_sample]) for _, _, vcf_sample in self.members):
+            return
+        self.records.append(v)
+        self.offsets.append(self.consumed)
+        if len(self.records) >= self.chunk_size:
+            self.flush()
+
+    def annotate(self, v):
+        """
+        Build the annotations of a record.
+
+        Scores are computed afterwards for the whole chunk with
+        `process_annotations`.
+
+        Args:
+            v (anacore.annotVcf.AnnotVCFRecord): The annotated record.
+
+        Returns:
+            tuple: The annotations list and the ClinVar columns of the variant.
+        """
+        annotation, clinvar = record_annotation(v, self.current_date)
+        return [annotation], clinvar
+
+    def merge_call(self, row, v, call_name, samplename_vcf):
+        """
+        Merge the call of a record into a `Var2Sample` row.
+
+        Keep the highest depth, allelic depth and allelic frequency, and set
+        `pass_filter` as soon as one call passes. The filter of the call is
+        read from the FT value of the sample if any (see `merge_caller_vcfs`).
+        A missing depth or allelic depth ('.') is stored as NULL, as well as
+        the allelic frequency then.
+
+        Args:
+            row (dict): The `Var2Sample` row to update.
+            v (anacore.annotVcf.AnnotVCFRecord): The annotated record.
+            call_name (str): The name of the caller of the sample.
+            samplename_vcf (str): The column of the sample in the VCF.
+        """
+        call = v.samples[samplename_vcf]
+        allelic_depths = call.get("AD") or list()
+        vcf_depth = None if call.get("DP") is None else int(call["DP"])
+        vcf_allelic_depth = None if len(allelic_depths) < 2 or allelic_depths[1] is None else int(allelic_depths[1])
+        allelic_freq = None
+        if vcf_depth and vcf_allelic_depth is not None:
+            allelic_freq = vcf_allelic_depth / vcf_depth
+        call_filter = v.filter
+        if call.get("FT"):
+            call_filter = call["FT"].split(";")
+        row["caller"][call_name] = {
+            "depth": vcf_depth,
+            "allelic_depth": vcf_allelic_depth,
+            "allelic_freq": allelic_freq,
+            "filter": call_filter
+        }
+        if vcf_depth is not None and (row["depth"] is None or vcf_depth > row["depth"]):
+            row["depth"] = vcf_depth
+        if allelic_freq is not None and (row["allelic_freq"] is None or allelic_freq > row["allelic_freq"]):
+            row["allelic_freq"] = float(allelic_freq)
+        if vcf_allelic_depth is not None and (row["allelic_depth"] is None or vcf_allelic_depth > row["allelic_depth"]):
+            row["allelic_depth"] = vcf_allelic_depth
+        if not row["pass_filter"] and call_filter == ['PASS']:
+            row["pass_filter"] = True
+
+    def flush(self):
+        """
+        Write the current chunk to the database with one commit, together
+        with the checkpoint of the number of records consumed (see `write`).
+        """
+        if not self.records:
+            return
+        records, self.records = self.records, list()
+        offsets, self.offsets = self.offsets, list()
+        timer = self.timer
+        with timer.phase("transcripts"):
+            transcript_registry.warm()
+
+        keys = [variant_key(v.chrom, v.pos, v.ref, v.alt[0]) for v in records]
+        with timer.phase("variants"):
+            annotated = set(
+                id for (id,) in db.session.query(Variant.id).filter(
+                    Variant.id.in_(set(keys)),
+                    is_annotated(Variant.__table__.c)
+                )
+            )
+
+        variants = dict()
+        annots = list()
+        with timer.phase("parsing"):
+            for v, key in zip(records, keys):
+                if key in variants:
+                    continue
+                variant = {
+                    "id": key,
+                    "chr": f"chr{v.chrom.replace('chr','')}",
+                    "pos": v.pos,
+                    "ref": v.ref,
+                    "alt": v.alt[0],
+                    "annotations": None,
+                    "annotations_packed": None,
+                    "annotations_version": 0,
+                    "clinvar_VARID": None,
+                    "clinvar_CLNSIG": None,
+                    "clinvar_CLNSIGCONF": None,
+                    "clinvar_CLNREVSTAT": None
+                }
+                if key not in annotated and "ANN" in v.info:
+                    annotations, clinvar = self.annotate(v)
+                    variant["annotations_packed"] = annotations
+                    variant.update(clinvar)
+                    annots.extend(annotations[-1]["ANN"])
+                    timer.count("annotated")
+                variants[key] = variant
+            process_annotations(annots)
+            annotation_rows = dict()
+            for key, variant in variants.items():
+                annotation_rows[key] = variant_annotation_rows(key, variant["annotations_packed"])
+                variant["annotations_packed"] = pack_annotations(variant["annotations_packed"])
+
+        with timer.phase("transcripts"):
+            for annot in annots:
+                transcript_registry.add(annot)
+            new_transcripts = len(transcript_registry.pending)
+
+        var2samples = dict()
+        with timer.phase("var2sample"):
+            for v, key in zip(records, keys):
+                for sample_id, call_name, vcf_sample in self.members:
+                    samplename_vcf = vcf_sample or next(iter(v.samples))
+                    if vcf_sample and not is_carrier(v.samples[samplename_vcf]):
+                        continue
+                    if (key, sample_id) not in var2samples:
+                        var2samples[(key, sample_id)] = {
+                            "variant_ID": key,
+                            "sample_ID": sample_id,
+                            "caller": dict(),
+                            "depth": None,
+                            "allelic_depth": None,
+                            "allelic_freq": None,
+                            "filter": v.filter,
+                            "pass_filter": False,
+                            "reported": False,
+                            "hide": False
+                        }
+                    self.merge_call(var2samples[(key, sample_id)], v, call_name, samplename_vcf)
+
+        chunk = {
+            "keys": keys,
+            "offsets": offsets,
+            "variants": variants,
+            "annotation_rows": annotation_rows,
+            "var2samples": var2samples,
+            "transcripts": dict(transcript_registry.pending)
+        }
+        errors = self.errors
+        self.write(chunk, list(range(len(records))), self.consumed)
+        timer.count("new_transcripts", new_transcripts)
+
+        loaded = len(records) - (self.errors - errors)
+        self.count += loaded
+        timer.count("records", loaded)
+        app.logger.info(f"  - {self.count} records loaded ({self.rate:.0f} records/s)")
+
+    def write(self, chunk, part, end):
+        """
+        Write records of the current chunk with one commit, together with the
+        checkpoint of the number of records consumed once they are written.
+
+        If an integrity error occurs, the records are rolled back and written
+        again in two halves, so that only the record in error is lost: it is
+        reported in the history and the comments of the samples, and the
+        checkpoint never goes past records not written. The error is raised
+        again (the job fails) once more than `VCF_MAX_ERRORS` records are lost.
+
+        Args:
+            chunk (dict): The keys, offsets (see `offsets`), variant rows,
+                          annotation rows, Var2Sample rows and new transcripts
+                          of the records of the chunk.
+            part (list): The indexes of the records to write in the chunk.
+            end (int): The number of records consumed once they are written.
+        """
+        timer = self.timer
+        keys = dict.fromkeys(chunk["keys"][i] for i in part)
+        variants = [chunk["variants"][key] for key in keys]
+        var2samples = [row for (key, _), row in chunk["var2samples"].items() if key in keys]
+
+        variant_table = Variant.__table__
+        stmt = postgresql.insert(variant_table).values(variants)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[variant_table.c.id],
+            set_={
+                column: stmt.excluded[column] for column in [
+                    "annotations", "annotations_packed", "annotations_version", "clinvar_VARID",
+                    "clinvar_CLNSIG", "clinvar_CLNSIGCONF", "clinvar_CLNREVSTAT"
+                ]
+            },
+            where=~is_annotated(variant_table.c)
+        ).returning(variant_table.c.id)
+
+        v2s_table = Var2Sample.__table__
+        v2s_stmt = postgresql.insert(v2s_table).values(var2samples)
+        v2s_stmt = v2s_stmt.on_conflict_do_update(
+            index_elements=[v2s_table.c.variant_ID, v2s_table.c.sample_ID],
+            set_={
+                "caller": cast(
+                    func.coalesce(cast(v2s_table.c.caller, postgresql.JSONB), literal_column("'{}'::jsonb")).op('||')(cast(v2s_stmt.excluded.caller, postgresql.JSONB)),
+                    db.JSON
+                ),
+                "depth": func.greatest(v2s_table.c.depth, v2s_stmt.excluded.depth),
+                "allelic_depth": func.greatest(v2s_table.c.allelic_depth, v2s_stmt.excluded.allelic_depth),
+                "allelic_freq": func.greatest(v2s_table.c.allelic_freq, v2s_stmt.excluded.allelic_freq),
+                "pass_filter": or_(v2s_table.c.pass_filter, v2s_stmt.excluded.pass_filter)
+            }
+        )
+
+        try:
+            with timer.phase("variants"):
+                # Variants annotated meanwhile by another import are not
+                # returned: their transcript annotations are already written
+                written = [id for (id,) in db.session.execute(stmt)]
+                rows = [row for id in written for row in chunk["annotation_rows"][id]]
+                if rows:
+                    db.session.execute(VariantAnnotation.__table__.insert(), rows)
+            with timer.phase("transcripts"):
+                # Buffered again after the rollback of a previous attempt
+                transcript_registry.pending.update(chunk["transcripts"])
+                transcript_registry.flush()
+            with timer.phase("var2sample"):
+                db.session.execute(v2s_stmt)
+            if self.checkpoint:
+                self.checkpoint(end)
+            with timer.phase("commit"):
+                db.session.commit()
+            transcript_registry.commit()
+        except exc.IntegrityError as e:
+            db.session.rollback()
+            transcript_registry.rollback()
+            if len(part) > 1:
+                half = len(part) // 2
+                self.write(chunk, part[:half], chunk["offsets"][part[half - 1]])
+                self.write(chunk, part[half:], end)
+                return
+            self.errors += 1
+            if self.errors > VCF_MAX_ERRORS:
+                raise
+            key = chunk["keys"][part[0]]
+            app.logger.info(f"{type(e).__name__} : {key} : {e.orig}")
+            if self.checkpoint:
+                self.checkpoint(end)
+            self.report(f"{type(e).__name__}", f"{type(e).__name__} : variant {key} not imported ({e.orig})")
+
+    def report(self, action, comment):
+        """
+        Add an entry to the history and the comments of the samples, and
+        commit it.
+
+        Args:
+            action (str): The action of the history.
+            comment (str): The comment.
+        """
+        for sample_id in dict.fromkeys(sample_id for sample_id, _, _ in self.members):
+            history = History(
+                sample_ID=sample_id,
+                user_ID=self.user_id,
+                date=datetime.now(),
+                action=action)
+            db.session.add(history)
+            comment_sample = Comment_sample(
+                comment=comment,
+                sampleid=sample_id,
+                date=datetime.now(),
+                userid=self.user_id)
+            db.session.add(comment_sample)
+        db.session.commit()
+
+    def close(self):
+        """
+        Flush the last chunk, report the records skipped on non-primary
+        contigs and log the loading rate.
+        """
+        self.flush()
+        if self.contigs:
+            skipped = sum(self.contigs.values())
+            app.logger.warning(f"  - {skipped} records of non-primary contigs skipped")
+            self.report(
+                "Non-primary contigs skipped",
+                f"{skipped} records of non-primary contigs not imported : " +
+                ", ".join(f"{contig} ({count})" for contig, count in self.contigs.items())
+            )
+        elapsed = time.perf_counter() - self.start
+        app.logger.info(f"------ {self.count} records loaded in {elapsed:.1f}s ({self.rate:.0f} records/s) ------")
+
+
+def acquire_lock(path_lock):
+    """
+    Atomically create a lock file holding the host and pid of the owner.
+
+    A lock left behind by a dead process of this host is removed and acquired
+    again.
+
+    Args:
+        path_lock (Path): The lock file to create.
+
+    Returns:
+        bool: True if the lock is acquired, False otherwise.
+    """
+    for _ in range(2):
+        try:
+            fd = os.open(path_lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not is_stale_lock(path_lock):
+                return False
+            release_lock(path_lock)
+            continue
+        with os.fdopen(fd, 'w') as lockFile:
+            lockFile.write(f"{socket.gethostname()} {os.getpid()}")
+        return True
+    return False
+
+
+def release_lock(path_lock):
+    """
+    Remove a lock file if it exists.
+
+    Args:
+        path_lock (Path): The lock file to remove.
+    """
+    try:
+        path_lock.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def is_stale_lock(path_lock):
+    """
+    Check if a lock file belongs to a dead process of this host.
+
+    Args:
+        path_lock (Path): The lock file to check.
+
+    Returns:
+        bool: True if the owner of the lock is known to be dead.
+    """
+    try:
+        host, pid = path_lock.read_text().split()
+        pid = int(pid)
+    except (FileNotFoundError, ValueError):
+        return False
+    if host != socket.gethostname():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+def worker_name():
+    """
+    Identify the current process among the import workers of every host.
+
+    Returns:
+        str: The host name and the pid of the process ('host:pid').
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_dead_worker(job):
+    """
+    Check if the worker running a job is dead.
+
+    A worker of this host is dead when its process does not exist anymore. A
+    worker of another host is considered dead when it did not update the
+    heartbeat of the job for `JOB_TIMEOUT` seconds.
+
+    Args:
+        job (ImportJob): The running job.
+
+    Returns:
+        bool: True if the job should be recovered.
+    """
+    host, _, pid = (job.worker or "").rpartition(":")
+    if host == socket.gethostname():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (PermissionError, ValueError):
+            pass
+        else:
+            return False
+    if job.heartbeat is None:
+        return True
+    return (datetime.now() - job.heartbeat).total_seconds() > config["IMPORT"]["JOB_TIMEOUT"]
+
+
+def job_lane(data):
+    """
+    Get the lane of the queue of an import (see `claim_job`).
+
+    Args:
+        data (dict): The description of the import (content of a token).
+
+    Returns:
+        str: The 'lane' of the token if any, 'interactive' for the uploads of
+             the interface, 'routine' otherwise.
+    """
+    if data.get("lane") in JOB_LANES:
+        return data["lane"]
+    return "interactive" if data.get("interface") else "routine"
+
+
+def enqueue_import(data, priority=0, token=None):
+    """
+    Add an import job to the queue, in the lane given by `job_lane`.
+
+    Args:
+        data (dict): The description of the sample (content of a token).
+        priority (int): The priority of the job in its lane (highest first).
+        token (Path): The '.treat' file mirroring the job, if it comes from a
+                      file token.
+
+    The header and the first `QUICK_VALIDATION` records of the VCF are
+    validated first (see `validate_import`): an invalid job is stored in
+    error, without entering the queue. The whole VCF is validated when the
+    job is claimed (see `import_job`).
+
+    Returns:
+        ImportJob: The queued job (or the job in error).
+    """
+    checkpoint = data.pop("checkpoint", None)
+    job = ImportJob(
+        data=data,
+        lane=job_lane(data),
+        priority=priority,
+        add_caller=bool(data.get("add_caller", False)),
+        checkpoint=checkpoint,
+        token=str(token) if token else None
+    )
+    db.session.add(job)
+    db.session.flush()
+    if not checkpoint:
+        # Validated before the commit, so that no worker claims it before
+        try:
+            validate_import(data, job.add_caller, config["IMPORT"]["QUICK_VALIDATION"])
+        except InvalidImportError as e:
+            fail_job(job, str(e))
+            return job
+    db.session.commit()
+    app.logger.info(f"{job} added to the import queue")
+    return job
+
+
+def adopt_tokens(path_inout):
+    """
+    Turn the file tokens into import jobs (compatibility with the scripts
+    writing '.token' files).
+
+    Each token is renamed to a '.treat' file mirroring the state of its job:
+    it is removed when the job is done and renamed to a '.error' file when the
+    job fails. '.token2' files (new caller for an existing sample) wait until
+    the other imports are done.
+
+    Args:
+        path_inout (Path): The directory of tokens.
+    """
+    for current_token in get_token(path_inout):
+        current_file = current_token.with_suffix('.treat')
+        try:
+            with current_token.open('r') as json_sample:
+                data = json.load(json_sample)
+        except FileNotFoundError:
+            continue
+        except ValueError as e:
+            app.logger.error(f"Invalid token {current_token} : {e}")
+            current_token.rename(current_token.with_suffix('.error'))
+            continue
+        checkpoint = data.pop("checkpoint", None)
+        job = ImportJob(
+            data=data,
+            lane=job_lane(data),
+            priority=data.get("priority", 0),
+            add_caller=bool(data.get("add_caller", False)) or current_token.suffix == '.token2',
+            checkpoint=checkpoint,
+            token=str(current_file)
+        )
+        db.session.add(job)
+        try:
+            # The unique token makes concurrent adopters wait for each other
+            db.session.flush()
+            current_token.rename(current_file)
+        except (exc.IntegrityError, FileNotFoundError):
+            db.session.rollback()
+            continue
+        if not checkpoint:
+            # Validated before the commit, so that no worker claims it before
+            # (the whole VCF when the job is claimed)
+            try:
+                validate_import(data, job.add_caller, config["IMPORT"]["QUICK_VALIDATION"])
+            except InvalidImportError as e:
+                fail_job(job, str(e))
+                continue
+        db.session.commit()
+        app.logger.info(f"{job} added to the import queue from {current_token.name}")
+
+
+def release_token(job, suffix=None):
+    """
+    Remove the '.treat' file mirroring a finished job, or rename it.
+
+    Args:
+        job (ImportJob): The finished job.
+        suffix (str): The new suffix of the file ('.error'), None to remove it.
+    """
+    if not job.token:
+        return
+    current_file = Path(job.token)
+    if suffix:
+        try:
+            current_file.rename(current_file.with_suffix(suffix))
+        except FileNotFoundError:
+            pass
+    else:
+        remove_file(current_file)
+    job.token = None
+
+
+def fail_job(job, message):
+    """
+    Set a job in error (and its token file), and write the reason in a
+    '.error.txt' file (next to the token, or 'job_<id>.error.txt' in the
+    directory of tokens).
+
+    Args:
+        job (ImportJob): The failed job.
+        message (str): The reason of the failure.
+    """
+    app.logger.error(f"{job} failed : {message}")
+    if job.token:
+        report = Path(job.token).with_suffix('.error.txt')
+    else:
+        report = Path(app.root_path).joinpath(f'static/temp/vcf/job_{job.id}.error.txt')
+    try:
+        report.write_text(f"Import job {job.id} failed : {message}\n")
+    except OSError as e:
+        app.logger.error(f"Error report {report} not written : {e}")
+    release_token(job, '.error')
+    job.state = "error"
+    job.error = message
+    job.date_end = datetime.now()
+    db.session.commit()
+
+
+def queue_order():
+    """
+    Get the order in which queued jobs are claimed (see `claim_job`).
+
+    Returns:
+        list: The ORDER BY clauses of the queued jobs: lane (interactive,
+              routine then backfill, aged backfill as routine), priority,
+              then age.
+    """
+    ranks = [(ImportJob.lane == "interactive", 2), (ImportJob.lane == "routine", 1)]
+    if config["IMPORT"]["BACKFILL_AGING"]:
+        aged = datetime.now() - timedelta(seconds=config["IMPORT"]["BACKFILL_AGING"])
+        ranks.append((ImportJob.date_created <= aged, 1))
+    return [case(*ranks, else_=0).desc(), ImportJob.priority.desc(), ImportJob.id]
+
+
+def queue_positions():
+    """
+    Get the position of each queued job in the queue.
+
+    Returns:
+        dict: The position (from 1, next job claimed) of the id of each
+              queued job.
+    """
+    queued = db.session.query(ImportJob.id).filter(ImportJob.state == "queued").order_by(*queue_order())
+    return {id: position for position, (id,) in enumerate(queued, 1)}
+
+
+def import_progress(job, positions):
+    """
+    Describe the progress of an import job.
+
+    The records loaded are the offset checkpointed by the loader with each
+    chunk of records (see `BatchLoader`), out of the records of the VCF (of
+    the merged VCF of the callers, or of the regions of the BED).
+
+    Args:
+        job (ImportJob): The job.
+        positions (dict): The positions of the queued jobs (see
+                          `queue_positions`).
+
+    Returns:
+        dict: The id, state, lane, samples, position in the queue, phase of
+              a running job ('known', 'vep' or 'loading'), records loaded,
+              total of records, sample and error of the job.
+    """
+    checkpoint = job.checkpoint or dict()
+    return {
+        "id": job.id,
+        "state": job.state,
+        "lane": job.lane,
+        "samples": [member.get("samplename") for member in get_members(job.data)],
+        "position": positions.get(job.id),
+        "phase": checkpoint.get("phase") if job.state in JOB_RUNNING else None,
+        "loaded": checkpoint.get("offset", 0),
+        "total": checkpoint.get("regions", checkpoint.get("merged", checkpoint.get("records"))),
+        "sample": job.sample_ID,
+        "error": job.error
+    }
+
+
+def claim_job(path_inout, lanes=None):
+    """
+    Claim the next queued job, by lane, then by priority, then by age.
+
+    Interactive jobs (uploads) are claimed first, then routine ones, then
+    backfill ones. A backfill job waiting for more than `BACKFILL_AGING`
+    seconds is claimed as a routine one, so that backfills keep progressing.
+    No job of a lane is claimed while `LANE_WORKERS` of its jobs are running
+    (on all hosts), so that backfills leave workers to interactive jobs. The
+    running jobs are counted and the job is claimed under an advisory lock,
+    so that two workers never both take the last place of a lane.
+
+    Rows are locked with `SELECT ... FOR UPDATE SKIP LOCKED`, so that workers
+    of every host can claim jobs at the same time. Jobs adding a caller to a
+    sample wait until the other imports are done. No job is claimed while
+    another process needs the whole directory (i.e. ClinVar update).
+
+    Args:
+        path_inout (Path): The directory of tokens.
+        lanes (list): The lanes of the jobs to claim (None: all of them).
+
+    Returns:
+        ImportJob: The claimed job, or None if no job is available.
+    """
+    path_locker = path_inout.joinpath('.lock')
+    if path_locker.exists():
+        return None
+
+    # Released by the commit of the claim
+    if any(config["IMPORT"]["LANE_WORKERS"].values()):
+        db.session.execute(select(func.pg_advisory_xact_lock(CLAIM_LOCK)))
+    running = dict(
+        db.session.query(ImportJob.lane, func.count(ImportJob.id)).filter(
+            ImportJob.state.in_(JOB_RUNNING)
+        ).group_by(ImportJob.lane)
+    )
+    full = [
+        lane for lane, limit in config["IMPORT"]["LANE_WORKERS"].items()
+        if limit and running.get(lane, 0) >= limit
+    ]
+
+    other = aliased(ImportJob)
+    importing = exists().where(other.state.in_(JOB_WAITING + JOB_RUNNING), other.add_caller == False)
+    job = ImportJob.query.filter(
+        ImportJob.state == "queued",
+        ImportJob.lane.in_(lanes or JOB_LANES),
+        ImportJob.lane.notin_(full),
+        or_(ImportJob.add_caller == False, ~importing)
+    ).order_by(
+        *queue_order()
+    ).with_for_update(skip_locked=True, of=ImportJob).first()
+    if not job:
+        db.session.commit()
+        return None
+
+    job.state = "annotating"
+    job.attempts += 1
+    job.worker = worker_name()
+    job.date_start = datetime.now()
+    job.heartbeat = job.date_start
+    db.session.commit()
+
+    # ClinVar update started meanwhile: give the job back
+    if path_locker.exists():
+        job.state = "queued"
+        job.attempts -= 1
+        job.worker = None
+        db.session.commit()
+        return None
+    return job
+
+
+def recover_jobs():
+    """
+    Queue again the jobs of dead workers, or set them in error after
+    `MAX_ATTEMPTS` attempts. Recovered jobs resume from their checkpoint.
+    """
+    jobs = ImportJob.query.filter(
+        ImportJob.state.in_(JOB_RUNNING)
+    ).with_for_update(skip_locked=True).all()
+    for job in jobs:
+        if not is_dead_worker(job):
+            continue
+        if job.attempts >= config["IMPORT"]["MAX_ATTEMPTS"]:
+            app.logger.error(f"{job} abandoned by {job.worker} : too many attempts")
+            release_token(job, '.error')
+            job.state = "error"
+            job.error = f"Worker {job.worker} died ({job.attempts} attempts)"
+            job.date_end = datetime.now()
+        else:
+            app.logger.warning(f"{job} abandoned by {job.worker} : queued again")
+            job.state = "queued"
+            job.worker = None
+    db.session.commit()
+
+
+class JobHeartbeat:
+    """
+    Update the heartbeat of a running job from a background thread, so that
+    other hosts know that its worker is alive (even during a long VEP run).
+
+    Attributes:
+        job_id (int): The id of the running job.
+        interval (float): The number of seconds between two updates.
+    """
+
+    def __init__(self, job_id, interval=None):
+        self.job_id = job_id
+        self.interval = interval or max(1, config["IMPORT"]["JOB_TIMEOUT"] / 5)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        table = ImportJob.__table__
+        while not self.stopped.wait(self.interval):
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(
+                        table.update().where(table.c.id == self.job_id).values(heartbeat=datetime.now())
+                    )
+            except exc.SQLAlchemyError as e:
+                app.logger.warning(f"Heartbeat of job {self.job_id} failed : {e}")
+
+
+def save_checkpoint(job, commit=True, **checkpoint):
+    """
+    Update the checkpoint of an import job.
+
+    Args:
+        job (ImportJob): The running job.
+        commit (bool): False to leave the commit to the caller (i.e. with the
+                       chunk of records the checkpoint describes).
+        **checkpoint: The checkpoint values to update.
+    """
+    job.checkpoint = dict(job.checkpoint or dict(), **checkpoint)
+    job.heartbeat = datetime.now()
+    if commit:
+        db.session.commit()
+
+
+def merge_caller_vcfs(callers, vcf_out):
+    """
+    Merge the VCF of several callers of a sample into one VCF with a column
+    per caller.
+
+    Records are merged as a sorted stream (`heapq.merge`) on their contig and
+    position, so the VCF must be sorted by position along the contigs of
+    their header: the order of the contigs is built from all the headers
+    before any record is read, and must be the same in each of them. The
+    records of a position are then grouped by REF and ALT: a variant found
+    by several callers is written once, the column of each caller holds its
+    genotype, allelic depths, depth and filter (as FT), the columns of the
+    callers missing the variant are empty.
+
+    Args:
+        callers (list): The (call_name, vcf_path, vcf_sample) of each caller:
+                        name of its column in the merged VCF, VCF of the
+                        caller and column of the sample in it (None for the
+                        first one).
+        vcf_out (Path): The merged VCF to write.
+
+    Returns:
+        int: The number of records written.
+
+    Raises:
+        InvalidImportError: If the headers declare the contigs in different
+                            orders, or a record is on a contig declared in
+                            none of them.
+    """
+    contigs = dict()
+    meta = dict()
+
+    def caller_records(vcf_in, vcf_path, column, rank):
+        for line in vcf_in:
+            fields = line.rstrip('\n').split('\t')
+            if fields[0] not in contigs:
+                raise InvalidImportError([f"{Path(vcf_path).name}: contig '{fields[0]}' not declared in the headers"])
+            call = dict(zip(fields[8].split(':'), fields[9 + column].split(':')))
+            yield (contigs[fields[0]], int(fields[1])), rank, fields, call
+
+    written = 0
+    with ExitStack() as stack:
+        streams = list()
+        for rank, (call_name, vcf_path, vcf_sample) in enumerate(callers):
+            vcf_in = stack.enter_context(open_vcf(vcf_path))
+            declared = list()
+            for line in vcf_in:
+                if line.startswith('#CHROM'):
+                    columns = line.rstrip('\n').split('\t')[9:]
+                    break
+                if line.startswith('##contig=<ID='):
+                    declared.append(line[13:].split(',')[0].rstrip('>\n'))
+                    contigs.setdefault(declared[-1], len(contigs))
+                    meta.setdefault(line.split(',')[0], line)
+                elif line.startswith(('##INFO=', '##FILTER=')):
+                    meta.setdefault(line.split(',')[0], line)
+            order = [contigs[contig] for contig in declared]
+            if order != sorted(order):
+                raise InvalidImportError([f"{Path(vcf_path).name}: contigs not declared in the order of the other callers"])
+            column = columns.index(vcf_sample) if vcf_sample else 0
+            streams.append(caller_records(vcf_in, vcf_path, column, rank))
+
+        with open_vcf(vcf_out, 'w') as vcf_writer:
+            vcf_writer.write('##fileformat=VCFv4.2\n')
+            vcf_writer.writelines(meta.values())
+            vcf_writer.write('##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n')
+            vcf_writer.write('##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths for the ref and alt alleles in the order listed">\n')
+            vcf_writer.write('##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Approximate read depth">\n')
+            vcf_writer.write('##FORMAT=<ID=FT,Number=1,Type=String,Description="Filter of the caller">\n')
+            vcf_writer.write('\t'.join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT'] + [call_name for call_name, _, _ in callers]) + '\n')
+
+            merged = heapq.merge(*streams, key=lambda record: record[0])
+            for _, position in itertools.groupby(merged, key=lambda record: record[0]):
+                # The callers may write the variants of a position in any order
+                variants = dict()
+                for record in position:
+                    fields = record[2]
+                    variants.setdefault((fields[3], fields[4]), list()).append(record)
+                for group in variants.values():
+                    calls = ['./.:.:.:.'] * len(callers)
+                    filters = list()
+                    for _, rank, fields, call in group:
+                        # A call without genotype is a carrier (see `is_carrier`)
+                        calls[rank] = ':'.join([
+                            call.get("GT", "1"),
+                            call.get("AD", "."),
+                            call.get("DP", "."),
+                            call.get("FT", fields[6])
+                        ])
+                        filters.extend(fields[6].split(';'))
+                    if "PASS" in filters:
+                        record_filter = "PASS"
+                    else:
+                        record_filter = ';'.join(dict.fromkeys(f for f in filters if f != '.')) or '.'
+                    fields = group[0][2]
+                    vcf_writer.write('\t'.join(fields[:6] + [record_filter, fields[7], 'GT:AD:DP:FT'] + calls) + '\n')
+                    written += 1
+    return written
+
+
+def write_vcf_tail(vcf_in, vcf_out, skip):
+    """
+    Write the header and the records of a VCF following the first `skip` ones.
+
+    Args:
+        vcf_in (Path): The VCF to read.
+        vcf_out (Path): The VCF to write.
+        skip (int): The number of records to drop.
+
+    Returns:
+        int: The number of records written.
+    """
+    written = 0
+    with open_vcf(vcf_in) as vcf_reader, open_vcf(vcf_out, 'w') as vcf_writer:
+        for line in vcf_reader:
+            if line.startswith('#'):
+                vcf_writer.write(line)
+            elif skip > 0:
+                skip -= 1
+            else:
+                vcf_writer.write(line)
+                written += 1
+    return written
+
+
+def bed_intervals(regions):
+    """
+    Merge the regions of a BED into sorted disjoint intervals per contig.
+
+    Contigs are named with 'chr' as variants in SEAL, and the bounds of the
+    intervals are inclusive as in `Region.varInRegion`.
+
+    Args:
+        regions (list): The regions of the BED.
+
+    Returns:
+        dict: The (start, stop) intervals of each contig.
+    """
+    intervals = dict()
+    for region in sorted(regions, key=lambda region: (region.chr, region.start)):
+        contig = intervals.setdefault(f"chr{region.chr.replace('chr', '')}", list())
+        if contig and region.start <= contig[-1][1] + 1:
+            contig[-1] = (contig[-1][0], max(contig[-1][1], region.stop))
+        else:
+            contig.append((region.start, region.stop))
+    return intervals
+
+
+def extract_regions(vcf_in, vcf_out, regions):
+    """
+    Write the header and the records of a VCF located in the regions of a BED.
+
+    The records are fetched region by region when the VCF is bgzip-compressed
+    and indexed by tabix (a '.tbi' or '.csi' file next to it), otherwise the
+    whole VCF is read.
+
+    Args:
+        vcf_in (Path): The VCF to read.
+        vcf_out (Path): The VCF to write.
+        regions (list): The regions of the BED.
+
+    Returns:
+        int: The number of records written.
+    """
+    intervals = bed_intervals(regions)
+    index = next((
+        Path(f"{vcf_in}{extension}") for extension in [".tbi", ".csi"]
+        if Path(f"{vcf_in}{extension}").exists()
+    ), None)
+
+    written = 0
+    with open_vcf(vcf_out, 'w') as vcf_writer:
+        if index:
+            with TabixFile(str(vcf_in), index=str(index)) as vcf_reader:
+                for line in vcf_reader.header:
+                    vcf_writer.write(f"{line}\n")
+                for contig in vcf_reader.contigs:
+                    for start, stop in intervals.get(f"chr{contig.replace('chr', '')}", list()):
+                        for line in vcf_reader.fetch(contig, max(0, start - 1), stop):
+                            # Deletions starting before the interval are not in it (see `Region.varInRegion`)
+                            if int(line.split('\t', 2)[1]) >= start:
+                                vcf_writer.write(f"{line}\n")
+                                written += 1
+            return written
+
+        with open_vcf(vcf_in) as vcf_reader:
+            for line in vcf_reader:
+                if line.startswith('#'):
+                    vcf_writer.write(line)
+                    continue
+                chrom, pos, _ = line.split('\t', 2)
+                contig = intervals.get(f"chr{chrom.replace('chr', '')}", list())
+                i = bisect_right(contig, (int(pos), float("inf"))) - 1
+                if i >= 0 and int(pos) <= contig[i][1]:
+                    vcf_writer.write(line)
+                    written += 1
+    return written
+
+
+def remove_job_files(job, path_inout):
+    """
+    Remove the temporary files of a job (merged VCF, regions, known variants
+    subtraction, VEP input, output and shards), all named after the job and
+    its VCF (see `import_job`).
+
+    Args:
+        job (ImportJob): The finished job.
+        path_inout (Path): The directory of temporary VEP files.
+    """
+    data = job.data or dict()
+    vcf_path = data["callers"][0].get("vcf_path") if data.get("callers") else data.get("vcf_path")
+    if not vcf_path:
+        return
+    prefix = f'{job.id}_{vcf_stem(vcf_path)}.'
+    for path in path_inout.iterdir():
+        if path.name.startswith(prefix):
+            remove_file(path)
+
+
+def import_job(job, path_inout, timer=None):
+    """
+    Import the samples described by a claimed job.
+
+    On success the job is done, on failure it is set in error. The time spent
+    in each phase is stored as an `ImportMetrics` row of the first sample.
+
+    The samples of a multi-sample VCF (see `get_members`) are imported in a
+    single pass: the VCF is annotated once and each record is loaded for
+    every member carrying it. In the same way, the VCF of several callers of
+    a sample ('callers' list of 'caller', 'vcf_path' and 'vcf_sample') are
+    merged into one VCF (see `merge_caller_vcfs`) annotated once, and each
+    variant is loaded with the calls of all the callers. With 'bed_only',
+    only the records in the regions of the BED of the samples are imported
+    (see `extract_regions`).
+
+    The progress of the import is checkpointed in the job: the samples and
+    callers created, the known variants subtraction, the VEP output and the
+    number of records committed (in the transaction of their chunk). A job
+    recovered after a crash resumes from its checkpoint: done steps are
+    skipped, VEP is run only on the records not loaded yet and the loading
+    starts after the last committed chunk.
+
+    Args:
+        job (ImportJob): The claimed job.
+        path_inout (Path): The directory of temporary VEP files.
+        timer (PhaseTimer): The timer of the import, if the claim of the job
+                            was already timed.
+    """
+    app.logger.info(f"---------------- Add a VCF ({job}) ----------------")
+    timer = timer or PhaseTimer()
+
+    # Load data
+    data = dict(job.data)
+    checkpoint = dict(job.checkpoint or dict())
+
+    # Check user
+    try:
+        user_id = data["userid"]
+    except KeyError:
+        user_id = 1
+
+    try:
+        date_import = data["date"]
+    except KeyError:
+        date_import = datetime.now()
+
+    try:
+        genome = data["genome"]
+    except KeyError:
+        genome = config["GENOME"]
+
+    # Come from interface
+    try:
+        interface = data["interface"]
+    except KeyError:
+        interface = False
+
+    # The whole VCF is validated before any sample is created (only its
+    # beginning is checked when the job is queued)
+    if "members" not in checkpoint and "records" not in checkpoint:
+        try:
+            save_checkpoint(job, records=validate_import(data, bool(job.add_caller)))
+        except InvalidImportError as e:
+            if interface:
+                remove_file(Path(data["vcf_path"]))
+            fail_job(job, str(e))
+            return
+
+    members = get_members(data)
+    if "callers" in data:
+        if len(members) > 1:
+            fail_job(job, 'Several callers can only be imported for one sample')
+            return
+        inputs = [(Path(caller["vcf_path"]), caller) for caller in data["callers"]]
+    else:
+        inputs = [(Path(data["vcf_path"]), member) for member in members]
+
+    for vcf_path in set(vcf_path for vcf_path, _ in inputs):
+        if not vcf_path.exists():
+            fail_job(job, f'Path does not exist for : {vcf_path}')
+            return
+        columns = [str(entry.get("vcf_sample")) for path, entry in inputs if path == vcf_path]
+        if len(columns) > 1 or any("vcf_sample" in entry for path, entry in inputs if path == vcf_path):
+            with VCFIO(vcf_path) as vcf_file:
+                missing = [column for column in columns if column not in vcf_file.samples]
+            if missing:
+                fail_job(job, f'Samples not found in the VCF : {", ".join(missing)}')
+                return
+    vcf_path = inputs[0][0]
+
+    add_caller = "add_caller" in data and data["add_caller"] == True
+    samples = list()
+    if "members" in checkpoint:
+        for sample_id, call_name, vcf_sample in checkpoint["members"]:
+            sample = Sample.query.get(sample_id)
+            if not sample:
+                fail_job(job, 'Sample does not found')
+                return
+            samples.append((sample, call_name, vcf_sample))
+        app.logger.info(f"------ Resume import after {checkpoint.get('offset', 0)} records ------")
+        for sample in dict.fromkeys(sample for sample, _, _ in samples):
+            history = History(sample_ID=sample.id, user_ID=user_id, date=datetime.now(), action="Resume import")
+            db.session.add(history)
+        db.session.commit()
+    else:
+        if add_caller:
+            found = [get_sample(member) for member in members]
+            if not all(found):
+                fail_job(job, 'Sample does not found')
+                return
+            msg = "Add new caller"
+        else:
+            found = [create_sample(member) for member in members]
+            msg = "Import Sample"
+
+        for member, sample in zip(members, found):
+            for caller in member.get("callers", [member]):
+                call_name = "default"
+                if "caller" in caller:
+                    call_name = caller["caller"]
+
+                i = 0
+                while call_name in sample.caller:
+                    i += 1
+                    call_name = f"default_{i}"
+
+                sample.caller.append(call_name)
+                # The calls of several callers are read from their column of the merged VCF
+                samples.append((sample, call_name, call_name if "callers" in member else member.get("vcf_sample")))
+            history = History(sample_ID=sample.id, user_ID=user_id, date=date_import, action=msg)
+            db.session.add(history)
+        job.sample_ID = samples[0][0].id
+        save_checkpoint(job, members=[[sample.id, call_name, vcf_sample] for sample, call_name, vcf_sample in samples], offset=0)
+    sample, call_name, _ = samples[0]
+    imported = list(dict.fromkeys(sample for sample, _, _ in samples))
+
+    prefix = f'{job.id}_{vcf_stem(vcf_path)}'
+    # The number of records of the VCF annotated by VEP, counted by each step
+    # writing it (None: unknown, counted if VEP is sharded)
+    pending = None if "callers" in data else job.checkpoint.get("records")
+    vcf_merged = temp_vcf(path_inout, f'{prefix}.merged')
+    if "callers" in data:
+        if not checkpoint.get("merged") or not vcf_merged.exists():
+            app.logger.info("------ Merge the VCF of the callers ------")
+            with timer.phase("parsing"):
+                merged = merge_caller_vcfs([
+                    (call_name, vcf_path, caller.get("vcf_sample"))
+                    for (_, call_name, _), (vcf_path, caller) in zip(samples, inputs)
+                ], vcf_merged)
+            save_checkpoint(job, merged=merged)
+            app.logger.info(f"  - {merged} variants called by {len(inputs)} callers")
+        vcf_path = vcf_merged
+        pending = job.checkpoint.get("merged")
+    vcf_regions = temp_vcf(path_inout, f'{prefix}.regions')
+    if data.get("bed_only") and sample.bed and sample.bed.regions:
+        if checkpoint.get("regions") is None or not vcf_regions.exists():
+            app.logger.info(f"------ Extract the regions of {sample.bed} ------")
+            with timer.phase("parsing"):
+                regions = extract_regions(vcf_path, vcf_regions, sample.bed.regions)
+            save_checkpoint(job, regions=regions)
+            app.logger.info(f"  - {regions} variants in {len(sample.bed.regions)} regions")
+        vcf_path = vcf_regions
+        pending = job.checkpoint.get("regions")
+    vep_config = Path(app.root_path).joinpath('static/vep.config.json')
+    vcf_vep = path_inout.joinpath(f'{prefix}{vep_extension(vep_config)}')
+    stats_vep = path_inout.joinpath(f'{prefix}.vep.html')
+    clinvar_vcf = Path(app.root_path).joinpath(f'static/temp/clinvar/{genome}/current.vcf.gz')
+
+    values = {
+        "vcf_path": vcf_path,
+        "vcf_vep": vcf_vep,
+        "stats_vep": stats_vep,
+        "ClinVar_vcf": clinvar_vcf
+    }
+
+    vcf_novel = temp_vcf(path_inout, f'{prefix}.novel')
+    known_keys = path_inout.joinpath(f'{prefix}.known.txt')
+    cached_keys = path_inout.joinpath(f'{prefix}.cached.txt')
+    vcf_resume = temp_vcf(path_inout, f'{prefix}.resume')
+    use_cache = bool(config["IMPORT"]["ANNOTATION_CACHE_SIZE"])
+    cache = (genome, checkpoint.get("cache") or vep_config_hash(vep_config, genome))
+    offset = checkpoint.get("offset", 0)
+    known = set()
+    cached = set()
+    novel = None
+    # The annotation cache is looked up whether or not known variants are skipped
+    if config["IMPORT"]["SKIP_KNOWN_VARIANTS"] or use_cache:
+        if "novel" in checkpoint and vcf_novel.exists() and known_keys.exists() and cached_keys.exists():
+            known = set(known_keys.read_text().split())
+            cached = set(cached_keys.read_text().split())
+            novel = checkpoint["novel"]
+        else:
+            # The split depends on the variants already loaded: a new one
+            # changes the order of records, so they are all loaded again
+            app.logger.info("------ Known variants subtraction ------")
+            save_checkpoint(job, phase="known")
+            with timer.phase("known"):
+                known, cached, novel = split_known_variants(
+                    vcf_path, vcf_novel,
+                    cache=cache if use_cache else None,
+                    skip_known=config["IMPORT"]["SKIP_KNOWN_VARIANTS"]
+                )
+                known_keys.write_text("\n".join(known))
+                cached_keys.write_text("\n".join(cached))
+            offset = 0
+            checkpoint.pop("vep", None)
+            save_checkpoint(job, novel=novel, offset=0, vep=None, cache=cache[1])
+        timer.count("known", len(known))
+        timer.count("cached", len(cached))
+        values["vcf_path"] = vcf_novel
+        pending = novel
+        app.logger.info(f"  - {len(known)} known variants, {len(cached)} cached annotations, {novel} variants to annotate")
+
+    # Records are VEP output (one per record of values["vcf_path"]) followed
+    # by cached then known records: `skip` of them were committed before a
+    # crash.
+    skip = offset
+    try:
+        app.logger.info("------ Variant Annotation with VEP ------")
+        if novel == 0 or (novel is not None and offset >= novel):
+            records = iter([])
+            skip = offset - (novel or 0)
+        elif checkpoint.get("vep") is not None and vcf_vep.exists():
+            app.logger.info("  - VEP output of a previous run reused")
+            records = timed_records(read_annotated_vcf(vcf_vep), timer, "parsing")
+            skip = offset - checkpoint["vep"]
+        else:
+            if offset:
+                write_vcf_tail(values["vcf_path"], vcf_resume, offset)
+                values["vcf_path"] = vcf_resume
+                pending = pending - offset if pending is not None else None
+                skip = 0
+            save_checkpoint(job, phase="vep")
+            shards = vep_shards(vep_config)
+            if config["IMPORT"]["VEP_STREAMING"] and shards == 1:
+                # VEP and parsing overlap: waiting for VEP output is charged to VEP
+                values["vcf_vep"] = "STDOUT"
+                records = timed_records(stream_vep_records(vep_config, values), timer, "vep")
+            else:
+                with timer.phase("vep"):
+                    execute_vep_shards(vep_config, values, shards, pending)
+                save_checkpoint(job, vep=offset)
+                app.logger.info("------ END VEP ------")
+                records = timed_records(read_annotated_vcf(vcf_vep), timer, "parsing")
+        if use_cache:
+            records = cache_annotations(records, cache)
+        records = itertools.chain(
+            records,
+            timed_records(read_cached_records(vcf_path, cached, cache), timer, "parsing"),
+            timed_records(read_known_records(vcf_path, known), timer, "parsing")
+        )
+        records = itertools.islice(records, skip, None)
+
+        app.logger.info("------ Load variants ------")
+        job.state = "loading"
+        save_checkpoint(job, phase="loading")
+
+        def checkpoint_offset(consumed):
+            save_checkpoint(job, commit=False, offset=offset + consumed)
+
+        loader_members = [(sample.id, call_name, vcf_sample) for sample, call_name, vcf_sample in samples]
+        with BatchLoader(loader_members, user_id, timer=timer, checkpoint=checkpoint_offset) as loader:
+            for v in records:
+                loader.add(v)
+    except CommandFailedError as e:
+        app.logger.info(f"{type(e).__name__} : {e}")
+        for member in imported:
+            if not add_caller or not member.status:
+                member.status = -1
+        db.session.add(timer.metrics(sample.id, call_name, success=False))
+        fail_job(job, f"{type(e).__name__} : {e}")
+        remove_job_files(job, path_inout)
+        return
+    db.session.commit()
+    remove_job_files(job, path_inout)
+    if interface:
+        Path(data["vcf_path"]).unlink()
+    for member in imported:
+        history = History(
+            sample_ID=member.id,
+            user_ID=user_id,
+            date=datetime.now(),
+            action=f"Sample Imported")
+        db.session.add(history)
+        if not add_caller or not member.status:
+            member.status = 1
+    metrics = timer.metrics(sample.id, call_name)
+    db.session.add(metrics)
+    release_token(job)
+    job.state = "done"
+    job.date_end = datetime.now()
+    db.session.commit()
+    app.logger.info(
+        "------ Import metrics : " +
+        ", ".join(f"{name} {value:.1f}s" for name, value in timer.times.items()) +
+        f" (total {metrics.time_total:.1f}s) ------"
+    )
+
+
+def import_worker(path_inout, lanes=None):
+    """
+    Claim and import jobs one at a time until none is available.
+
+    Several workers (processes of the import pool, or of other hosts) can
+    annotate and load independent samples at the same time.
+
+    Args:
+        path_inout (Path): The directory of temporary VEP files.
+        lanes (list): The lanes of the jobs to claim (None: all of them).
+
+    Returns:
+        int: The number of jobs treated by this worker.
+    """
+    count = 0
+    while True:
+        timer = PhaseTimer()
+        with timer.phase("claim"):
+            job = claim_job(path_inout, lanes)
+        if not job:
+            break
+        try:
+            with JobHeartbeat(job.id):
+                import_job(job, path_inout, timer=timer)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception(f"{type(e).__name__} : {e}")
+            # The samples already created are in error, as for a VEP failure
+            members = [sample_id for sample_id, _, _ in (job.checkpoint or dict()).get("members", [])]
+            for sample in Sample.query.filter(Sample.id.in_(members)):
+                if not job.add_caller or not sample.status:
+                    sample.status = -1
+            fail_job(job, f"{type(e).__name__} : {e}")
+            remove_job_files(job, path_inout)
+        count += 1
+    db.session.remove()
+    return count
+
+
+def init_import_worker(root_path, import_config, database_uri):
+    """
+    Set a spawned worker of the import pool up as its parent process, and
+    push an application context.
+
+    Args:
+        root_path (str): The root path of the application (temporary files and
+                         VEP configuration).
+        import_config (dict): The IMPORT configuration.
+        database_uri (str): The URI of the database.
+    """
+    app.root_path = root_path
+    config["IMPORT"].update(import_config)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
+    transcript_registry.marker = Path(root_path).joinpath('static/temp/vcf/.transcripts')
+    # The session may be bound to the configured database by the import of SEAL
+    db.session.remove()
+    db.engine.dispose()
+    app.app_context().push()
+
+
+def import_pool(path_inout, workers):
+    """
+    Import jobs with a pool of worker processes.
+
+    Args:
+        path_inout (Path): The directory of temporary VEP files.
+        workers (int): The number of worker processes.
+    """
+    app.logger.info(f"---------------- Import pool ({workers} workers) ----------------")
+
+    # Workers are spawned, not forked: a fork would inherit the locks and
+    # connections held by the other threads (scheduler, token watcher...).
+    # They import SEAL again, without its scheduler.
+    scheduler_environ = os.environ.get('SEAL_SCHEDULER')
+    os.environ['SEAL_SCHEDULER'] = 'false'
+    try:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=init_import_worker,
+            initargs=(app.root_path, dict(config["IMPORT"]), app.config["SQLALCHEMY_DATABASE_URI"])
+        ) as pool:
+            futures = [pool.submit(import_worker, path_inout) for _ in range(workers)]
+            treated = sum(future.result() for future in futures)
+    finally:
+        if scheduler_environ is None:
+            del os.environ['SEAL_SCHEDULER']
+        else:
+            os.environ['SEAL_SCHEDULER'] = scheduler_environ
+    app.logger.info(f"---------------- Import pool : {treated} jobs treated ----------------")
+
+
+def prune_uploads():
+    """
+    Remove the uploads by chunks not updated for `UPLOAD_EXPIRY` seconds
+    (interrupted and never resumed, or never added to the queue) and their
+    file.
+
+    Returns:
+        int: The number of uploads removed.
+    """
+    expiry = datetime.now() - timedelta(seconds=config["IMPORT"]["UPLOAD_EXPIRY"])
+    uploads = Upload.query.filter(Upload.date_update < expiry).with_for_update(skip_locked=True).all()
+    for upload in uploads:
+        remove_file(Path(upload.path))
+        db.session.delete(upload)
+    db.session.commit()
+    if uploads:
+        app.logger.info(f"{len(uploads)} expired uploads removed")
+    return len(uploads)
+
+
+class TokenWatcher:
+    """
+    Wake the import task up as soon as a token is moved (or written) into the
+    directory of tokens, with inotify, rather than at its next cron run (kept
+    as a fallback).
+
+    The tokens arriving within `TOKEN_DEBOUNCE` seconds of the first one are
+    adopted by the same run of the task.
+
+    Attributes:
+        path_tokens (Path): The directory of tokens.
+        debounce (float): The number of seconds waited for other tokens.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_Q_OVERFLOW = 0x00004000
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, path_tokens, debounce=None):
+        self.path_tokens = path_tokens
+        self.debounce = config["IMPORT"]["TOKEN_DEBOUNCE"] if debounce is None else debounce
+        self.stopped = threading.Event()
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        if libc.inotify_add_watch(self.fd, str(path_tokens).encode(), self.IN_CLOSE_WRITE | self.IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, os.strerror(error), str(path_tokens))
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.fd, selectors.EVENT_READ)
+        self.thread = threading.Thread(target=self.run, name="token watcher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.selector.close()
+        os.close(self.fd)
+
+    def tokens(self, timeout):
+        """
+        Wait for inotify events, and list the tokens among them.
+
+        Args:
+            timeout (float): The maximal number of seconds to wait.
+
+        Returns:
+            list: The names of the tokens (all the tokens may be missed when
+                  the queue of events overflowed: '*').
+        """
+        if not self.selector.select(timeout):
+            return []
+        try:
+            buffer = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        tokens = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = self.EVENT.unpack_from(buffer, offset)
+            offset += self.EVENT.size
+            name = buffer[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                tokens.append("*")
+            elif name.endswith(('.token', '.token2')):
+                tokens.append(name)
+        return tokens
+
+    def run(self):
+        while not self.stopped.is_set():
+            tokens = self.tokens(1)
+            if not tokens:
+                continue
+            # A burst of tokens (i.e. a run of a pipeline) is adopted at once
+            deadline = time.monotonic() + self.debounce
+            remaining = self.debounce
+            while remaining > 0:
+                tokens.extend(self.tokens(remaining))
+                remaining = deadline - time.monotonic()
+            app.logger.info(f"New tokens ({', '.join(sorted(set(tokens)))}) : import started")
+            wake_import()
+
+
+# A run of the import task adopts the tokens notified while it was running
+wake_lock = threading.Lock()
+importing = threading.Event()
+new_tokens = threading.Event()
+
+
+def wake_import():
+    """
+    Run the import task now, or once more at the end of its current run.
+    """
+    with wake_lock:
+        new_tokens.set()
+        running = importing.is_set()
+    if not running:
+        scheduler.modify_job('import vcf', next_run_time=datetime.now(timezone.utc))
+
+
+def start_token_watcher():
+    """
+    Watch the directory of tokens when `WATCH_TOKENS` is set.
+
+    Returns:
+        TokenWatcher: The started watcher, None if tokens are only found by the
+                      cron runs of the import task (inotify unavailable).
+    """
+    if not config["IMPORT"]["WATCH_TOKENS"]:
+        return None
+    path_tokens = Path(app.root_path).joinpath('static/temp/vcf/')
+    try:
+        watcher = TokenWatcher(path_tokens).start()
+    except (AttributeError, OSError) as e:
+        app.logger.warning(f"Tokens of {path_tokens} not watched, found every 20 seconds only : {e}")
+        return None
+    app.logger.info(f"Tokens of {path_tokens} watched")
+    return watcher
+
+
+@scheduler.task('cron', id='import vcf', second="*/20")
+def importvcf():
+    # Check launchable
+    path_inout = Path(app.root_path).joinpath('static/temp/vcf/')
+    path_locker = path_inout.joinpath('.lock')
+    if path_locker.exists() and not is_stale_lock(path_locker):
+        return
+
+    importing.set()
+    try:
+        while True:
+            new_tokens.clear()
+            import_queue(path_inout)
+            with wake_lock:
+                if not new_tokens.is_set():
+                    importing.clear()
+                    break
+    finally:
+        importing.clear()
+
+
+def import_queue(path_inout):
+    """
+    Adopt the tokens, then import the queued jobs.
+
+    Args:
+        path_inout (Path): The directory of tokens and temporary VEP files.
+    """
+    adopt_tokens(path_inout)
+    recover_jobs()
+    prune_uploads()
+
+    queued = ImportJob.query.filter_by(state="queued").count()
+    db.session.commit()
+    if not queued:
+        return
+
+    if config["IMPORT"]["WORKERS"] > 1:
+        import_pool(path_inout, min(queued, config["IMPORT"]["WORKERS"]))
+    else:
+        import_worker(path_inout)
+
+    if config["IMPORT"]["ANNOTATION_CACHE_SIZE"]:
+        prune_annotation_cache(max_entries=config["IMPORT"]["ANNOTATION_CACHE_SIZE"])
+
+
+@scheduler.task('cron', id='import interactive', second="*/10")
+def import_interactive():
+    """
+    Import the uploads of the interface in a slot reserved to them (besides
+    the `WORKERS` of `importvcf`), so that they never wait behind a long
+    import, i.e. of a backfill.
+    """
+    if not config["IMPORT"]["INTERACTIVE_SLOT"]:
+        return
+    path_inout = Path(app.root_path).joinpath('static/temp/vcf/')
+    path_locker = path_inout.joinpath('.lock')
+    if path_locker.exists() and not is_stale_lock(path_locker):
+        return
+    import_worker(path_inout, lanes=["interactive"])
+
+
+def start_reannotation():
+    """
+    Start the re-annotation of all the annotated variants with the current
+    VEP configuration, unless one is already running or paused.
+
+    Returns:
+        Reannotation: The re-annotation (the existing one if any).
+    """
+    job = Reannotation.query.filter(Reannotation.state.in_(["running", "paused"])).first()
+    if job is not None:
+        return job
+    genome = config["GENOME"]
+    vep_config = Path(app.root_path).joinpath('static/vep.config.json')
+    total = db.session.query(func.count(Variant.id)).filter(is_annotated(Variant.__table__.c)).scalar()
+    job = Reannotation(
+        state="running",
+        genome=genome,
+        config_hash=vep_config_hash(vep_config, genome),
+        total=total,
+        date_start=datetime.now()
+    )
+    db.session.add(job)
+    db.session.commit()
+    app.logger.info(f"Re-annotation {job.id} of {total} variants started")
+    return job
+
+
+def write_variants_vcf(variants, vcf_out):
+    """
+    Write variants in a sites-only VCF.
+
+    Args:
+        variants (list): The (id, chr, pos, ref, alt) of the variants.
+        vcf_out (Path): The path of the VCF to write.
+    """
+    with open_vcf(vcf_out, "w") as out:
+        out.write("##fileformat=VCFv4.2\n")
+        out.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for _, chrom, pos, ref, alt in variants:
+            out.write(f"{chrom}\t{pos}\t.\t{ref}\t{alt}\t.\t.\t.\n")
+
+
+def reannotate_batch(job, path_inout, batch_size=None):
+    """
+    Re-annotate the next batch of variants of a re-annotation.
+
+    The variants following the last one re-annotated are sent to VEP (with
+    the niceness `REANNOTATION_NICE`), and their new annotations are added as
+    a new version (see `Variant.add_annotations`). The progress of the
+    re-annotation is committed with the annotations, so that it resumes from
+    the next batch.
+
+    Args:
+        job (Reannotation): The re-annotation.
+        path_inout (Path): The folder of the temporary VCF files.
+        batch_size (int): The number of variants sent to VEP.
+
+    Returns:
+        int: The number of variants of the batch (0 once all variants are
+             re-annotated).
+
+    Raises:
+        CommandFailedError: If VEP fails (the batch is not written).
+    """
+    batch_size = batch_size or config["IMPORT"]["REANNOTATION_BATCH_SIZE"]
+    start = time.perf_counter()
+    table = Variant.__table__
+    variants = db.session.execute(
+        select(table.c.id, table.c.chr, table.c.pos, table.c.ref, table.c.alt).where(
+            table.c.id > job.last_variant_ID,
+            is_annotated(table.c)
+        ).order_by(table.c.id).limit(batch_size)
+    ).all()
+    if not variants:
+        job.state = "done"
+        job.date_end = datetime.now()
+        db.session.commit()
+        app.logger.info(f"Re-annotation {job.id} done: {job.reannotated} variants re-annotated")
+        return 0
+
+    prefix = f"reannotation_{job.id}"
+    vep_config = Path(app.root_path).joinpath('static/vep.config.json')
+    vcf_in = temp_vcf(path_inout, prefix)
+    vcf_vep = path_inout.joinpath(f"{prefix}{vep_extension(vep_config)}")
+    stats_vep = path_inout.joinpath(f"{prefix}.vep.html")
+    values = {
+        "vcf_path": vcf_in,
+        "vcf_vep": vcf_vep,
+        "stats_vep": stats_vep,
+        "ClinVar_vcf": Path(app.root_path).joinpath(f'static/temp/clinvar/{job.genome}/current.vcf.gz')
+    }
+    write_variants_vcf(variants, vcf_in)
+    with open(vep_config, 'r') as f:
+        command, args = extract_command_and_args(json.load(f), values)
+    shell_command = [command] + args
+    if config["IMPORT"]["REANNOTATION_NICE"]:
+        shell_command = ["nice", "-n", str(config["IMPORT"]["REANNOTATION_NICE"])] + shell_command
+    try:
+        vep_start = time.perf_counter()
+        execute_shell_command(shell_command)
+        job.time_vep += time.perf_counter() - vep_start
+
+        date = datetime.now().isoformat()
+        annotations = dict()
+        clinvars = dict()
+        annots = list()
+        for v in read_annotated_vcf(vcf_vep):
+            if "ANN" not in v.info:
+                continue
+            key = variant_key(v.chrom, v.pos, v.ref, v.alt[0])
+            annotations[key], clinvars[key] = record_annotation(v, date)
+            annots.extend(annotations[key]["ANN"])
+        process_annotations(annots)
+    finally:
+        remove_file(vcf_in)
+        remove_file(vcf_vep)
+        remove_file(stats_vep)
+
+    transcript_registry.warm()
+    for annot in annots:
+        transcript_registry.add(annot)
+    reannotated = Variant.query.filter(Variant.id.in_(list(annotations))).options(undefer_group("annotations")).all()
+    rows = list()
+    for variant in reannotated:
+        variant.add_annotations(annotations[variant.id])
+        for column, value in clinvars[variant.id].items():
+            setattr(variant, column, value)
+        rows.extend(variant_annotation_rows(variant.id, [annotations[variant.id]], variant.annotations_version))
+    try:
+        db.session.flush()
+        # The transcript annotation table keeps the latest version only
+        db.session.execute(VariantAnnotation.__table__.delete().where(
+            VariantAnnotation.variant_ID.in_([variant.id for variant in reannotated])
+        ))
+        if rows:
+            db.session.execute(VariantAnnotation.__table__.insert(), rows)
+        transcript_registry.flush()
+        job.last_variant_ID = variants[-1].id
+        job.processed += len(variants)
+        job.reannotated += len(reannotated)
+        job.time_total += time.perf_counter() - start
+        db.session.commit()
+        transcript_registry.commit()
+    except Exception:
+        db.session.rollback()
+        transcript_registry.rollback()
+        raise
+    app.logger.info(f"  - re-annotation {job.id}: {job.processed}/{job.total} variants")
+    return len(variants)
+
+
+@scheduler.task('cron', id='reannotate variants', second="*/20")
+def reannotate():
+    """
+    Run one batch of the running re-annotation, if any.
+
+    Imports have priority: nothing is done while an import job is waiting or
+    running, or while ClinVar is updated.
+    """
+    path_inout = Path(app.root_path).joinpath('static/temp/vcf/')
+    path_locker = path_inout.joinpath('.lock')
+    if path_locker.exists() and not is_stale_lock(path_locker):
+        return
+    if ImportJob.query.filter(ImportJob.state.in_(JOB_WAITING + JOB_RUNNING)).count():
+        db.session.commit()
+        return
+
+    # Locked until the batch is committed: one batch at a time on all hosts
+    job = Reannotation.query.filter_by(state="running").with_for_update(skip_locked=True).first()
+    if job is None:
+        db.session.commit()
+        return
+    try:
+        reannotate_batch(job, path_inout)
+    except CommandFailedError as e:
+        app.logger.info(f"{type(e).__name__} : {e}")
+        job.state = "error"
+        job.error = f"{type(e).__name__} : {e}"
+        job.date_end = datetime.now()
+        db.session.commit()
+
+
+@app.cli.command("reannotate")
+@click.option("--start", is_flag=True, help="Start a re-annotation of all the variants.")
+@click.option("--pause", is_flag=True, help="Pause the running re-annotation.")
+@click.option("--resume", is_flag=True, help="Resume the paused re-annotation.")
+def reannotate_command(start, pause, resume):
+    """Start, pause or resume the background re-annotation of the variants."""
+    if start:
+        start_reannotation()
+    job = Reannotation.query.filter(Reannotation.state.in_(["running", "paused"])).first()
+    if job is not None and (pause or resume):
+        job.state = "paused" if pause else "running"
+        db.session.commit()
+    if job is None:
+        job = Reannotation.query.order_by(Reannotation.id.desc()).first()
+    if job is None:
+        click.echo("No re-annotation")
+        return
+    click.echo(f"Re-annotation {job.id} ({job.state}): {job.processed}/{job.total} variants, {job.reannotated} re-annotated")
+
+
+def update_clinvar(vcf, version, genome=config["GENOME"]):
+    app.logger.info(f"ClinVar Version : '{version}' processing")
+    # Switch on maintenance mode
+    app.config["MAINTENANCE"] = True
+    app.config["MAINTENANCE_REASON"] = "Update ClinVar"
+
+    # Define paths
+    new_clinvar = Path(vcf)
+    new_clinvar_index = Path(f"{new_clinvar}.tbi")
+    current = Path(app.root_path).joinpath(f'static/temp/clinvar/{genome}/current.vcf.gz')
+    current_index = Path(f"{current}.tbi")
+
+    # Create new clinvar entry
+    clinvar = Clinvar(version=version, genome=genome, current=False)
+    db.session.add(clinvar)
+    db.session.commit()
+
+    # Try to update
+    try:
+        with annotVcf.AnnotVCFIO(new_clinvar) as vcf_io:
+            for v in vcf_io:
+                variant = Variant.query.get(f"chr{v.chrom.replace('chr','')}-{v.pos}-{v.ref}-{v.alt[0]}")
+                if variant:
+                    variant.clinvar_VARID = v.id
+                    variant.clinvar_CLNSIG = ''.join(v.info["CLNSIG"]) if "CLNSIG" in v.info else None
+                    variant.clinvar_CLNSIGCONF = ''.join(v.info["CLNSIGCONF"]) if "CLNSIGCONF" in v.info else None
+                    variant.clinvar_CLNREVSTAT = ''.join(v.info["CLNREVSTAT"]) if "CLNREVSTAT" in v.info else None
+
+        # Update Clinvar database
+        for c in Clinvar.query.filter_by(genome=genome, current=True).all():
+            c.current = False
+        clinvar.current = True
+        db.session.commit()
+        new_clinvar.rename(current)
+        new_clinvar_index.rename(current_index)
+    except Exception as e:
+        db.session.rollback()
+        path_log = Path(app.root_path).joinpath('static/temp/clinvar/error')
+        with open(path_log, "w") as log:
+            log.write(f"Error on file: {new_clinvar}")
+            log.write(e)
+        app.logger.error(e)
+    finally:
+        # Switch off maintenance mode
+        app.config["MAINTENANCE"] = False
+        del app.config["MAINTENANCE_REASON"]
+        return
+
+
+@scheduler.task('cron', id='update clinvar', day_of_week="*")
+def check_clinvar(genome=config["GENOME"]):
+    path_inout = Path(app.root_path).joinpath('static/temp/vcf/')
+    path_locker = path_inout.joinpath('.lock')
+    app.logger.info("START CLINVAR UPDATE")
+
+    while not acquire_lock(path_locker):
+        app.logger.debug("  - waiting free time (locker file)")
+        time.sleep(60)
+
+    # Wait for the jobs annotating with the current ClinVar file
+    while ImportJob.query.filter_by(state="annotating").count():
+        db.session.commit()
+        app.logger.debug("  - waiting free time (annotating jobs)")
+        time.sleep(60)
 
     path_clinvar=Path(app.root_path).joinpath(f'static/temp/clinvar/{genome}/')
     base_url = f'https://ftp.ncbi.nlm.nih.gov/pub/clinvar/vcf_{genome[:3].upper()}{genome[3:]}/'
@@ -781,6 +3778,6 @@ def check_clinvar(genome=config["GENOME"]):
             app.logger.error(e)
             
     app.logger.info("END CLINVAR UPDATE")
-    path_locker.unlink()
+    release_lock(path_locker)
     return
 
@@ -44,3 +44,102 @@ $(function(){
     });
     $('.js-example-basic-multiple').select2();
 });
+
+function hex(buffer) {
+    return Array.from(new Uint8Array(buffer)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+function upload_request(method, url, data, headers) {
+    return $.ajax({
+        type: method,
+        url: url,
+        data: data,
+        processData: false,
+        contentType: (data instanceof Blob) ? "application/octet-stream" : "application/json",
+        headers: Object.assign({'X-CSRF-TOKEN': csrf_token}, headers || {}),
+    });
+}
+
+async function upload_chunk(upload, file, index, digests) {
+    var start = index * upload.chunk_size;
+    var chunk = file.slice(start, Math.min(start + upload.chunk_size, file.size));
+    var digest = await crypto.subtle.digest("SHA-256", await chunk.arrayBuffer());
+    digests[index] = new Uint8Array(digest);
+    if (start < upload.received) {
+        return upload;
+    }
+    // A chunk is sent again (at most 5 times) when the connection is lost
+    for (var attempt = 1; ; attempt++) {
+        try {
+            return await upload_request("PUT", "/upload/vcf/" + upload.id + "/" + index, chunk, {"X-Chunk-SHA256": hex(digest)});
+        } catch (error) {
+            if (attempt >= 5 || (error.status >= 400 && error.status < 500)) {
+                throw error;
+            }
+            await new Promise(resolve => setTimeout(resolve, 2000 * attempt));
+        }
+    }
+}
+
+async function upload_vcf(file, progress) {
+    // An interrupted upload of the same file resumes from its last chunk received
+    var key = "seal-upload-" + file.name + "-" + file.size + "-" + file.lastModified;
+    var upload = null;
+    if (localStorage.getItem(key)) {
+        try {
+            upload = await $.getJSON("/upload/vcf/" + localStorage.getItem(key));
+        } catch (error) {
+            upload = null;
+        }
+    }
+    if (!upload || upload.state != "uploading") {
+        upload = await upload_request("POST", "/upload/vcf", JSON.stringify({"filename": file.name, "size": file.size}));
+        localStorage.setItem(key, upload.id);
+    }
+
+    var chunks = Math.ceil(file.size / upload.chunk_size);
+    var digests = [];
+    for (var index = 0; index < chunks; index++) {
+        upload = await upload_chunk(upload, file, index, digests);
+        progress(upload.received / file.size);
+    }
+
+    var all = new Uint8Array(digests.length * 32);
+    digests.forEach((digest, i) => all.set(digest, i * 32));
+    upload = await upload_request("POST", "/upload/vcf/" + upload.id + "/complete", JSON.stringify({"sha256": hex(await crypto.subtle.digest("SHA-256", all))}));
+    localStorage.removeItem(key);
+    return upload;
+}
+
+$(function(){
+    // Without Web Crypto (i.e. HTTP outside of localhost) the VCF is sent with the form
+    if (!window.crypto || !crypto.subtle || !window.Blob || !Blob.prototype.arrayBuffer) {
+        return;
+    }
+    var form = $('#vcf_file').closest('form');
+    form.on('submit', async function(event) {
+        var file = $('#vcf_file')[0].files[0];
+        if (!file || $('#upload').val()) {
+            return;
+        }
+        event.preventDefault();
+        var submit = form.find('input[type="submit"]').prop('disabled', true);
+        var status = $('#result').html('<div class="w3-light-grey w3-round w3-margin-top"><div class="w3-container w3-round w3-flat-green-sea" style="height:6px;width:0%"></div></div><div class="w3-small w3-center"></div>');
+        try {
+            var upload = await upload_vcf(file, function(ratio) {
+                status.find('.w3-container').css('width', Math.floor(100 * ratio) + '%');
+                status.find('.w3-small').text('Upload of ' + file.name + ': ' + Math.floor(100 * ratio) + '%');
+            });
+        } catch (error) {
+            var message = (error.responseJSON && error.responseJSON.message) || error.statusText || error;
+            status.find('.w3-small').addClass('w3-text-flat-alizarin').text('Upload of ' + file.name + ' interrupted (' + message + '), submit again to resume it.');
+            submit.prop('disabled', false);
+            return;
+        }
+        $('#upload').val(upload.id);
+        $('#vcf_file').val('');
+        form.append('<input type="hidden" name="submit" value="' + submit.val() + '">');
+        form.off('submit');
+        form[0].submit();
+    });
+});
@@ -174,6 +174,68 @@ $(document).ready(function() {
     });
 });
 
+var import_phases = {
+    "known": "Known variants",
+    "vep": "Annotation",
+    "loading": "Loading",
+};
+
+function import_progress(job) {
+    var text = $('<span>').text(job.samples.join(", ")).html();
+    var percent = 0;
+    if (job.state == "queued") {
+        text += ' - <i>waiting' + (job.position ? ' (position ' + job.position + ' in the queue)' : '') + '</i>';
+    } else if (job.state == "done") {
+        text += ' - <i>imported</i>';
+        percent = 100;
+    } else if (job.state == "error") {
+        text += ' - <i class="w3-text-flat-alizarin">error</i>';
+    } else {
+        text += ' - <i>' + (import_phases[job.phase] || "Annotation") + '</i>';
+        if (job.total) {
+            percent = Math.min(100, Math.floor(100 * job.loaded / job.total));
+            text += ' <i>' + job.loaded + ' / ' + job.total + ' records</i>';
+        }
+    }
+    return `
+        <div id="import-` + job.id + `" class="w3-margin-bottom">
+            <span><i class="fas fa-cloud-download-alt"></i> ` + text + `</span>
+            <div class="w3-light-grey w3-round">
+                <div class="w3-container w3-round w3-flat-peter-river" style="height:4px;width:` + percent + `%"></div>
+            </div>
+        </div>`;
+}
+
+function follow_imports() {
+    if (!window.EventSource) {
+        return;
+    }
+    var source = new EventSource("/stream/imports");
+    source.addEventListener("progress", function(event) {
+        var job = JSON.parse(event.data);
+        var row = $('#import-' + job.id);
+        if (row.length) {
+            row.replaceWith(import_progress(job));
+        } else {
+            $('#imports').append(import_progress(job)).show();
+        }
+        if (job.state == "done" || job.state == "error") {
+            $('#samples').DataTable().ajax.reload(null, false);
+            setTimeout(function() {
+                $('#import-' + job.id).remove();
+                if (! $('#imports').children().length) {
+                    $('#imports').hide();
+                }
+            }, 10000);
+        }
+    });
+    source.addEventListener("idle", function() {
+        source.close();
+    });
+}
+
+$(document).ready(follow_imports);
+
 $(document).on("click", function(event){
     if($(event.target).parents('.button-status').length || $(event.target).hasClass('button-status')) {
         return;
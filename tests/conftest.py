@@ -0,0 +1,75 @@
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Fixtures of the tests of SEAL.
+
+Importing SEAL does not connect to its database. Tests using the
+`database` fixture drop and create the tables of the PostgreSQL database
+given by the environment variable SEAL_TEST_DATABASE (skipped without it,
+or when it cannot be reached):
+
+    createdb seal_test
+    SEAL_TEST_DATABASE=postgresql:///seal_test python -m pytest tests
+"""
+
+import os
+
+import pytest
+from sqlalchemy import exc
+
+os.environ['SEAL_SCHEDULER'] = 'false'
+
+from seal import app, db  # noqa: E402
+from seal.models import Filter, User  # noqa: E402
+
+SEAL_DATABASE = app.config["SQLALCHEMY_DATABASE_URI"]
+
+
+@pytest.fixture
+def database(tmp_path_factory, monkeypatch):
+    """
+    Empty tables of the scratch database, with the default filter and the
+    user of the imports (id 1, as `insertdb.py`). Temporary files (i.e. error
+    reports) are written in a scratch root path.
+    """
+    uri = os.environ.get('SEAL_TEST_DATABASE')
+    if not uri:
+        pytest.skip("SEAL_TEST_DATABASE is not set (URI of a scratch database, its tables are dropped)")
+    if uri == SEAL_DATABASE:
+        pytest.skip("SEAL_TEST_DATABASE is the database of SEAL")
+    root_path = tmp_path_factory.mktemp("seal")
+    root_path.joinpath('static/temp/vcf').mkdir(parents=True)
+    monkeypatch.setattr(app, "root_path", str(root_path))
+    # The session of SEAL may be bound to the configured database already
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri
+    db.session.remove()
+    with app.app_context():
+        try:
+            db.drop_all()
+        except exc.OperationalError as e:
+            pytest.skip(f"SEAL_TEST_DATABASE cannot be reached : {e.orig}")
+        db.create_all()
+        db.session.add(Filter(filtername="No Filter", filter={"criteria": []}))
+        db.session.add(User(username="test", password="test"))
+        db.session.commit()
+        yield uri
+        db.session.remove()
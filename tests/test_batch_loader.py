@@ -0,0 +1,117 @@
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pytest
+from anacore.vcf import VCFRecord
+from sqlalchemy import exc, text
+
+from seal import db
+from seal.models import Comment_sample, Sample, Var2Sample, Variant
+from seal.schedulers import VCF_MAX_ERRORS, BatchLoader, is_carrier
+
+
+def record(chrom, pos, alt="T", gt="0/1", dp=20, ad=(10, 10)):
+    return VCFRecord(
+        chrom, pos, None, "A", alt.split(","), None, ["PASS"], dict(), ["GT", "DP", "AD"],
+        {"S1": {"GT": gt, "DP": dp, "AD": list(ad)}}
+    )
+
+
+def add_sample():
+    sample = Sample(samplename="S1", caller=["default"])
+    db.session.add(sample)
+    db.session.commit()
+    return sample.id
+
+
+def test_loader_non_primary_contigs(database):
+    sample_id = add_sample()
+    with BatchLoader([(sample_id, "default", None)], 1, chunk_size=2) as loader:
+        for chrom, pos in [("chr1", 10), ("chr1_KI270706v1_random", 5), ("chrEBV", 5), ("chrX", 5)]:
+            loader.add(record(chrom, pos))
+
+    assert sorted(id for (id,) in db.session.query(Variant.id)) == ["chr1-10-A-T", "chrX-5-A-T"]
+    assert Var2Sample.query.filter_by(sample_ID=sample_id).count() == 2
+    assert loader.contigs == {"chr1_KI270706v1_random": 1, "chrEBV": 1}
+    comment = Comment_sample.query.filter_by(sampleid=sample_id).one()
+    assert "2 records of non-primary contigs" in comment.comment
+
+
+def test_loader_integrity_error(database):
+    sample_id = add_sample()
+    # Duplicate of the position of one record of the chunk
+    db.session.execute(text("CREATE UNIQUE INDEX test_duplicate ON variant (pos) WHERE pos = 500"))
+    db.session.add(Variant(id="chr1-500-A-G", chr="chr1", pos=500, ref="A", alt="G"))
+    db.session.commit()
+
+    checkpoints = list()
+    with BatchLoader([(sample_id, "default", None)], 1, chunk_size=1000, checkpoint=checkpoints.append) as loader:
+        for pos in range(1, 1001):
+            loader.add(record("chr1", pos))
+
+    ids = set(id for (id,) in db.session.query(Var2Sample.variant_ID).filter_by(sample_ID=sample_id))
+    assert len(ids) == 999
+    assert "chr1-500-A-T" not in ids
+    assert loader.count == 999
+    assert loader.errors == 1
+    assert checkpoints == sorted(checkpoints) and checkpoints[-1] == 1000
+    comment = Comment_sample.query.filter_by(sampleid=sample_id).one()
+    assert "chr1-500-A-T" in comment.comment
+
+
+def test_loader_integrity_errors_fail(database):
+    sample_id = add_sample()
+    db.session.execute(text("CREATE UNIQUE INDEX test_duplicate ON variant (pos) WHERE pos > 100"))
+    for pos in range(101, 201):
+        db.session.add(Variant(id=f"chr1-{pos}-A-G", chr="chr1", pos=pos, ref="A", alt="G"))
+    db.session.commit()
+
+    checkpoints = list()
+    with pytest.raises(exc.IntegrityError):
+        with BatchLoader([(sample_id, "default", None)], 1, chunk_size=1000, checkpoint=checkpoints.append) as loader:
+            for pos in range(1, 201):
+                loader.add(record("chr1", pos))
+    db.session.rollback()
+
+    # The checkpoint never goes past the records not written
+    assert checkpoints[-1] == 100 + VCF_MAX_ERRORS
+    assert Var2Sample.query.filter_by(sample_ID=sample_id).count() == 100
+
+
+@pytest.mark.parametrize("genotype, carrier", [
+    ("0/1", True), ("1|1", True), ("1/2", True), ("0/0", False), ("./.", False),
+    ("0/2", False), ("2/2", False), (None, True)
+])
+def test_is_carrier(genotype, carrier):
+    assert is_carrier({"GT": genotype} if genotype else dict()) is carrier
+
+
+def test_loader_multiallelic_missing_depths(database):
+    sample_id = add_sample()
+    with BatchLoader([(sample_id, "default", "S1")], 1) as loader:
+        loader.add(record("chr1", 10, alt="T,G", gt="0/2", ad=(10, 0, 10)))
+        loader.add(record("chr1", 20, alt="T,G", gt="1/2", ad=(0, 8, 12)))
+        loader.add(record("chr1", 30, dp=None, ad=(None, None)))
+
+    rows = {row.variant_ID: row for row in Var2Sample.query.filter_by(sample_ID=sample_id)}
+    assert sorted(rows) == ["chr1-20-A-T", "chr1-30-A-T"]
+    assert (rows["chr1-20-A-T"].depth, rows["chr1-20-A-T"].allelic_depth, rows["chr1-20-A-T"].allelic_freq) == (20, 8, 0.4)
+    assert (rows["chr1-30-A-T"].depth, rows["chr1-30-A-T"].allelic_depth, rows["chr1-30-A-T"].allelic_freq) == (None, None, None)
@@ -0,0 +1,136 @@
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import threading
+
+from seal import app, config, db
+from seal.models import ImportJob, Sample
+from seal.schedulers import claim_job, enqueue_import, fail_job, import_job, import_worker
+
+
+def queue(*jobs):
+    for state, lane in jobs:
+        db.session.add(ImportJob(data={"samplename": f"{lane}_{state}"}, state=state, lane=lane))
+    db.session.commit()
+
+
+def test_claim_interactive_slot(database, tmp_path):
+    queue(("loading", "backfill"), ("queued", "backfill"), ("queued", "routine"), ("queued", "interactive"))
+
+    job = claim_job(tmp_path, lanes=["interactive"])
+    assert job.lane == "interactive"
+    assert claim_job(tmp_path, lanes=["interactive"]) is None
+    assert claim_job(tmp_path).lane == "routine"
+
+
+def test_claim_lane_limit_concurrent(database, tmp_path, monkeypatch):
+    monkeypatch.setitem(config["IMPORT"], "LANE_WORKERS", {"interactive": 0, "routine": 0, "backfill": 1})
+    queue(*[("queued", "backfill")] * 4)
+    db.session.remove()
+
+    barrier = threading.Barrier(4)
+    claimed = list()
+
+    def claim():
+        with app.app_context():
+            barrier.wait()
+            job = claim_job(tmp_path)
+            if job:
+                claimed.append(job.id)
+            db.session.remove()
+
+    threads = [threading.Thread(target=claim) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == 1
+    assert ImportJob.query.filter_by(state="annotating").count() == 1
+
+
+def test_enqueue_validates_whole_vcf_at_claim(database, tmp_path, monkeypatch):
+    monkeypatch.setitem(config["IMPORT"], "QUICK_VALIDATION", 2)
+    vcf_path = tmp_path.joinpath('S1.vcf')
+    vcf_path.write_text(
+        "##fileformat=VCFv4.2\n"
+        '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Depth">\n'
+        '##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">\n'
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n" +
+        "".join(f"chr1\t{pos}\t.\tA\tT\t.\tPASS\t.\tGT:DP:AD\t0/1:10:5,5\n" for pos in [10, 20, 5])
+    )
+
+    job = enqueue_import({"samplename": "S1", "vcf_path": str(vcf_path), "userid": 1})
+    assert job.state == "queued"
+    assert job.checkpoint is None
+
+    job = claim_job(tmp_path)
+    import_job(job, tmp_path)
+    assert job.state == "error"
+    assert "not sorted" in job.error
+    assert job.sample_ID is None
+
+
+def test_enqueue_invalid_never_queued(database, tmp_path, monkeypatch):
+    vcf_path = tmp_path.joinpath('S1.vcf')
+    vcf_path.write_text("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS2\n")
+    seen = list()
+
+    def watch_queue(job, message):
+        # Another worker, on its own connection, looks for a job to claim
+        with db.engine.connect() as connection:
+            seen.extend(connection.execute(ImportJob.__table__.select()).fetchall())
+        fail_job(job, message)
+
+    monkeypatch.setattr("seal.schedulers.fail_job", watch_queue)
+    job = enqueue_import({"samplename": "S1", "vcf_path": str(vcf_path), "userid": 1})
+
+    assert seen == []
+    assert job.state == "error"
+    assert ImportJob.query.filter_by(state="queued").count() == 0
+
+
+def test_worker_error_cleans_job(database, tmp_path, monkeypatch):
+    monkeypatch.setitem(config["IMPORT"], "SKIP_KNOWN_VARIANTS", True)
+    vcf_path = tmp_path.joinpath('S1.vcf')
+    vcf_path.write_text(
+        "##fileformat=VCFv4.2\n"
+        '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Depth">\n'
+        '##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">\n'
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+        "chr1\t10\t.\tA\tT\t.\tPASS\t.\tGT:DP:AD\t0/1:10:5,5\n"
+    )
+
+    def crash(*args):
+        raise RuntimeError("unexpected")
+
+    monkeypatch.setattr("seal.schedulers.vep_extension", lambda vep_config: ".vep.vcf")
+    monkeypatch.setattr("seal.schedulers.vep_config_hash", lambda vep_config, genome: "vep")
+    monkeypatch.setattr("seal.schedulers.vep_shards", crash)
+    job_id = enqueue_import({"samplename": "S1", "vcf_path": str(vcf_path), "userid": 1}).id
+    assert import_worker(tmp_path) == 1
+
+    job = ImportJob.query.get(job_id)
+
+    assert job.state == "error"
+    assert "unexpected" in job.error
+    assert Sample.query.get(job.sample_ID).status == -1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["S1.vcf"]
@@ -0,0 +1,57 @@
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import importlib.util
+import json
+from pathlib import Path
+
+import pytest
+import yaml
+
+from seal.models import ImportJob
+
+SCRIPT = Path(__file__).resolve().parents[1].joinpath('scripts_examples/import_token_UMAI.py')
+
+
+@pytest.fixture
+def umai():
+    pytest.importorskip("pandas")
+    spec = importlib.util.spec_from_file_location("import_token_UMAI", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_enqueue_jobs_backfill_lane(database, umai, tmp_path):
+    config_path = tmp_path.joinpath('config.yaml')
+    config_path.write_text(yaml.safe_dump({"FLASK": {"SQLALCHEMY_DATABASE_URI": database}}))
+    treat_files = list()
+    for samplename, data in [("S1", {"lane": "backfill"}), ("S2", {})]:
+        treat_file = tmp_path.joinpath(f'{samplename}.treat')
+        treat_file.write_text(json.dumps(dict(data, samplename=samplename, vcf_path=f"/{samplename}.vcf")))
+        treat_files.append(str(treat_file))
+
+    umai.enqueue_jobs(treat_files, config_path, priority=2)
+
+    jobs = ImportJob.query.order_by(ImportJob.id).all()
+    assert [job.data["samplename"] for job in jobs] == ["S1", "S2"]
+    assert [job.lane for job in jobs] == ["backfill", "backfill"]
+    assert all(job.state == "queued" and job.priority == 2 for job in jobs)
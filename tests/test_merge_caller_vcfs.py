@@ -0,0 +1,75 @@
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pytest
+
+from seal.schedulers import InvalidImportError, merge_caller_vcfs, open_vcf
+
+
+def write_vcf(path, contigs, records):
+    path.write_text(
+        "##fileformat=VCFv4.2\n" +
+        "".join(f"##contig=<ID={contig}>\n" for contig in contigs) +
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n" +
+        "".join(
+            f"{chrom}\t{pos}\t.\t{ref}\t{alt}\t.\tPASS\t.\tGT:DP:AD\t0/1:10:5,5\n"
+            for chrom, pos, ref, alt in records
+        )
+    )
+    return path
+
+
+def merged_records(vcf_path):
+    with open_vcf(vcf_path) as vcf:
+        return [line.split("\t")[:5] + line.rstrip("\n").split("\t")[9:] for line in vcf if not line.startswith("#")]
+
+
+def test_merge_alleles_of_a_position(tmp_path):
+    first = write_vcf(tmp_path.joinpath('first.vcf'), ["chr1", "chr2"], [
+        ("chr1", 10, "A", "T"), ("chr1", 10, "A", "C"), ("chr2", 5, "G", "A")
+    ])
+    second = write_vcf(tmp_path.joinpath('second.vcf'), ["chr2"], [
+        ("chr2", 5, "G", "A")
+    ])
+    # The third caller writes the alleles of a position in another order
+    third = write_vcf(tmp_path.joinpath('third.vcf'), ["chr1", "chr2"], [
+        ("chr1", 10, "A", "C"), ("chr1", 10, "A", "T"), ("chr1", 12, "A", "G")
+    ])
+    vcf_out = tmp_path.joinpath('merged.vcf')
+
+    assert merge_caller_vcfs([("a", first, None), ("b", second, None), ("c", third, None)], vcf_out) == 4
+    assert [record[:5] + [call != "./.:.:.:." for call in record[5:]] for record in merged_records(vcf_out)] == [
+        ["chr1", "10", ".", "A", "T", True, False, True],
+        ["chr1", "10", ".", "A", "C", True, False, True],
+        ["chr1", "12", ".", "A", "G", False, False, True],
+        ["chr2", "5", ".", "G", "A", True, True, False],
+    ]
+
+
+@pytest.mark.parametrize("second_contigs, message", [
+    (["chr1"], "not declared in the headers"),
+    (["chr2", "chr1"], "not declared in the order"),
+])
+def test_merge_contigs(tmp_path, second_contigs, message):
+    first = write_vcf(tmp_path.joinpath('first.vcf'), ["chr1", "chr2"], [("chr1", 10, "A", "T")])
+    second = write_vcf(tmp_path.joinpath('second.vcf'), second_contigs, [("chr1", 10, "A", "T"), ("chr3", 5, "G", "A")])
+    with pytest.raises(InvalidImportError) as error:
+        merge_caller_vcfs([("a", first, None), ("b", second, None)], tmp_path.joinpath('merged.vcf'))
+    assert message in str(error.value)
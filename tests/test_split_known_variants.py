@@ -0,0 +1,49 @@
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pytest
+
+from seal import db
+from seal.models import AnnotationCache, Variant
+from seal.schedulers import open_vcf, split_known_variants
+
+
+@pytest.mark.parametrize("skip_known, known, novel", [
+    (True, {"chr1-10-A-T"}, ["30"]),
+    (False, set(), ["10", "30"]),
+])
+def test_split_cached_variants(database, tmp_path, skip_known, known, novel):
+    db.session.add(Variant(id="chr1-10-A-T", chr="chr1", pos=10, ref="A", alt="T", annotations_packed=b"packed"))
+    db.session.add(AnnotationCache(variant_ID="chr1-20-A-T", genome="grch38", config_hash="vep", annotations=[]))
+    db.session.commit()
+    vcf_path = tmp_path.joinpath('S1.vcf')
+    vcf_path.write_text(
+        "##fileformat=VCFv4.2\n"
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n" +
+        "".join(f"chr1\t{pos}\t.\tA\tT\t.\tPASS\t.\tGT\t0/1\n" for pos in [10, 20, 30])
+    )
+    vcf_novel = tmp_path.joinpath('S1.novel.vcf')
+
+    # The cache is looked up whether or not the known variants are skipped
+    assert split_known_variants(vcf_path, vcf_novel, cache=("grch38", "vep"), skip_known=skip_known) == (
+        known, {"chr1-20-A-T"}, len(novel)
+    )
+    with open_vcf(vcf_novel) as vcf:
+        assert [line.split("\t")[1] for line in vcf if not line.startswith("#")] == novel
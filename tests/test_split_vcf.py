@@ -0,0 +1,46 @@
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pytest
+
+from seal.schedulers import open_vcf, split_vcf
+
+
+@pytest.mark.parametrize("records, written", [
+    (10, [4, 4, 2]),
+    # A count below the actual number of records only unbalances the last shard
+    (6, [2, 2, 6]),
+])
+def test_split_vcf(tmp_path, records, written):
+    vcf_path = tmp_path.joinpath('S1.vcf')
+    vcf_path.write_text(
+        "##fileformat=VCFv4.2\n"
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n" +
+        "".join(f"chr1\t{pos}\t.\tA\tT\t.\tPASS\t.\tGT\t0/1\n" for pos in range(1, 11))
+    )
+    vcf_shards = [tmp_path.joinpath(f'S1.shard{i}.vcf') for i in range(3)]
+
+    assert split_vcf(vcf_path, vcf_shards, records) == written
+    positions = list()
+    for vcf_shard in vcf_shards:
+        with open_vcf(vcf_shard) as vcf:
+            assert vcf.readline().startswith("##fileformat")
+            positions.extend(int(line.split("\t")[1]) for line in vcf if not line.startswith("#"))
+    assert positions == list(range(1, 11))
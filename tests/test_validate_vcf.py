@@ -0,0 +1,73 @@
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+#
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pytest
+
+from seal.schedulers import InvalidImportError, validate_vcf
+
+HEADER = (
+    "##fileformat=VCFv4.2\n"
+    '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Depth">\n'
+    '##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">\n'
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+)
+
+
+def write_vcf(path, records):
+    path.write_text(HEADER + "".join(
+        f"{chrom}\t{pos}\t.\tA\tT\t.\tPASS\t.\tGT:DP:AD\t0/1:10:5,5\n" for chrom, pos in records
+    ))
+    return path
+
+
+def test_validate_non_primary_contigs(tmp_path):
+    vcf_path = write_vcf(tmp_path.joinpath('S1.vcf'), [
+        ("chr1", 10), ("chr1", 20), ("chr1_KI270706v1_random", 5), ("chrUn_GL000220v1", 5),
+        ("chrEBV", 5), ("HLA-A*01:01:01:01", 5), ("chrX", 5)
+    ])
+    assert validate_vcf(vcf_path) == 7
+
+
+@pytest.mark.parametrize("records, message", [
+    ([("chr1", 20), ("chr1", 10)], "not sorted"),
+    ([("chr1", 10), ("chr2", 10), ("chr1", 20)], "not sorted"),
+    ([("chr1", 10), ("2", 10)], "with and without 'chr'"),
+])
+def test_validate_malformed(tmp_path, records, message):
+    vcf_path = write_vcf(tmp_path.joinpath('S1.vcf'), records)
+    with pytest.raises(InvalidImportError) as error:
+        validate_vcf(vcf_path)
+    assert message in str(error.value)
+
+
+def test_validate_first_records(tmp_path):
+    vcf_path = write_vcf(tmp_path.joinpath('S1.vcf'), [("chr1", 10), ("chr1", 20), ("chr1", 5)])
+    assert validate_vcf(vcf_path, max_records=2) == 2
+    with pytest.raises(InvalidImportError):
+        validate_vcf(vcf_path)
+
+
+def test_validate_callers_contigs(tmp_path):
+    vcf_path = write_vcf(tmp_path.joinpath('S1.vcf'), [("chr1", 10)])
+    assert validate_vcf(vcf_path) == 1
+    with pytest.raises(InvalidImportError) as error:
+        validate_vcf(vcf_path, require_contigs=True)
+    assert "contigs not declared" in str(error.value)
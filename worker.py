@@ -0,0 +1,60 @@
+# (c) 2023, Charles VAN GOETHEM <c-vangoethem (at) chu-montpellier (dot) fr>
+#
+# This file is part of SEAL
+# 
+# SEAL db - Simple, Efficient And Lite database for NGS
+# Copyright (C) 2023  Charles VAN GOETHEM - MoBiDiC - CHU Montpellier
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import argparse
+import os
+import signal
+import threading
+
+# The scheduler of this process is started below, never at import time
+os.environ['SEAL_SCHEDULER'] = 'false'
+
+from seal import app, scheduler, schedulers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="SEAL worker: run the import and ClinVar jobs outside of the web app")
+    group_input = parser.add_argument_group('Options')
+    group_input.add_argument(
+        '-o',
+        '--once',
+        default=False,
+        action='store_true',
+        help="Import the queued VCF then exit"
+    )
+    args = parser.parse_args()
+
+    if args.once:
+        with app.app_context():
+            schedulers.importvcf()
+    else:
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+        scheduler.start()
+        watcher = schedulers.start_token_watcher()
+        app.logger.info(f"Worker started : {', '.join(job.id for job in scheduler.get_jobs())}")
+        stop.wait()
+        app.logger.info("Worker stopping : waiting for the running jobs")
+        if watcher:
+            watcher.stop()
+        scheduler.shutdown()